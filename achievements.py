@@ -1,214 +1,477 @@
 import json
 import os
-from datetime import date, timedelta
+import re
+import threading
+from datetime import date
 
-class AchievementSystem:
-    def __init__(self):
-        self.achievements_file = "user_achievements.json"
-        self.achievements = self.load_achievements()
-        
-    def load_achievements(self):
-        """Load existing achievements from file."""
-        if os.path.exists(self.achievements_file):
+from aggregates import to_cents
+from dates import NO_DAY, month_range, row_day, today_day
+from journal import file_generation
+from locking import FileLock, atomic_write_json
+from streaks import StreakTracker
+
+# One <user>.json per user in this directory; the single-user user_achievements.json is read for the default user
+ACHIEVEMENTS_DIR = os.environ.get("ACHIEVEMENTS_DIR", "achievements")
+LEGACY_FILE = "user_achievements.json"
+DEFAULT_USER = "default"
+
+# What an achievement's condition reads; a write re-checks only the achievements whose inputs it changed
+COUNT = "count"
+CATEGORIES = "categories"
+TODAY = "today"
+MONTH = "month"
+STREAK = "streak"
+LIMITS = "limits"
+ALL_INPUTS = frozenset((COUNT, CATEGORIES, TODAY, MONTH, STREAK, LIMITS))
+
+
+class AchievementStats:
+    """Running counters the achievement conditions are checked against.
+
+    Kept in the achievements file and advanced one transaction at a time,
+    in O(1): how many were added, the count per category, the count and
+    cents spent per day, and the runs of consecutive days with a
+    transaction. The counts let an edited or deleted transaction be taken
+    back out exactly. ``as_of`` is the day treated as today (None for the
+    real today), which lets a replay evaluate history day by day.
+    """
+
+    def __init__(self, count=0, category_counts=None, days=None, day_counts=None, streaks=None):
+        self.count = count
+        self.category_counts = dict(category_counts or {})
+        self.days = dict(days or {})
+        self.day_counts = dict(day_counts or {})
+        self.streaks = streaks if streaks is not None else StreakTracker.from_days(self.days)
+        self.as_of = None
+        self._month = (None, None)
+
+    @property
+    def categories(self):
+        """The categories with at least one transaction."""
+        return self.category_counts.keys()
+
+    @classmethod
+    def from_dict(cls, data):
+        """Counters saved by ``as_dict``; None for ones saved before per-category and per-day counts were kept."""
+        if "day_counts" not in data:
+            return None
+        days = {int(day): cents for day, cents in data.get("days", {}).items()}
+        day_counts = {int(day): count for day, count in data["day_counts"].items()}
+        streaks = data.get("streaks")
+        if streaks is not None:
+            streaks = StreakTracker(streaks["runs"], streaks["longest"])
+        return cls(data.get("count", 0), data.get("categories", {}), days, day_counts, streaks)
+
+    def as_dict(self):
+        return {"count": self.count, "categories": dict(sorted(self.category_counts.items())),
+                "days": {str(day): cents for day, cents in sorted(self.days.items())},
+                "day_counts": {str(day): count for day, count in sorted(self.day_counts.items())},
+                "streaks": {"runs": self.streaks.runs(), "longest": self.streaks.longest}}
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Counters for a whole transaction history: one pass over the rows, then one over the sorted days."""
+        count = 0
+        category_counts = {}
+        days = {}
+        day_counts = {}
+        for row in rows:
+            count += 1
+            category = row.get("Category", '') or ''
+            category_counts[category] = category_counts.get(category, 0) + 1
+            day = row_day(row)
+            if day != NO_DAY:
+                days[day] = days.get(day, 0) + to_cents(row.get("Amount"))
+                day_counts[day] = day_counts.get(day, 0) + 1
+        return cls(count, category_counts, days, day_counts)
+
+    def add(self, row):
+        """Count one new transaction; returns the inputs it changed."""
+        return self.add_day(row_day(row), {row.get("Category", '') or '': (1, to_cents(row.get("Amount")))})
+
+    def add_day(self, day, by_category):
+        """Count a day's new transactions, given as {category: (count, cents)}; returns the inputs they changed."""
+        changed = {COUNT}
+        count = cents = 0
+        for category, (category_count, category_cents) in by_category.items():
+            count += category_count
+            cents += category_cents
+            if category not in self.category_counts:
+                self.category_counts[category] = 0
+                changed.add(CATEGORIES)
+            self.category_counts[category] += category_count
+        self.count += count
+        if day == NO_DAY:
+            return changed
+        if day not in self.days:
+            self.days[day] = self.day_counts[day] = 0
+            self.streaks.add(day)
+            changed.add(STREAK)
+        self.days[day] += cents
+        self.day_counts[day] += count
+        return changed | self._day_inputs(day)
+
+    def remove(self, row):
+        """Take back out a transaction that was edited or deleted; returns the inputs it changed."""
+        changed = {COUNT}
+        self.count = max(self.count - 1, 0)
+        category = row.get("Category", '') or ''
+        if category in self.category_counts:
+            self.category_counts[category] -= 1
+            if self.category_counts[category] <= 0:
+                del self.category_counts[category]
+                changed.add(CATEGORIES)
+        day = row_day(row)
+        if day not in self.days:
+            return changed
+        self.days[day] -= to_cents(row.get("Amount"))
+        self.day_counts[day] -= 1
+        if self.day_counts[day] <= 0:
+            del self.days[day], self.day_counts[day]
+            self.streaks.remove(day)
+            changed.add(STREAK)
+        return changed | self._day_inputs(day)
+
+    def _day_inputs(self, day):
+        """Inputs that a change to ``day``'s spending touches."""
+        changed = set()
+        today = self.today()
+        if day == today:
+            changed.add(TODAY)
+        month_start, month_end = self.month(today)
+        if month_start <= day < month_end:
+            changed.add(MONTH)
+        return changed
+
+    def today(self):
+        return self.as_of or today_day()
+
+    def month(self, today):
+        """(first day, day after the last) of the month ``today`` falls in."""
+        if not self._month[0] or not self._month[0] <= today < self._month[1]:
+            self._month = month_range(date.fromordinal(today).strftime("%Y-%m"))
+        return self._month
+
+    def day_total(self, day):
+        return self.days.get(day, 0) / 100
+
+
+def day_buckets(rows):
+    """{day: {category: [count, cents]}} for a transaction history, in one streaming pass.
+
+    Replay only needs each day's totals, so a history of any length is
+    sorted by its distinct days rather than row by row.
+    """
+    buckets = {}
+    for row in rows:
+        by_category = buckets.setdefault(row_day(row), {})
+        totals = by_category.setdefault(row.get("Category", '') or '', [0, 0])
+        totals[0] += 1
+        totals[1] += to_cents(row.get("Amount"))
+    return buckets
+
+
+def under_budget_categories(limits_data, monthly_totals):
+    """How many limited categories have spending this month, but less than their limit."""
+    count = 0
+    for limit in limits_data:
+        category_spending = (monthly_totals or {}).get(limit.get("Category"), {}).get("total", 0.0)
+        if category_spending > 0 and category_spending < float(limit.get("Limit", 0)):
+            count += 1
+    return count
+
+
+def low_spending_day(stats):
+    today_spending = stats.day_total(stats.today())
+    return today_spending > 0 and today_spending < 20
+
+
+# Values achievements are measured by: the inputs each one reads and how to get it from
+# (stats, limits rows, month totals). A user's values are cached as their "progress"
+METRICS = {
+    "transactions": {"inputs": {COUNT}, "value": lambda stats, limits, totals: stats.count},
+    "categories": {"inputs": {CATEGORIES}, "value": lambda stats, limits, totals: len(stats.categories)},
+    "limits": {"inputs": {LIMITS}, "value": lambda stats, limits, totals: len(limits)},
+    "under_budget": {"inputs": {MONTH, LIMITS}, "value": lambda stats, limits, totals: under_budget_categories(limits, totals)},
+    "frugal_day": {"inputs": {TODAY}, "value": lambda stats, limits, totals: int(low_spending_day(stats))},
+    "streak": {"inputs": {STREAK}, "value": lambda stats, limits, totals: stats.streaks.longest},
+}
+
+# Every achievement, in display order: it unlocks once its metric reaches the target
+ACHIEVEMENTS = {
+    "first_transaction": {"name": "First Steps", "description": "Added your first transaction", "icon": "🎯",
+                          "metric": "transactions", "target": 1},
+    "ten_transactions": {"name": "Getting Started", "description": "Added 10 transactions", "icon": "📝",
+                         "metric": "transactions", "target": 10},
+    "fifty_transactions": {"name": "Dedicated Tracker", "description": "Added 50 transactions", "icon": "📊",
+                           "metric": "transactions", "target": 50},
+    "hundred_transactions": {"name": "Master Tracker", "description": "Added 100 transactions", "icon": "🏆",
+                             "metric": "transactions", "target": 100},
+    "first_category": {"name": "Category Explorer", "description": "Used your first spending category", "icon": "🏷️",
+                       "metric": "categories", "target": 1},
+    "five_categories": {"name": "Category Master", "description": "Used 5 different categories", "icon": "🎨",
+                        "metric": "categories", "target": 5},
+    "first_limit": {"name": "Budget Setter", "description": "Set your first spending limit", "icon": "💰",
+                    "metric": "limits", "target": 1},
+    "under_budget": {"name": "Budget Master", "description": "Stayed under budget for a category", "icon": "✅",
+                     "metric": "under_budget", "target": 1},
+    "low_spending_day": {"name": "Frugal Day", "description": "Spent less than $20 in a day", "icon": "💡",
+                         "metric": "frugal_day", "target": 1},
+    "consistent_tracker": {"name": "Consistent Tracker", "description": "Added transactions for 7 consecutive days", "icon": "📅",
+                           "metric": "streak", "target": 7},
+    "habit_builder": {"name": "Habit Builder", "description": "Added transactions for 30 consecutive days", "icon": "🔥",
+                      "metric": "streak", "target": 30},
+    "streak_legend": {"name": "Streak Legend", "description": "Added transactions for 100 consecutive days", "icon": "💯",
+                      "metric": "streak", "target": 100},
+}
+
+
+class AchievementStore:
+    """Per-user achievement state, one JSON file per user, cached in each worker.
+
+    A user's file is read the first time they are asked for and again only
+    when its (inode, size, mtime) changes, i.e. when another worker saved
+    it. Saving writes only state that changed, by atomic replace; callers
+    changing a user's achievements hold ``lock(user)`` while they do.
+    """
+
+    def __init__(self, directory=ACHIEVEMENTS_DIR, legacy_file=LEGACY_FILE, legacy_user=DEFAULT_USER):
+        self.directory = directory
+        self.legacy_file = legacy_file
+        self.legacy_user = legacy_user
+        self.writes = 0
+        self._mutex = threading.Lock()
+        self._locks = {}
+        self._cache = {}
+
+    def path(self, user):
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]", "_", user) + ".json")
+
+    def lock(self, user):
+        with self._mutex:
+            if user not in self._locks:
+                os.makedirs(self.directory, exist_ok=True)
+                self._locks[user] = FileLock(self.path(user))
+            return self._locks[user]
+
+    def get(self, user=DEFAULT_USER):
+        """``user``'s AchievementSystem, read from disk only if it changed since this worker last saw it."""
+        path = self.path(user)
+        generation = file_generation(path)
+        with self._mutex:
+            cached = self._cache.get(user)
+            if cached is not None and cached[0] == generation:
+                return cached[1]
+            if generation == (None,) and user == self.legacy_user and self.legacy_file:
+                path = self.legacy_file
             try:
-                with open(self.achievements_file, 'r') as f:
-                    return json.load(f)
-            except:
-                return {"unlocked": [], "progress": {}}
-        return {"unlocked": [], "progress": {}}
-    
+                with open(path, 'r') as f:
+                    achievements = json.load(f)
+            except (OSError, ValueError):
+                achievements = None
+            system = AchievementSystem(user, achievements, store=self)
+            self._cache[user] = (generation, system)
+            return system
+
+    def save(self, system):
+        """Write ``system`` if it changed since it was loaded or last saved; returns whether it wrote."""
+        if not system.dirty:
+            return False
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(system.user)
+        atomic_write_json(path, system.achievements, indent=2)
+        with self._mutex:
+            self._cache[system.user] = (file_generation(path), system)
+            self.writes += 1
+        system.dirty = False
+        return True
+
+
+class AchievementSystem:
+    """One user's unlocked achievements and the counters they are checked against.
+
+    Get it from an AchievementStore; changes mark it dirty, and
+    ``save_achievements`` writes it only then.
+    """
+
+    def __init__(self, user=DEFAULT_USER, achievements=None, store=None):
+        self.user = user
+        self.store = store
+        self.achievements = achievements or {"unlocked": [], "progress": {}}
+        self.achievements.setdefault("unlocked", [])
+        self.achievements.setdefault("progress", {})
+        # Counters missing (or saved in an older form) are rebuilt by replaying the history on the next write
+        stats = self.achievements.get("stats")
+        self.stats = AchievementStats.from_dict(stats) if stats is not None else None
+        self.dirty = False
+
+    def reset(self):
+        """Lock every achievement again and drop the counters."""
+        self.achievements = {"unlocked": [], "progress": {}}
+        self.stats = None
+        self.dirty = True
+
     def save_achievements(self):
-        """Save achievements to file."""
-        with open(self.achievements_file, 'w') as f:
-            json.dump(self.achievements, f, indent=2)
+        """Save achievements to the store, if anything changed."""
+        if self.store is not None:
+            self.store.save(self)
     
-    def check_achievements(self, transactions, limits_data):
-        """Check for new achievements based on current data."""
+    def check_achievements(self, transactions, limits_data, monthly_totals=None):
+        """Check every locked achievement against the full ``transactions`` history.
+
+        Rebuilds the counters from scratch; the add paths use
+        ``record_transactions`` instead. ``monthly_totals`` is the store's
+        {category: {"total", "count"}} for the current month.
+        """
+        self.stats = AchievementStats.from_rows(transactions)
+        self.dirty = True
+        new_achievements = self._unlock(ALL_INPUTS, limits_data, monthly_totals)
+        self._save_changes()
+        return new_achievements
+
+    def record_transactions(self, rows, limits_data, monthly_totals=None, history=None, limits_version=None, removed=()):
+        """Advance the counters by newly committed ``rows`` and return the achievements that unlocked.
+
+        ``removed`` are rows an edit or delete took away (an edit passes the
+        old row here and the new one in ``rows``); they are taken back out
+        first. Only locked achievements whose inputs the rows changed are
+        checked and have their progress refreshed; limit-based ones also
+        when ``limits_version`` differs from the last one seen. Unlocked
+        achievements stay unlocked. The first time (no counters saved yet)
+        the counters are built from ``history()``, every transaction stored
+        so far with these changes applied, by replaying it so earlier
+        unlocks get their real dates.
+        """
+        if self.stats is None:
+            return self.replay(day_buckets(history() if history is not None else rows), limits_data, limits_version)
+        # Metrics with no cached value yet (files saved before progress was kept) are computed once
+        changed = {input_name for achievement_id, achievement in ACHIEVEMENTS.items()
+                   if achievement_id not in self.achievements["unlocked"] and achievement["metric"] not in self.achievements["progress"]
+                   for input_name in METRICS[achievement["metric"]]["inputs"]}
+        for row in removed:
+            changed |= self.stats.remove(row)
+        for row in rows:
+            changed |= self.stats.add(row)
+        if limits_version is None or limits_version != self.achievements.get("limits_version"):
+            changed.add(LIMITS)
+            self.achievements["limits_version"] = limits_version
+        if changed:
+            self.dirty = True
+        new_achievements = self._unlock(changed, limits_data, monthly_totals)
+        self._save_changes()
+        return new_achievements
+
+    def replay(self, buckets, limits_data, limits_version=None):
+        """Recompute achievements from scratch by replaying a whole transaction history in date order.
+
+        ``buckets`` is the history folded into per-day totals (see
+        ``day_buckets``). The days are walked in order with each one treated
+        as today, so every achievement unlocks on the day it was earned
+        (undated rows count from the first dated day). Limit achievements are judged against
+        the current limits; ``first_limit`` unlocks as of today. Returns
+        every achievement unlocked.
+        """
+        self.reset()
+        self.stats = AchievementStats()
+        unlocked = []
+        changed = set()
+        month = month_totals = None
+        for day in sorted(buckets):
+            self.stats.as_of = day
+            changed |= self.stats.add_day(day, {category: tuple(totals) for category, totals in buckets[day].items()})
+            if day == NO_DAY:
+                continue
+            if self.stats.month(day) != month:
+                month, month_totals = self.stats.month(day), {}
+            for category, (count, cents) in buckets[day].items():
+                totals = month_totals.setdefault(category, {"total": 0.0, "count": 0})
+                totals["total"] += cents / 100
+                totals["count"] += count
+            unlocked += self._unlock(changed, limits_data, month_totals, day)
+            changed = set()
+        self.stats.as_of = None
+        current_month = month_totals if month == self.stats.month(today_day()) else {}
+        unlocked += self._unlock(changed | {LIMITS}, limits_data, current_month)
+        self.achievements["limits_version"] = limits_version
+        self._save_changes()
+        return unlocked
+
+    def _unlock(self, changed, limits_data, monthly_totals, day=None):
+        """Refresh the progress of metrics whose inputs ``changed`` and unlock what reached its target, as of ``day``.
+
+        Only metrics some locked achievement still waits on are computed or
+        kept; ``changed`` includes what edits and deletes took away, so the
+        cached values follow them too.
+        """
+        unlocked_date = date.fromordinal(day).isoformat() if day else str(date.today())
+        unlocked_dates = self.achievements.setdefault("unlocked_dates", {})
+        progress = self.achievements["progress"]
+        locked = [(achievement_id, achievement) for achievement_id, achievement in ACHIEVEMENTS.items()
+                  if achievement_id not in self.achievements["unlocked"]]
+        for metric in {achievement["metric"] for _, achievement in locked}:
+            if METRICS[metric]["inputs"] & changed:
+                value = METRICS[metric]["value"](self.stats, limits_data, monthly_totals)
+                if progress.get(metric) != value:
+                    progress[metric] = value
+                    self.dirty = True
         new_achievements = []
-        
-        # Get current stats
-        total_transactions = len(transactions)
-        total_spending = sum(float(tx.get('Amount', 0)) for tx in transactions)
-        categories_used = len(set(tx.get('Category', '') for tx in transactions))
-        
-        # Calculate streaks and other metrics
-        current_month = date.today().strftime("%m")
-        monthly_transactions = [tx for tx in transactions if current_month in tx.get('Date', '')]
-        monthly_spending = sum(float(tx.get('Amount', 0)) for tx in monthly_transactions)
-        
-        # Achievement definitions
-        achievement_definitions = {
-            "first_transaction": {
-                "name": "First Steps",
-                "description": "Added your first transaction",
-                "icon": "🎯",
-                "condition": lambda: total_transactions >= 1
-            },
-            "ten_transactions": {
-                "name": "Getting Started",
-                "description": "Added 10 transactions",
-                "icon": "📝",
-                "condition": lambda: total_transactions >= 10
-            },
-            "fifty_transactions": {
-                "name": "Dedicated Tracker",
-                "description": "Added 50 transactions",
-                "icon": "📊",
-                "condition": lambda: total_transactions >= 50
-            },
-            "hundred_transactions": {
-                "name": "Master Tracker",
-                "description": "Added 100 transactions",
-                "icon": "🏆",
-                "condition": lambda: total_transactions >= 100
-            },
-            "first_category": {
-                "name": "Category Explorer",
-                "description": "Used your first spending category",
-                "icon": "🏷️",
-                "condition": lambda: categories_used >= 1
-            },
-            "five_categories": {
-                "name": "Category Master",
-                "description": "Used 5 different categories",
-                "icon": "🎨",
-                "condition": lambda: categories_used >= 5
-            },
-            "first_limit": {
-                "name": "Budget Setter",
-                "description": "Set your first spending limit",
-                "icon": "💰",
-                "condition": lambda: len(limits_data) >= 1
-            },
-            "under_budget": {
-                "name": "Budget Master",
-                "description": "Stayed under budget for a category",
-                "icon": "✅",
-                "condition": lambda: self.check_under_budget(transactions, limits_data)
-            },
-            "low_spending_day": {
-                "name": "Frugal Day",
-                "description": "Spent less than $20 in a day",
-                "icon": "💡",
-                "condition": lambda: self.check_low_spending_day(transactions)
-            },
-            "consistent_tracker": {
-                "name": "Consistent Tracker",
-                "description": "Added transactions for 7 consecutive days",
-                "icon": "📅",
-                "condition": lambda: self.check_consecutive_days(transactions)
-            }
-        }
-        
-        # Check each achievement
-        for achievement_id, achievement in achievement_definitions.items():
-            if (achievement_id not in self.achievements["unlocked"] and 
-                achievement["condition"]()):
+        for achievement_id, achievement in locked:
+            if progress.get(achievement["metric"], 0) >= achievement["target"]:
                 self.achievements["unlocked"].append(achievement_id)
+                unlocked_dates[achievement_id] = unlocked_date
+                self.dirty = True
                 new_achievements.append({
                     "id": achievement_id,
                     "name": achievement["name"],
                     "description": achievement["description"],
                     "icon": achievement["icon"],
-                    "unlocked_date": str(date.today())
+                    "unlocked_date": unlocked_date
                 })
-        
-        # Save achievements
-        self.save_achievements()
+        # Drop values no locked achievement reads any more, so nothing left in progress goes stale
+        waiting = {achievement["metric"] for achievement_id, achievement in locked
+                   if achievement_id not in self.achievements["unlocked"]}
+        for metric in set(progress) - waiting:
+            del progress[metric]
+            self.dirty = True
         return new_achievements
-    
-    def check_under_budget(self, transactions, limits_data):
-        """Check if user stayed under budget for any category."""
-        current_month = date.today().strftime("%m")
-        
-        for limit in limits_data:
-            category = limit.get("Category")
-            limit_amount = float(limit.get("Limit", 0))
-            
-            # Calculate spending for this category this month
-            category_spending = sum(
-                float(tx.get('Amount', 0)) 
-                for tx in transactions 
-                if (tx.get('Category') == category and 
-                    current_month in tx.get('Date', ''))
-            )
-            
-            if category_spending > 0 and category_spending < limit_amount:
-                return True
-        return False
-    
-    def check_low_spending_day(self, transactions):
-        """Check if user had a day with spending under $20."""
-        today = date.today().strftime("%m/%d/%Y")
-        today_spending = sum(
-            float(tx.get('Amount', 0)) 
-            for tx in transactions 
-            if tx.get('Date') == today
-        )
-        return today_spending > 0 and today_spending < 20
-    
-    def check_consecutive_days(self, transactions):
-        """Check if user added transactions for 7 consecutive days."""
-        if len(transactions) < 7:
-            return False
-        
-        # Get unique dates from transactions
-        dates = set()
-        for tx in transactions:
-            if tx.get('Date'):
-                dates.add(tx.get('Date'))
-        
-        # Convert to date objects and sort
-        date_objects = []
-        for date_str in dates:
-            try:
-                month, day, year = date_str.split('/')
-                date_objects.append(date(int(year), int(month), int(day)))
-            except:
-                continue
-        
-        date_objects.sort()
-        
-        # Check for 7 consecutive days
-        for i in range(len(date_objects) - 6):
-            start_date = date_objects[i]
-            end_date = start_date + timedelta(days=6)
-            
-            consecutive_dates = set()
-            for d in date_objects:
-                if start_date <= d <= end_date:
-                    consecutive_dates.add(d)
-            
-            if len(consecutive_dates) == 7:
-                return True
-        
-        return False
+
+    def _save_changes(self):
+        # Save achievements, if the counters or unlocks changed
+        if self.dirty:
+            self.achievements["stats"] = self.stats.as_dict()
+            self.save_achievements()
     
     def get_all_achievements(self):
         """Get all achievement definitions."""
         return {
-            "first_transaction": {"name": "First Steps", "description": "Added your first transaction", "icon": "🎯"},
-            "ten_transactions": {"name": "Getting Started", "description": "Added 10 transactions", "icon": "📝"},
-            "fifty_transactions": {"name": "Dedicated Tracker", "description": "Added 50 transactions", "icon": "📊"},
-            "hundred_transactions": {"name": "Master Tracker", "description": "Added 100 transactions", "icon": "🏆"},
-            "first_category": {"name": "Category Explorer", "description": "Used your first spending category", "icon": "🏷️"},
-            "five_categories": {"name": "Category Master", "description": "Used 5 different categories", "icon": "🎨"},
-            "first_limit": {"name": "Budget Setter", "description": "Set your first spending limit", "icon": "💰"},
-            "under_budget": {"name": "Budget Master", "description": "Stayed under budget for a category", "icon": "✅"},
-            "low_spending_day": {"name": "Frugal Day", "description": "Spent less than $20 in a day", "icon": "💡"},
-            "consistent_tracker": {"name": "Consistent Tracker", "description": "Added transactions for 7 consecutive days", "icon": "📅"}
+            achievement_id: {key: achievement[key] for key in ("name", "description", "icon", "metric", "target")}
+            for achievement_id, achievement in ACHIEVEMENTS.items()
         }
+
+    def get_progress(self):
+        """{achievement id: {"value", "target", "percent"}} from the cached metric values; nothing is recomputed."""
+        progress = {}
+        for achievement_id, achievement in ACHIEVEMENTS.items():
+            target = achievement["target"]
+            if achievement_id in self.achievements["unlocked"]:
+                value = target
+            else:
+                value = min(self.achievements["progress"].get(achievement["metric"], 0), target)
+            progress[achievement_id] = {"value": value, "target": target, "percent": round(value / target * 100, 1)}
+        return progress
     
     def get_unlocked_achievements(self):
         """Get list of unlocked achievements."""
         all_achievements = self.get_all_achievements()
         unlocked = []
         
+        unlocked_dates = self.achievements.get("unlocked_dates", {})
         for achievement_id in self.achievements["unlocked"]:
             if achievement_id in all_achievements:
                 unlocked.append({
                     "id": achievement_id,
-                    **all_achievements[achievement_id]
+                    **all_achievements[achievement_id],
+                    "unlocked_date": unlocked_dates.get(achievement_id)
                 })
         
         return unlocked 
\ No newline at end of file
@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+
+from columnar import generation_digest
+from dates import month_key
+from locking import atomic_write_json
+
+
+def to_cents(amount):
+    """Amounts are summed as integer cents so incremental and rebuilt totals agree exactly."""
+    try:
+        return round(float(amount) * 100)
+    except (TypeError, ValueError):
+        return 0
+
+def row_deltas(row, sign=1):
+    """The (category, month, cents, count) change adding (sign=1) or removing (sign=-1) a row makes."""
+    return [(row.get("Category", '') or '', month_key(row.get("Date")), sign * to_cents(row.get("Amount")), sign)]
+
+
+class AggregateTable:
+    """Running (category, month) -> [cents, count] totals kept next to the data file.
+
+    Every write applies its deltas while holding the store's write lock, so a
+    limit check is a dictionary lookup instead of a scan. The table records
+    the store generation it matches; if another process changed the data
+    without updating it (or the file is missing), the next read rebuilds it
+    from a full pass over the transactions.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mutex = threading.RLock()
+        self._file_id = None
+        self._digest = None
+        self._totals = {}
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+
+    def month_totals(self, month, generation, load_rows):
+        """Return {category: {"total", "count"}} for one 'YYYY-MM' month."""
+        self._ensure_current(generation, load_rows)
+        with self._mutex:
+            return {
+                category: {"total": months[month][0] / 100, "count": months[month][1]}
+                for category, months in self._totals.items()
+                if month in months and months[month][1]
+            }
+
+    def lookup(self, category, month, generation, load_rows):
+        """Return (total, count) for one category in one 'YYYY-MM' month."""
+        self._ensure_current(generation, load_rows)
+        with self._mutex:
+            cents, count = self._totals.get(category, {}).get(month, (0, 0))
+            return cents / 100, count
+
+    def _ensure_current(self, generation, load_rows):
+        """Rebuild the table if it doesn't match ``generation``.
+
+        The rows are read without holding the mutex: reading them waits for
+        the store's lock, and a writer holding that lock needs the mutex to
+        apply its deltas.
+        """
+        with self._mutex:
+            self._load()
+            if self._digest == generation_digest(generation).hex():
+                return
+        self.rebuild(load_rows(), generation)
+
+    def _load(self):
+        """Re-read the table if another worker replaced it since we last looked."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self._file_id = None
+            self._digest = None
+            self._totals = {}
+            return
+        file_id = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if file_id == self._file_id:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self._digest = data["generation"]
+            self._totals = data["totals"]
+        except (OSError, ValueError, KeyError):
+            self._digest = None
+            self._totals = {}
+        self._file_id = file_id
+
+    def _save(self):
+        atomic_write_json(self.path, {"generation": self._digest, "totals": self._totals},
+                          separators=(",", ":"))
+        st = os.stat(self.path)
+        self._file_id = (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+
+    def apply(self, deltas, before_generation, after_generation):
+        """Apply (category, month, cents, count) deltas if the table matched the store before the write.
+
+        Callers hold the store's write lock. A stale table is left alone and
+        rebuilt on its next read.
+        """
+        with self._mutex:
+            self._load()
+            if self._digest != generation_digest(before_generation).hex():
+                return False
+            for category, month, cents, count in deltas:
+                cell = self._totals.setdefault(category, {}).setdefault(month, [0, 0])
+                cell[0] += cents
+                cell[1] += count
+                if cell[1] <= 0:
+                    del self._totals[category][month]
+                    if not self._totals[category]:
+                        del self._totals[category]
+            self._digest = generation_digest(after_generation).hex()
+            self._save()
+            return True
+
+    def rebuild(self, rows, generation):
+        """Recompute the whole table from ``rows``; returns the number of (category, month) cells."""
+        totals = self._tally(rows)
+        with self._mutex:
+            self._install(totals, generation)
+        return sum(len(months) for months in totals.values())
+
+    @staticmethod
+    def _tally(rows):
+        totals = {}
+        for row in rows:
+            for category, month, cents, count in row_deltas(row):
+                cell = totals.setdefault(category, {}).setdefault(month, [0, 0])
+                cell[0] += cents
+                cell[1] += count
+        return totals
+
+    def _install(self, totals, generation):
+        self._totals = totals
+        self._digest = generation_digest(generation).hex()
+        self._save()
+
+    def verify(self, rows, generation):
+        """Rebuild from ``rows`` and return the cells the incremental table had wrong.
+
+        Returns a list of (category, month, (cents, count) before, (cents, count) rebuilt).
+        """
+        totals = self._tally(rows)
+        with self._mutex:
+            self._load()
+            before = {(category, month): tuple(cell)
+                      for category, months in self._totals.items() for month, cell in months.items()}
+            self._install(totals, generation)
+        after = {(category, month): tuple(cell)
+                 for category, months in totals.items() for month, cell in months.items()}
+        return [
+            (category, month, before.get((category, month), (0, 0)), after.get((category, month), (0, 0)))
+            for category, month in sorted(set(before) | set(after))
+            if before.get((category, month)) != after.get((category, month))
+        ]
@@ -0,0 +1,80 @@
+import os
+import threading
+from bisect import bisect_right
+
+from aggregates import to_cents
+
+# Percent-of-limit levels every limit alerts at, on top of its own alert threshold
+DEFAULT_LEVELS = tuple(int(level) for level in os.environ.get("ALERT_LEVELS", "100,120").split(",") if level.strip())
+
+
+class AlertRules:
+    """Spending-limit alert levels compiled into sorted crossing points per category.
+
+    Each limit alerts at its own ``alert_threshold`` plus ``levels`` (percent
+    of the limit). The levels are turned into ascending cent amounts once per
+    Limit, so checking a write is two binary searches: an alert fires only
+    for the boundaries that spending actually moved across, never again for
+    a level it already sits above.
+
+    Checks run after the commit, possibly after later writes have landed
+    too, so ``observe`` remembers the level each (category, period) was last
+    seen at and fires when spending reaches a higher one.
+    """
+
+    def __init__(self, limits, levels=None):
+        self.limits = limits
+        self.levels = DEFAULT_LEVELS if levels is None else tuple(levels)
+        self._mutex = threading.Lock()
+        self._compiled = {}
+        self._seen = {}
+
+    def boundaries(self, category):
+        """(limit, [cents...], [percent...]) for ``category``, or None if it has no limit."""
+        limit = self.limits.get(category)
+        if limit is None:
+            return None
+        with self._mutex:
+            compiled = self._compiled.get(category)
+            # Reloading the limits index creates new Limit objects, which invalidates these
+            if compiled is None or compiled[0] is not limit:
+                percents = sorted({limit.alert_threshold, *self.levels})
+                percents = [percent for percent in percents if percent > 0]
+                cents = [to_cents(limit.limit * percent / 100) for percent in percents]
+                compiled = (limit, cents, percents)
+                self._compiled[category] = compiled
+                self._seen = {key: seen for key, seen in self._seen.items() if key[0] != category}
+            return compiled
+
+    def crossed(self, category, before, after):
+        """Levels (percent, ascending) that spending crossed going from ``before`` to ``after`` dollars.
+
+        Only upward crossings count; reaching a boundary exactly counts as
+        crossing it.
+        """
+        compiled = self.boundaries(category)
+        if compiled is None:
+            return []
+        _, cents, percents = compiled
+        low = bisect_right(cents, to_cents(before))
+        high = bisect_right(cents, to_cents(after))
+        return percents[low:high]
+
+    def observe(self, category, period, before, now):
+        """Record spending ``now`` for ``category`` in ``period``; returns the level to alert at, or None.
+
+        ``before`` is the spending just before the write being checked and
+        is only used the first time a (category, period) is seen. Falling
+        back below a level re-arms it.
+        """
+        compiled = self.boundaries(category)
+        if compiled is None:
+            return None
+        _, cents, percents = compiled
+        level = bisect_right(cents, to_cents(now))
+        with self._mutex:
+            seen = self._seen.get((category, period))
+            if seen is None:
+                seen = bisect_right(cents, to_cents(before))
+            self._seen[(category, period)] = level
+        return percents[level - 1] if level > seen else None
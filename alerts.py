@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import date
+
+from journal import file_generation
+from locking import FileLock, atomic_write_json
+
+# Alerts older than this many days are dropped, so daily keys don't pile up
+DEFAULT_TTL_DAYS = int(os.environ.get("ALERT_TTL_DAYS", 7))
+
+# How many change events the file keeps for reconnecting stream clients
+EVENT_LOG_SIZE = int(os.environ.get("ALERT_EVENT_LOG_SIZE", 200))
+
+# How often a waiting stream re-checks the file for changes made by other workers
+POLL_INTERVAL = 0.5
+
+
+def alert_age_days(alert, today=None):
+    """Days since the alert's 'timestamp' (an ISO date); 0 if it has none."""
+    try:
+        created = date.fromisoformat(str(alert.get("timestamp", ''))[:10])
+    except ValueError:
+        return 0
+    return ((today or date.today()) - created).days
+
+
+class AlertStore:
+    """Active spending alerts keyed by alert key, shared by every worker through one JSON file.
+
+    Each worker keeps the alerts in a dict and re-reads the file only when
+    its (inode, size, mtime) changes, so a duplicate alert or a dismiss of a
+    missing key is answered from memory. Changes take the file's lock,
+    re-read, and replace the file atomically; expired alerts are pruned on
+    every change.
+
+    Every change is also numbered and kept in a short event log
+    ("created", "dismissed", "expired" or "cleared") so the alert stream
+    can push it and replay what a reconnecting client missed.
+    """
+
+    def __init__(self, path, ttl_days=None):
+        self.path = path
+        self.ttl_days = DEFAULT_TTL_DAYS if ttl_days is None else ttl_days
+        self.lock = FileLock(path)
+        self._mutex = threading.RLock()
+        self._generation = None
+        self._alerts = {}
+        self._events = []
+        self.seq = 0
+        self.epoch = ''
+        self._changed = threading.Condition(self._mutex)
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+
+    def active(self):
+        """Unexpired alerts in the order they were raised (the /get_alerts list)."""
+        with self._mutex:
+            self._load()
+            return [dict(alert) for alert in self._alerts.values() if not self._expired(alert)]
+
+    def snapshot(self):
+        """(seq, active alerts) read together, for a stream client starting from scratch."""
+        with self._mutex:
+            alerts = self.active()
+            return self.seq, alerts
+
+    def version(self):
+        """A validator for the active alert list: changes whenever the list can have.
+
+        ``epoch`` is fixed when the file is first written, so a recreated file
+        never reuses an old (epoch, seq) pair; the date is included because
+        alerts expire by day without a write.
+        """
+        with self._mutex:
+            self._load()
+            return f"{self.epoch}-{self.seq}-{date.today().toordinal()}"
+
+    def __contains__(self, key):
+        with self._mutex:
+            self._load()
+            alert = self._alerts.get(key)
+            return alert is not None and not self._expired(alert)
+
+    def events_since(self, last_id):
+        """Return (seq, events after ``last_id``), or (seq, None) if the log no longer covers it."""
+        with self._mutex:
+            self._load()
+            if last_id == self.seq:
+                return self.seq, []
+            if last_id > self.seq or not self._events or self._events[0]["id"] > last_id + 1:
+                return self.seq, None
+            return self.seq, [dict(event) for event in self._events if event["id"] > last_id]
+
+    def wait(self, seq, timeout):
+        """Block until the store moves past ``seq`` (in any worker) or ``timeout`` runs out.
+
+        Returns True if there was a change.
+        """
+        deadline = time.monotonic() + timeout
+        with self._mutex:
+            while True:
+                self._load()
+                if self.seq != seq:
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                # Changes from this worker wake us at once; others are seen on the next poll
+                self._changed.wait(min(POLL_INTERVAL, remaining))
+
+    def _expired(self, alert):
+        return alert_age_days(alert) > self.ttl_days
+
+    def _load(self):
+        generation = file_generation(self.path)
+        if generation == self._generation:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        # Older files hold a plain list of alerts, or just the key -> alert map
+        if isinstance(data, list):
+            data = {"alerts": {alert["key"]: alert for alert in data if isinstance(alert, dict) and alert.get("key")}}
+        elif not isinstance(data, dict) or "alerts" not in data:
+            data = {"alerts": data if isinstance(data, dict) else {}}
+        self._alerts = data["alerts"]
+        self._events = data.get("events", [])
+        self.seq = data.get("seq", 0)
+        self.epoch = data.get("epoch", '')
+        self._generation = generation
+
+    def _record(self, event, key=None, alert=None):
+        self.seq += 1
+        self._events.append({"id": self.seq, "event": event, "key": key, "alert": alert})
+
+    def _save(self):
+        for key, alert in list(self._alerts.items()):
+            if self._expired(alert):
+                del self._alerts[key]
+                self._record("expired", key)
+        self._events = self._events[-EVENT_LOG_SIZE:]
+        self.epoch = self.epoch or uuid.uuid4().hex[:12]
+        atomic_write_json(self.path, {"epoch": self.epoch, "seq": self.seq, "alerts": self._alerts,
+                                      "events": self._events}, indent=2)
+        self._generation = file_generation(self.path)
+        self._changed.notify_all()
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+
+    def add(self, key, alert):
+        """Store ``alert`` under ``key``; returns False if an unexpired alert already has that key."""
+        with self._mutex:
+            if key in self:
+                return False
+            with self.lock.exclusive():
+                self._load()
+                if key in self:
+                    return False
+                self._alerts.pop(key, None)
+                self._alerts[key] = dict(alert, key=key)
+                self._record("created", key, self._alerts[key])
+                self._save()
+            return True
+
+    def dismiss(self, key):
+        """Remove one alert; returns False if there was nothing to remove."""
+        with self._mutex:
+            self._load()
+            if key not in self._alerts:
+                return False
+            with self.lock.exclusive():
+                self._load()
+                if self._alerts.pop(key, None) is None:
+                    return False
+                self._record("dismissed", key)
+                self._save()
+            return True
+
+    def clear(self):
+        with self._mutex, self.lock.exclusive():
+            self._load()
+            self._alerts = {}
+            self._record("cleared")
+            self._save()
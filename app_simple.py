@@ -1,10 +1,21 @@
-from flask import Flask, render_template, request, redirect, flash, url_for, jsonify, send_file
-import csv
+from flask import Flask, render_template, request, redirect, flash, url_for, jsonify, send_file, Response, stream_with_context
 import os
 import json
+import threading
+import time
 from datetime import date
 from Transaction_pt2 import Transaction, FoodTransaction, TravelTransaction, TransportationTransaction, BillsUtilitiesTransaction, AcademicTransaction, HealthTransaction
-from achievements import AchievementSystem
+from achievements import AchievementStore
+from backfill import backfill_user
+from storage import get_engine, TRANSACTION_FIELDS
+from dates import month_range, parse_day, today_day
+from limits_store import import_legacy_json
+from alerts import AlertStore
+from pipeline import NoticeBox, PostCommitPipeline
+from budget import in_period, limit_spending, month_budget
+from alert_rules import AlertRules
+from projection import SpendProjector
+from columnar import generation_digest
 from werkzeug.utils import secure_filename
 import qrcode
 
@@ -13,87 +24,91 @@ app.secret_key = "supersecretkey"
 
 CSV_FILE = "file.csv"
 LIMITS_FILE = "limits.csv"
+ALERTS_FILE = "active_alerts.json"
+alert_store = AlertStore(ALERTS_FILE)
 
-# Ensure CSV exists with all columns
-if not os.path.exists(CSV_FILE):
-    with open(CSV_FILE, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            "Id", "Name", "Amount", "Date", "Category",
-            "Subcategory", "Location",
-            "Destination", "Transport_Mode",
-            "Transport_Type",
-            "Bill_Type", "Provider",
-            "Academic_Type", "Institution",
-            "Health_Type", "Notes", "Receipt_Image"
-        ])
+# Alert stream timing: a comment line every ALERT_HEARTBEAT seconds keeps proxies from
+# closing an idle stream, and each stream ends after ALERT_STREAM_LIFETIME seconds so
+# it doesn't pin a worker thread for long (the browser reconnects with Last-Event-ID).
+# Each open stream holds one of the worker's gunicorn threads, so at most
+# ALERT_MAX_STREAMS are served per worker; past that the stream answers 204 and the
+# page polls /get_alerts instead, leaving the other threads for ordinary requests.
+ALERT_HEARTBEAT = float(os.environ.get("ALERT_HEARTBEAT", 10))
+ALERT_STREAM_LIFETIME = float(os.environ.get("ALERT_STREAM_LIFETIME", 60))
+ALERT_MAX_STREAMS = int(os.environ.get("ALERT_MAX_STREAMS", 2))
+ALERT_RETRY_MS = 3000
+alert_stream_slots = threading.BoundedSemaphore(ALERT_MAX_STREAMS)
+
+# Limit checks and achievements run after the write commits, off the request thread;
+# their messages wait in NOTICES_FILE and are flashed on the user's next page view.
+# The app has a single user, so all post-commit work is ordered under one key.
+NOTICES_FILE = "pending_notices.json"
+DEFAULT_USER = "default"
+post_commit = PostCommitPipeline()
+notices = NoticeBox(NOTICES_FILE)
+achievement_store = AchievementStore()
+
+# Transactions and limits go through the configured storage engine (STORAGE_ENGINE=csv|sqlite)
+store = get_engine(CSV_FILE, LIMITS_FILE)
+
+# Limits used to live in limits.json; fold any such file into the store once
+import_legacy_json(store)
+
+# Limit levels (each limit's own threshold plus ALERT_LEVELS) as sorted crossing points
+alert_rules = AlertRules(store.limits)
+
+# Month-end projections per limit, rebuilt from the running totals only when the data changes
+projector = SpendProjector(store)
 
 # Load existing IDs into Transaction._used_ids
-if os.path.exists(CSV_FILE):
-    with open(CSV_FILE, 'r') as f:
-        reader = csv.DictReader(f)
-        Transaction._used_ids = set()
-        for row in reader:
-            if row.get("Id") and row["Id"].strip():
-                try:
-                    Transaction._used_ids.add(int(row["Id"]))
-                except ValueError:
-                    pass
-
-# Ensure limits CSV exists
-if not os.path.exists(LIMITS_FILE):
-    with open(LIMITS_FILE, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(["Category", "Limit", "Alert_Threshold"])
-
-def read_csv_data(filename):
-    """Read CSV data and return as list of dictionaries."""
-    if not os.path.exists(filename):
-        return []
-    
+Transaction._used_ids = set()
+for row in store.iter_transactions(columns=["Id"]):
+    if row.get("Id") and row["Id"].strip():
+        try:
+            Transaction._used_ids.add(int(row["Id"]))
+        except ValueError:
+            pass
+
+def read_transactions():
+    """Read all transactions from the storage engine."""
     try:
-        with open(filename, 'r') as f:
-            reader = csv.DictReader(f)
-            data = list(reader)
-            # Clean up any None values or empty strings
-            for row in data:
-                for key in row:
-                    if row[key] is None:
-                        row[key] = ''
-            return data
+        return store.load_transactions()
     except Exception as e:
-        print(f"Error reading CSV file {filename}: {e}")
+        print(f"Error reading transactions: {e}")
         return []
 
-def write_csv_data(filename, data, fieldnames):
-    """Write data to CSV file."""
-    with open(filename, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(data)
-
-def get_monthly_spending(category):
-    """Calculate monthly spending for a category."""
-    transactions = read_csv_data(CSV_FILE)
-    current_month = date.today().strftime("%m")
-    total = 0.0
-    
-    for tx in transactions:
-        if tx.get("Category") == category:
-            # Extract month from date
-            date_str = tx.get("Date", "")
-            if "/" in date_str:
-                tx_month = date_str.split("/")[0]
-                if tx_month == current_month:
-                    try:
-                        amount = float(tx.get("Amount", 0))
-                        total += amount
-                    except ValueError:
-                        pass
-    
-    return total
+def achievement_history():
+    """Stream just what the achievement counters are built from."""
+    return store.iter_transactions(columns=["Category", "Amount", "Day"])
+
+def check_new_achievements(rows, user=DEFAULT_USER, removed=()):
+    """Advance ``user``'s achievements by newly committed transaction ``rows`` (and ``removed`` rows an
+    edit or delete took away); returns the newly unlocked ones."""
+    # The user's achievements are updated and rewritten, so keep other workers out meanwhile
+    with achievement_store.lock(user).exclusive():
+        achievement_system = achievement_store.get(user)
+        return achievement_system.record_transactions(rows, store.limits.rows(), store.category_totals(date.today().strftime("%Y-%m")),
+                                                      history=achievement_history, limits_version=store.limits.version(),
+                                                      removed=removed)
+
+def record_achievements(rows, removed=(), user=DEFAULT_USER):
+    """Post-commit achievement update for added, edited or deleted rows; unlocks wait as a notice."""
+    new_achievements = check_new_achievements(rows, user, removed)
+    if new_achievements:
+        achievement_names = [f"{a['icon']} {a['name']}" for a in new_achievements]
+        notices.post(user, f"🎉 New achievements unlocked: {', '.join(achievement_names)}")
 
+def after_transaction_commit(row, committed_spending=None, user=DEFAULT_USER):
+    """Post-commit work for a new transaction: spending alerts, then achievements."""
+    check_spending_limits(row["Category"], row["Amount"], row.get("Date"), committed_spending)
+    record_achievements([row], user=user)
 
+@app.before_request
+def deliver_notices():
+    """Flash whatever background work left for the user since their last page view."""
+    if request.method == 'GET' and request.endpoint not in ('static', 'get_alerts', 'alert_stream', 'qr_image'):
+        for message in notices.take(DEFAULT_USER):
+            flash(message)
 
 # Website Notification Function
 def create_spending_alert(category, current_spending, limit, threshold_percentage):
@@ -111,73 +126,56 @@ def create_spending_alert(category, current_spending, limit, threshold_percentag
             'timestamp': str(date.today())
         }
         
-        # Read existing alerts
-        alert_file = "active_alerts.json"
-        if os.path.exists(alert_file):
-            with open(alert_file, 'r') as f:
-                alerts = json.load(f)
-        else:
-            alerts = []
-        
         # Create a unique key based on category and threshold
         alert_key = f"{category}_{threshold_percentage}_{int(date.today().strftime('%Y%m%d'))}"
         
-        if not any(alert.get('key') == alert_key for alert in alerts):
-            alert_data['key'] = alert_key
-            alerts.append(alert_data)
-            
-            # Save alerts
-            with open(alert_file, 'w') as f:
-                json.dump(alerts, f)
-            
+        if alert_store.add(alert_key, alert_data):
             print(f"Spending alert created for {category}: ${current_spending:.2f} / ${limit:.2f} ({threshold_percentage}%)")
             return True
-        else:
-            print(f"Alert already exists for {category} at {threshold_percentage}% threshold, level {spending_level}")
         
+        print(f"Alert already exists for {category} at {threshold_percentage}% threshold")
         return False
     except Exception as e:
         print(f"Error creating spending alert: {e}")
         return False
 
-def check_spending_limits(category, new_amount):
-    """Check if adding a new transaction would trigger a spending limit alert."""
+def limit_period(category_limit):
+    """Key of the period a limit is measured over: the month, or the rolling window."""
+    if category_limit.window_days:
+        return f"{category_limit.window_days}d"
+    return date.today().strftime("%Y-%m")
+
+def spending_at_commit(category):
+    """Spending against ``category``'s limit right after a write (None without a limit); a totals lookup."""
+    category_limit = store.limits.get(category)
+    return None if category_limit is None else limit_spending(store, category_limit)
+
+def check_spending_limits(category, new_amount, tx_date=None, committed_spending=None):
+    """Raise an alert when a just-committed transaction moved spending up to a new limit level.
+
+    ``committed_spending`` is the spending read right after the commit; the
+    check itself runs later, when other writes may have landed as well.
+    """
     try:
-        if not os.path.exists(LIMITS_FILE):
+        category_limit = store.limits.get(category)
+        if category_limit is None:
             return
         
-        limits_data = read_csv_data(LIMITS_FILE)
-        if not limits_data:
+        # Only transactions inside the limit's current period (month or rolling window) count
+        if tx_date and not in_period(category_limit, parse_day(tx_date)):
             return
         
-        # Find limit for this category
-        category_limit = None
-        for limit_row in limits_data:
-            if limit_row.get("Category") == category:
-                category_limit = limit_row
-                break
+        total_spending = limit_spending(store, category_limit)
+        if committed_spending is None:
+            committed_spending = total_spending
+        previous_spending = committed_spending - float(new_amount)
         
-        if not category_limit:
+        level = alert_rules.observe(category, limit_period(category_limit), previous_spending, total_spending)
+        if level is None:
             return
         
-        limit_amount = float(category_limit.get("Limit", 0))
-        threshold_percentage = int(category_limit.get("Alert_Threshold", 0))
-        
-        # Calculate current spending for this category
-        monthly_spending = get_monthly_spending(category)
-        
-        # Add the new transaction amount
-        total_spending = monthly_spending + float(new_amount)
-        
-        # Check if this would trigger an alert
-        threshold_amount = limit_amount * (threshold_percentage / 100)
-        
-        print(f"Debug - Category: {category}, Monthly spending: ${monthly_spending:.2f}, New amount: ${float(new_amount):.2f}, Total: ${total_spending:.2f}")
-        print(f"Debug - Limit: ${limit_amount:.2f}, Threshold: {threshold_percentage}%, Threshold amount: ${threshold_amount:.2f}")
-        
-        if total_spending >= threshold_amount:
-            # Create website alert
-            create_spending_alert(category, total_spending, limit_amount, threshold_percentage)
+        print(f"Debug - Category: {category} ({category_limit.period}), Spending: ${previous_spending:.2f} -> ${total_spending:.2f}, Limit: ${category_limit.limit:.2f}, Level: {level}%")
+        create_spending_alert(category, total_spending, category_limit.limit, level)
     
     except Exception as e:
         print(f"Error checking spending limits: {e}")
@@ -198,36 +196,24 @@ def dashboard():
         # Get today's date
         today = date.today().strftime("%Y-%m-%d")
         
-        # Load transactions for stats
-        transactions = read_csv_data(CSV_FILE)
-        
-        # Calculate stats for current month
-        current_month = date.today().strftime("%m/%Y")
-        monthly_transactions = []
-        total_spending = 0.0
+        # Calculate stats for current month from the engine's per-category aggregates
+        current_month = date.today().strftime("%Y-%m")
+        monthly_totals = store.category_totals(current_month)
         
-        for tx in transactions:
-            if current_month in tx.get('Date', ''):
-                monthly_transactions.append(tx)
-                try:
-                    amount = float(tx.get('Amount', 0))
-                    total_spending += amount
-                except ValueError:
-                    pass
-        
-        transaction_count = len(monthly_transactions)
+        total_spending = sum(entry["total"] for entry in monthly_totals.values())
+        transaction_count = sum(entry["count"] for entry in monthly_totals.values())
         avg_transaction = total_spending / transaction_count if transaction_count > 0 else 0
         
         # Get top category
-        category_counts = {}
-        for tx in monthly_transactions:
-            category = tx.get('Category', 'Unknown')
-            category_counts[category] = category_counts.get(category, 0) + 1
-        
+        category_counts = {category or 'Unknown': entry["count"] for category, entry in monthly_totals.items()}
         top_category = max(category_counts.items(), key=lambda x: x[1])[0] if category_counts else 'N/A'
         
         # Get recent transactions (last 5)
-        recent_transactions = transactions[-5:] if transactions else []
+        recent_transactions = store.recent_transactions(5)
+        
+        # Month-end projections, the ones closest to their limit first
+        projections = sorted(projector.projections().values(),
+                             key=lambda p: (p["days_until_limit"] is None, p["days_until_limit"] or 0, -p["projected_spending"]))
         
         return render_template('index.html', 
                              today=today,
@@ -235,7 +221,8 @@ def dashboard():
                              transaction_count=transaction_count,
                              avg_transaction=f"${avg_transaction:.2f}",
                              top_category=top_category,
-                             recent_transactions=recent_transactions)
+                             recent_transactions=recent_transactions,
+                             projections=projections)
                              
     except Exception as e:
         print(f"Error in dashboard route: {e}")
@@ -245,29 +232,15 @@ def dashboard():
                              transaction_count=0,
                              avg_transaction="$0.00",
                              top_category="N/A",
-                             recent_transactions=[])
+                             recent_transactions=[],
+                             projections=[])
 
 @app.route('/transactions')
 def transactions():
     try:
-        transactions_list = read_csv_data(CSV_FILE)
-        # Ensure all transactions have required fields and convert amounts to float
-        for tx in transactions_list:
-            if 'Id' not in tx or not tx['Id']:
-                tx['Id'] = '0'
-            if 'Name' not in tx:
-                tx['Name'] = ''
-            if 'Amount' not in tx:
-                tx['Amount'] = 0.0
-            else:
-                try:
-                    tx['Amount'] = float(tx['Amount'])
-                except (ValueError, TypeError):
-                    tx['Amount'] = 0.0
-            if 'Date' not in tx:
-                tx['Date'] = ''
-            if 'Category' not in tx:
-                tx['Category'] = ''
+        # Rows come from the storage engine's typed cache: every column is present and Amount is a float.
+        # The cached rows are shared, so copy the few that need a placeholder Id instead of mutating them.
+        transactions_list = [tx if tx.get('Id') else {**tx, 'Id': '0'} for tx in read_transactions()]
     except Exception as e:
         print(f"Error reading transactions: {e}")
         transactions_list = []
@@ -276,8 +249,6 @@ def transactions():
 @app.route('/add', methods=['GET', 'POST'])
 def add_transaction():
     if request.method == 'POST':
-        transactions = read_csv_data(CSV_FILE)
-
         name = request.form.get("name")
         amount = request.form.get("amount")
         category = request.form.get("category")
@@ -298,34 +269,13 @@ def add_transaction():
         else:
             tx = Transaction(name, amount, today, category)
 
-        # Add new transaction
-        transactions.append(tx.get_info())
-        
-        # Write back to CSV
-        fieldnames = [
-            "Id", "Name", "Amount", "Date", "Category",
-            "Subcategory", "Location",
-            "Destination", "Transport_Mode",
-            "Transport_Type",
-            "Bill_Type", "Provider",
-            "Academic_Type", "Institution",
-            "Health_Type"
-        ]
-        write_csv_data(CSV_FILE, transactions, fieldnames)
+        # Save through the storage engine; the write is committed once this returns (and on disk
+        # at once under JOURNAL_FSYNC=always, within JOURNAL_FSYNC_INTERVAL under the default)
+        row = store.add_transaction(tx.get_info())
 
-        # Check if this transaction triggers a spending limit alert
-        check_spending_limits(category, amount)
-        
-        # Check for new achievements
-        achievement_system = AchievementSystem()
-        limits_data = read_csv_data(LIMITS_FILE)
-        new_achievements = achievement_system.check_achievements(transactions, limits_data)
-        
-        if new_achievements:
-            achievement_names = [f"{a['icon']} {a['name']}" for a in new_achievements]
-            flash(f"Transaction added successfully! 🎉 New achievements unlocked: {', '.join(achievement_names)}")
-        else:
-            flash("Transaction added successfully!")
+        # Limit alerts and achievements surface through the alert feed and the next page's flash
+        post_commit.submit(DEFAULT_USER, after_transaction_commit, row, spending_at_commit(category))
+        flash("Transaction added successfully!")
 
         return redirect('/transactions')
 
@@ -382,10 +332,9 @@ def upload_receipt():
             if receipt_image:
                 transaction.receipt_image = receipt_image
             
-            # Save to CSV
-            transactions = read_csv_data(CSV_FILE)
+            # Save through the storage engine
             transaction_dict = {
-                "Id": transaction.id,
+                "Id": transaction.transaction_id,
                 "Name": transaction.name,
                 "Amount": transaction.amount,
                 "Date": transaction.date,
@@ -404,21 +353,10 @@ def upload_receipt():
                 "Receipt_Image": getattr(transaction, 'receipt_image', '')
             }
             
-            transactions.append(transaction_dict)
-            
-            fieldnames = [
-                "Id", "Name", "Amount", "Date", "Category",
-                "Subcategory", "Location",
-                "Destination", "Transport_Mode",
-                "Transport_Type",
-                "Bill_Type", "Provider",
-                "Academic_Type", "Institution",
-                "Health_Type", "Notes", "Receipt_Image"
-            ]
-            write_csv_data(CSV_FILE, transactions, fieldnames)
+            row = store.add_transaction(transaction_dict)
             
-            # Check spending limits
-            check_spending_limits(category, amount)
+            # Check spending limits and achievements in the background, as for /add
+            post_commit.submit(DEFAULT_USER, after_transaction_commit, row, spending_at_commit(category))
             
             flash("Transaction with receipt uploaded successfully!")
             return redirect('/transactions')
@@ -433,7 +371,7 @@ def upload_receipt():
 
 @app.route('/modify', methods=['GET', 'POST'])
 def modify():
-    transactions = read_csv_data(CSV_FILE)
+    transactions = read_transactions()
     if request.method == 'POST':
         try:
             transaction_id = int(request.form['transaction_id'])
@@ -443,23 +381,19 @@ def modify():
             if column == "Amount":
                 new_value = float(new_value)
 
-            # Update the transaction
-            for tx in transactions:
-                if int(tx.get('Id', 0)) == transaction_id:
-                    tx[column] = new_value
-                    break
-            
-            # Write back to CSV
-            fieldnames = [
-                "Id", "Name", "Amount", "Date", "Category",
-                "Subcategory", "Location",
-                "Destination", "Transport_Mode",
-                "Transport_Type",
-                "Bill_Type", "Provider",
-                "Academic_Type", "Institution",
-                "Health_Type"
-            ]
-            write_csv_data(CSV_FILE, transactions, fieldnames)
+            if column not in TRANSACTION_FIELDS or column == "Id":
+                raise ValueError(f"Unknown field {column}")
+
+            # Update the transaction (an index lookup, not a scan)
+            old_row = store.update_transaction(transaction_id, column, new_value)
+            if old_row is None:
+                raise ValueError(f"No transaction with ID {transaction_id}")
+
+            # The achievement counters read the amount, date and category: swap the old row for the new
+            if column in ("Amount", "Date", "Category"):
+                new_row = dict(old_row, **{column: new_value})
+                new_row.pop("Day", None)
+                post_commit.submit(DEFAULT_USER, record_achievements, [new_row], [old_row])
             
             flash("Transaction updated successfully!")
             return redirect('/transactions')
@@ -470,19 +404,9 @@ def modify():
 
 @app.route('/delete/<int:transaction_id>', methods=['POST'])
 def delete_transaction(transaction_id):
-    transactions = read_csv_data(CSV_FILE)
-    transactions = [tx for tx in transactions if int(tx.get('Id', 0)) != transaction_id]
-    
-    fieldnames = [
-        "Id", "Name", "Amount", "Date", "Category",
-        "Subcategory", "Location",
-        "Destination", "Transport_Mode",
-        "Transport_Type",
-        "Bill_Type", "Provider",
-        "Academic_Type", "Institution",
-        "Health_Type"
-    ]
-    write_csv_data(CSV_FILE, transactions, fieldnames)
+    old_row = store.delete_transaction(transaction_id)
+    if old_row is not None:
+        post_commit.submit(DEFAULT_USER, record_achievements, [], removed=[old_row])
     return redirect('/transactions')
 
 # ===========================
@@ -492,8 +416,29 @@ def delete_transaction(transaction_id):
 @app.route('/limits', methods=['GET'])
 def limits():
     """Display all spending limits."""
-    limits_data = read_csv_data(LIMITS_FILE)
-    return render_template('limits.html', limits=limits_data)
+    limits_data = store.limits.rows()
+    budget = month_budget(store)
+    usage = {entry["category"]: entry for entry in budget["categories"]}
+    return render_template('limits.html', limits=limits_data, budget=budget, usage=usage,
+                           horizon_days=store.rolling.horizon_days)
+
+@app.route('/budget')
+def budget_status():
+    """Utilization of every spending limit as JSON (?month=YYYY-MM, default this month)."""
+    month = request.args.get('month') or date.today().strftime("%Y-%m")
+    try:
+        month_range(month)
+    except ValueError:
+        return jsonify({"error": "month must look like YYYY-MM"}), 400
+    version = generation_digest((store.shared_generation(), store.limits.generation(), month, today_day())).hex()
+    return conditional_json("budget", version, lambda: month_budget(store, month))
+
+def valid_window_days(window_days):
+    """Check a limit's window (0 = calendar month) against the horizon the rolling totals keep; flashes why not."""
+    if 0 <= window_days <= store.rolling.horizon_days:
+        return True
+    flash(f"Rolling window must be between 0 and {store.rolling.horizon_days} days.")
+    return False
 
 @app.route('/set_limits', methods=['GET', 'POST'])
 def set_limit():
@@ -502,41 +447,23 @@ def set_limit():
         category = request.form['category']
         limit = float(request.form['limit'])
         alert_threshold = int(request.form['alert_threshold'])
+        window_days = int(request.form.get('window_days') or 0)
+        if not valid_window_days(window_days):
+            return redirect(url_for('set_limit'))
 
-        # Read existing limits
-        limits_data = read_csv_data(LIMITS_FILE)
-        
-        # Check if category exists
-        category_exists = False
-        for limit_row in limits_data:
-            if limit_row.get("Category") == category:
-                limit_row["Limit"] = limit
-                limit_row["Alert_Threshold"] = alert_threshold
-                category_exists = True
-                break
-        
-        if not category_exists:
-            limits_data.append({
-                "Category": category,
-                "Limit": limit,
-                "Alert_Threshold": alert_threshold
-            })
-
-        # Write back to CSV
-        write_csv_data(LIMITS_FILE, limits_data, ["Category", "Limit", "Alert_Threshold"])
+        # Add the limit, or update it if the category already has one
+        store.save_limit(category, limit, alert_threshold, window_days)
         
         flash(f"Limit for {category} saved successfully!")
         return redirect(url_for('limits'))
 
-    limits_data = read_csv_data(LIMITS_FILE)
-    return render_template('set_limits.html', limits=limits_data)
+    limits_data = store.limits.rows()
+    return render_template('set_limits.html', limits=limits_data, horizon_days=store.rolling.horizon_days)
 
 @app.route('/delete_limit/<category>', methods=['POST'])
 def delete_limit(category):
     """Delete a spending limit."""
-    limits_data = read_csv_data(LIMITS_FILE)
-    limits_data = [limit_row for limit_row in limits_data if limit_row.get("Category") != category]
-    write_csv_data(LIMITS_FILE, limits_data, ["Category", "Limit", "Alert_Threshold"])
+    store.delete_limit(category)
     flash(f"Limit for {category} deleted successfully!")
     return redirect(url_for('limits'))
 
@@ -546,17 +473,13 @@ def edit_limit():
     category = request.form['category']
     limit = float(request.form['limit'])
     alert_threshold = int(request.form['alert_threshold'])
+    window_days = int(request.form.get('window_days') or 0)
+    if not valid_window_days(window_days):
+        return redirect(url_for('limits'))
 
-    limits_data = read_csv_data(LIMITS_FILE)
-    
     # Update the existing limit
-    for limit_row in limits_data:
-        if limit_row.get("Category") == category:
-            limit_row["Limit"] = limit
-            limit_row["Alert_Threshold"] = alert_threshold
-            break
-    
-    write_csv_data(LIMITS_FILE, limits_data, ["Category", "Limit", "Alert_Threshold"])
+    if store.limits.get(category) is not None:
+        store.save_limit(category, limit, alert_threshold, window_days)
     
     flash(f"Limit for {category} updated successfully!")
     return redirect(url_for('limits'))
@@ -583,35 +506,92 @@ def test_alert():
         flash(f"Alert test error: {str(e)}")
         return redirect(url_for('limits'))
 
+def conditional_json(name, version, build):
+    """JSON response with a strong ETag built from a store version.
+
+    If the client's If-None-Match already has this version, answer 304
+    without calling ``build``; otherwise jsonify what ``build()`` returns.
+    """
+    etag = f"{name}-{version}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    # Let the browser keep the body but revalidate it every time
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def with_projections(alerts):
+    """Alerts, each with its category's month-end projection (None for categories without one)."""
+    projections = projector.projections()
+    return [dict(alert, projection=projections.get(alert.get("category"))) for alert in alerts]
+
 @app.route('/get_alerts')
 def get_alerts():
     """Get active spending alerts."""
     try:
-        alert_file = "active_alerts.json"
-        if os.path.exists(alert_file):
-            with open(alert_file, 'r') as f:
-                alerts = json.load(f)
-            return jsonify(alerts)
-        else:
-            return jsonify([])
+        version = alert_store.version() + "-" + generation_digest((store.shared_generation(), store.limits.generation())).hex()[:16]
+        return conditional_json("alerts", version, lambda: with_projections(alert_store.active()))
     except Exception as e:
         return jsonify([])
 
+def sse_message(event, data, event_id=None):
+    """Format one Server-Sent Events message."""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+@app.route('/alerts/stream')
+def alert_stream():
+    """Push alert changes as Server-Sent Events.
+
+    A new client (or one whose Last-Event-ID fell out of the event log) gets a
+    "snapshot" of the active alerts; after that each change is sent as a
+    "created", "dismissed", "expired" or "cleared" event. When this worker
+    already serves ALERT_MAX_STREAMS streams the answer is 204 No Content,
+    which tells EventSource not to reconnect, so the page falls back to polling.
+    """
+    if not alert_stream_slots.acquire(blocking=False):
+        return Response(status=204)
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id)
+    except (TypeError, ValueError):
+        last_id = None
+
+    def generate():
+        nonlocal last_id
+        yield f"retry: {ALERT_RETRY_MS}\n\n"
+        deadline = time.monotonic() + ALERT_STREAM_LIFETIME
+        while True:
+            seq, events = alert_store.events_since(last_id) if last_id is not None else (None, None)
+            if events is None:
+                seq, alerts = alert_store.snapshot()
+                yield sse_message("snapshot", with_projections(alerts), seq)
+            else:
+                for event in events:
+                    yield sse_message(event["event"], event, event["id"])
+            last_id = seq
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if not alert_store.wait(last_id, min(ALERT_HEARTBEAT, remaining)):
+                yield ": heartbeat\n\n"
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # The server closes the response once the stream ends or the client goes away
+    response.call_on_close(alert_stream_slots.release)
+    return response
+
 @app.route('/dismiss_alert/<alert_key>')
 def dismiss_alert(alert_key):
     """Dismiss a spending alert."""
     try:
-        alert_file = "active_alerts.json"
-        if os.path.exists(alert_file):
-            with open(alert_file, 'r') as f:
-                alerts = json.load(f)
-            
-            # Remove the alert
-            alerts = [alert for alert in alerts if alert.get('key') != alert_key]
-            
-            with open(alert_file, 'w') as f:
-                json.dump(alerts, f)
-            
+        if alert_store.dismiss(alert_key):
             print(f"Alert dismissed: {alert_key}")
         
         return redirect(request.referrer or url_for('index'))
@@ -624,11 +604,8 @@ def dismiss_alert(alert_key):
 def clear_all_alerts():
     """Clear all spending alerts (for testing)."""
     try:
-        alert_file = "active_alerts.json"
-        if os.path.exists(alert_file):
-            with open(alert_file, 'w') as f:
-                json.dump([], f)
-            flash("All alerts cleared!")
+        alert_store.clear()
+        flash("All alerts cleared!")
         return redirect(url_for('index'))
     except Exception as e:
         flash(f"Error clearing alerts: {str(e)}")
@@ -638,11 +615,9 @@ def clear_all_alerts():
 def test_achievements():
     """Developer route to test achievements (hidden from users)."""
     try:
-        achievement_system = AchievementSystem()
-        
         # Get current data
-        transactions = read_csv_data(CSV_FILE)
-        limits_data = read_csv_data(LIMITS_FILE)
+        transactions = read_transactions()
+        limits_data = store.limits.rows()
         
         # Test different achievement scenarios
         test_results = []
@@ -682,8 +657,8 @@ def test_achievements():
             test_results.append("❌ Budget setter already achieved")
         
         # Test 6: Low spending day
-        today = date.today().strftime("%m/%d/%Y")
-        today_spending = sum(float(tx.get('Amount', 0)) for tx in transactions if tx.get('Date') == today)
+        today = today_day()
+        today_spending = sum(tx["Amount"] for tx in transactions if tx["Day"] == today)
         if today_spending > 0 and today_spending < 20:
             test_results.append("✅ Low spending day: Already achieved today!")
         elif today_spending >= 20:
@@ -705,15 +680,29 @@ def test_achievements():
 def reset_achievements():
     """Developer route to reset all achievements (hidden from users)."""
     try:
-        achievement_system = AchievementSystem()
-        achievement_system.achievements = {"unlocked": [], "progress": {}}
-        achievement_system.save_achievements()
+        with achievement_store.lock(DEFAULT_USER).exclusive():
+            achievement_system = achievement_store.get(DEFAULT_USER)
+            achievement_system.reset()
+            achievement_system.save_achievements()
         flash("All achievements reset! You can now test them again.")
         return redirect(url_for('test_achievements'))
     except Exception as e:
         flash(f"Error resetting achievements: {str(e)}")
         return redirect(url_for('test_achievements'))
 
+def backfill_achievements(user=DEFAULT_USER):
+    """Background job: replay the whole history through the achievement rules and tell the user how it went."""
+    unlocked = backfill_user(user, store, achievement_store)
+    notices.post(user, f"Achievement backfill finished: {len(unlocked)} achievements unlocked from your history.")
+
+@app.route('/dev/backfill_achievements', methods=['GET', 'POST'])
+def start_achievement_backfill():
+    """Developer route to recompute achievements from the full transaction history."""
+    # Queued behind the user's pending post-commit work, so it replays every committed add
+    post_commit.submit(DEFAULT_USER, backfill_achievements)
+    flash("Achievement backfill started; the result shows up on your next page view.")
+    return redirect(url_for('test_achievements'))
+
 @app.route('/dev/add_test_transaction', methods=['GET', 'POST'])
 def add_test_transaction():
     """Developer route to add a test transaction (hidden from users)."""
@@ -747,23 +736,11 @@ def add_test_transaction():
             'Category': random_category
         }
         
-        # Read existing transactions
-        transactions = read_csv_data(CSV_FILE)
-        transactions.append(test_transaction)
-        
-        # Write back to CSV
-        fieldnames = [
-            "Id", "Name", "Amount", "Date", "Category",
-            "Subcategory", "Location", "Destination", "Transport_Mode",
-            "Transport_Type", "Bill_Type", "Provider",
-            "Academic_Type", "Institution", "Health_Type"
-        ]
-        write_csv_data(CSV_FILE, transactions, fieldnames)
+        # Save through the storage engine
+        row = store.add_transaction(test_transaction)
         
         # Check for new achievements (same as normal add transaction)
-        achievement_system = AchievementSystem()
-        limits_data = read_csv_data(LIMITS_FILE)
-        new_achievements = achievement_system.check_achievements(transactions, limits_data)
+        new_achievements = check_new_achievements([row])
         
         if new_achievements:
             achievement_names = [f"{a['icon']} {a['name']}" for a in new_achievements]
@@ -783,10 +760,6 @@ def add_multiple_test_transactions():
         import random
         from datetime import timedelta
         
-        # Read existing transactions
-        transactions = read_csv_data(CSV_FILE)
-        current_count = len(transactions)
-        
         # Add multiple test transactions with different categories
         test_transactions = []
         categories = ['Food', 'Travel', 'Academic', 'Health', 'Bills & Utilities', 'Entertainment', 'Shopping', 'Transportation']
@@ -815,23 +788,11 @@ def add_multiple_test_transactions():
                 'Category': random_category
             })
         
-        # Add all test transactions
-        for tx in test_transactions:
-            transactions.append(tx)
-        
-        # Write back to CSV
-        fieldnames = [
-            "Id", "Name", "Amount", "Date", "Category",
-            "Subcategory", "Location", "Destination", "Transport_Mode",
-            "Transport_Type", "Bill_Type", "Provider",
-            "Academic_Type", "Institution", "Health_Type"
-        ]
-        write_csv_data(CSV_FILE, transactions, fieldnames)
+        # Add all test transactions in one group-committed flush
+        rows = store.add_transactions(test_transactions)
         
         # Check for new achievements
-        achievement_system = AchievementSystem()
-        limits_data = read_csv_data(LIMITS_FILE)
-        new_achievements = achievement_system.check_achievements(transactions, limits_data)
+        new_achievements = check_new_achievements(rows)
         
         added_count = len(test_transactions)
         if new_achievements:
@@ -849,37 +810,49 @@ def add_multiple_test_transactions():
 def clear_test_transactions():
     """Developer route to remove test transactions (IDs starting with 99)."""
     try:
-        # Read existing transactions
-        transactions = read_csv_data(CSV_FILE)
-        
-        # Filter out test transactions (IDs in 9000-9999 range)
-        original_count = len(transactions)
-        transactions = [tx for tx in transactions if not (str(tx.get('Id', '')).isdigit() and 9000 <= int(tx.get('Id', 0)) <= 9999)]
-        removed_count = original_count - len(transactions)
-        
-        # Write back to CSV
-        fieldnames = [
-            "Id", "Name", "Amount", "Date", "Category",
-            "Subcategory", "Location", "Destination", "Transport_Mode",
-            "Transport_Type", "Bill_Type", "Provider",
-            "Academic_Type", "Institution", "Health_Type"
-        ]
-        write_csv_data(CSV_FILE, transactions, fieldnames)
-        
-        flash(f"Removed {removed_count} test transactions! Your real data is preserved.")
+        # Stream just the Ids of test transactions (IDs in 9000-9999 range)
+        is_test_id = lambda tx_id: tx_id.isdigit() and 9000 <= int(tx_id) <= 9999
+        test_ids = [tx['Id'] for tx in store.iter_transactions(columns=['Id'], where={'Id': is_test_id})]
+        
+        # Remove them in one write, then take them out of the achievement counters like /delete does
+        removed = store.delete_transactions(test_ids)
+        if removed:
+            post_commit.submit(DEFAULT_USER, record_achievements, [], removed=removed)
+        
+        flash(f"Removed {len(removed)} test transactions! Your real data is preserved.")
         return redirect(url_for('test_achievements'))
     except Exception as e:
         flash(f"Error clearing test transactions: {str(e)}")
         return redirect(url_for('test_achievements'))
 
+@app.route('/dev/compact', methods=['GET', 'POST'])
+def compact_journal():
+    """Developer route to compact the storage engine (folds the CSV journal into file.csv)."""
+    try:
+        pending = store.pending_writes()
+        count = store.compact()
+        flash(f"Compacted {pending} pending writes ({count} transactions in {store.name} storage).")
+    except Exception as e:
+        flash(f"Error compacting storage: {str(e)}")
+    return redirect(url_for('test_achievements'))
+
+@app.route('/dev/cache_stats')
+def cache_stats():
+    """Developer route exposing the transaction cache hit/miss and group commit batch counters."""
+    return jsonify({"engine": store.name, **store.cache.stats(), "group_commit": store.group_commit.stats(),
+                    "post_commit": post_commit.stats()})
+
 @app.route('/achievements')
 def achievements():
     """Achievements page showing user progress and unlocked badges."""
     try:
-        achievement_system = AchievementSystem()
+        achievement_system = achievement_store.get(DEFAULT_USER)
         all_achievements = achievement_system.get_all_achievements()
         unlocked_achievements = achievement_system.get_unlocked_achievements()
         
+        # Per-achievement progress comes from the metric values cached on every write
+        achievement_progress = achievement_system.get_progress()
+        
         # Calculate progress
         total_achievements = len(all_achievements)
         unlocked_count = len(unlocked_achievements)
@@ -888,6 +861,7 @@ def achievements():
         return render_template('achievements.html', 
                              all_achievements=all_achievements,
                              unlocked_achievements=unlocked_achievements,
+                             achievement_progress=achievement_progress,
                              progress_percentage=progress_percentage,
                              unlocked_count=unlocked_count,
                              total_achievements=total_achievements)
@@ -896,6 +870,7 @@ def achievements():
         return render_template('achievements.html', 
                              all_achievements={},
                              unlocked_achievements=[],
+                             achievement_progress={},
                              progress_percentage=0,
                              unlocked_count=0,
                              total_achievements=0)
@@ -907,9 +882,10 @@ def achievements():
 def stats():
     """Analytics dashboard with spending insights."""
     try:
-        transactions = read_csv_data(CSV_FILE)
+        # Per-category totals come straight from the storage engine
+        category_totals = store.category_totals()
         
-        if not transactions:
+        if not category_totals:
             return render_template("stats.html",
                                  total_spending=0,
                                  transaction_count=0,
@@ -923,33 +899,16 @@ def stats():
                                  recent_transactions=[])
         
         # Basic stats
-        total_spending = 0.0
-        for tx in transactions:
-            try:
-                amount = float(tx.get('Amount', 0))
-                total_spending += amount
-            except ValueError:
-                pass
-        
-        transaction_count = len(transactions)
+        total_spending = sum(entry["total"] for entry in category_totals.values())
+        transaction_count = sum(entry["count"] for entry in category_totals.values())
         avg_transaction = total_spending / transaction_count if transaction_count > 0 else 0
         
         # Category analysis
         category_stats = []
-        category_totals = {}
-        category_counts = {}
         
-        for tx in transactions:
-            category = tx.get('Category', 'Unknown')
-            try:
-                amount = float(tx.get('Amount', 0))
-                category_totals[category] = category_totals.get(category, 0) + amount
-                category_counts[category] = category_counts.get(category, 0) + 1
-            except ValueError:
-                pass
-        
-        for category, total in category_totals.items():
-            count = category_counts.get(category, 0)
+        for category, entry in category_totals.items():
+            total = entry["total"]
+            count = entry["count"]
             average = total / count if count > 0 else 0
             percentage = (total / total_spending * 100) if total_spending > 0 else 0
             
@@ -969,34 +928,26 @@ def stats():
         category_values = [cat['total'] for cat in category_stats]
         
         # Recent transactions
-        recent_transactions = transactions[-10:] if len(transactions) > 10 else transactions
+        recent_transactions = store.recent_transactions(10)
         
         # Unique categories
         unique_categories = len(category_stats)
         
-        # Timeline data (last 30 days)
-        timeline_data = {}
-        for tx in transactions:
-            date_str = tx.get('Date', '')
-            if '/' in date_str:
-                try:
-                    amount = float(tx.get('Amount', 0))
-                    timeline_data[date_str] = timeline_data.get(date_str, 0) + amount
-                except ValueError:
-                    pass
+        # Timeline data (last 30 days), keyed by day ordinal so it sorts chronologically
+        timeline_data = store.daily_totals()
         
         # Get last 30 days
-        sorted_dates = sorted(timeline_data.keys())
-        recent_dates = sorted_dates[-30:] if len(sorted_dates) > 30 else sorted_dates
+        sorted_days = sorted(timeline_data.keys())
+        recent_days = sorted_days[-30:] if len(sorted_days) > 30 else sorted_days
         timeline_labels = []
         timeline_values = []
         
-        for date in recent_dates:
+        for day in recent_days:
             try:
-                timeline_labels.append(date)
-                timeline_values.append(timeline_data.get(date, 0))
+                timeline_labels.append(date.fromordinal(day).strftime("%m/%d/%Y"))
+                timeline_values.append(timeline_data.get(day, 0))
             except Exception as e:
-                print(f"Error processing date {date}: {e}")
+                print(f"Error processing date {day}: {e}")
                 continue
         
         # If no timeline data, create sample data
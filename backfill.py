@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from achievements import ACHIEVEMENTS_DIR, DEFAULT_USER, AchievementStore
+from storage import CsvEngine, get_engine
+
+# Worker processes used when several users are backfilled at once
+DEFAULT_PROCESSES = int(os.environ.get("BACKFILL_PROCESSES", os.cpu_count() or 1))
+
+USAGE = """Usage:
+  python backfill.py [--processes N] [USER[=FILE.csv] ...]
+Replays each user's transactions through the achievement rules, oldest first. A bare
+USER (default: default) replays the store selected by STORAGE_ENGINE like the app;
+USER=FILE.csv replays that CSV file with the limits.csv beside it."""
+
+
+def backfill_user(user, engine, achievement_store):
+    """Replay ``user``'s whole history from ``engine``; returns the achievements unlocked, with their dates.
+
+    The per-day totals come from one pass over the engine's amount, day and
+    category columns (the memory-mapped snapshot where the engine keeps
+    one), so only the distinct days are sorted.
+    """
+    buckets = engine.columns().day_category_totals()
+    with achievement_store.lock(user).exclusive():
+        system = achievement_store.get(user)
+        return system.replay(buckets, engine.limits.rows(), engine.limits.version())
+
+
+def _backfill_job(job):
+    """One user's backfill in a worker process: (user, csv_file or None, achievements dir) -> summary."""
+    user, csv_file, directory = job
+    started = time.time()
+    if csv_file:
+        engine = CsvEngine(csv_file, os.path.join(os.path.dirname(csv_file), "limits.csv"))
+    else:
+        engine = get_engine()
+    achievement_store = AchievementStore(directory)
+    unlocked = backfill_user(user, engine, achievement_store)
+    return user, achievement_store.get(user).stats.count, unlocked, time.time() - started
+
+
+def backfill(jobs, processes=None, directory=ACHIEVEMENTS_DIR):
+    """Backfill several users in parallel; ``jobs`` is [(user, csv_file or None), ...]. Yields a summary per user."""
+    jobs = [(user, csv_file, directory) for user, csv_file in jobs]
+    processes = min(processes or DEFAULT_PROCESSES, len(jobs))
+    if processes <= 1:
+        yield from map(_backfill_job, jobs)
+        return
+    with ProcessPoolExecutor(processes) as pool:
+        yield from pool.map(_backfill_job, jobs)
+
+
+def parse_jobs(args):
+    jobs = []
+    for arg in args or [DEFAULT_USER]:
+        user, _, csv_file = arg.partition("=")
+        jobs.append((user, csv_file or None))
+    return jobs
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    processes = None
+    if "--processes" in args:
+        index = args.index("--processes")
+        if index + 1 >= len(args) or not args[index + 1].isdigit():
+            print(USAGE)
+            sys.exit(1)
+        processes = int(args[index + 1])
+        del args[index:index + 2]
+    if any(arg.startswith("-") for arg in args):
+        print(USAGE)
+        sys.exit(1)
+    for user, count, unlocked, seconds in backfill(parse_jobs(args), processes):
+        print(f"{user}: replayed {count} transactions in {seconds:.2f}s, {len(unlocked)} achievements unlocked")
+        for achievement in unlocked:
+            print(f"  {achievement['unlocked_date']}  {achievement['icon']} {achievement['name']}")
@@ -0,0 +1,90 @@
+from datetime import date
+
+from dates import month_range, today_day
+
+# Threshold states, in increasing order of urgency
+UNDER = "ok"
+WARNING = "warning"
+OVER = "over"
+
+
+def limit_usage(limit, spent, count=0):
+    """Utilization of one Limit given what was spent against it this month."""
+    percent = spent / limit.limit * 100 if limit.limit > 0 else (100.0 if spent > 0 else 0.0)
+    if spent > limit.limit:
+        state = OVER
+    elif spent > 0 and spent >= limit.threshold_amount:
+        state = WARNING
+    else:
+        state = UNDER
+    return {
+        "category": limit.category,
+        "limit": limit.limit,
+        "alert_threshold": limit.alert_threshold,
+        "threshold_amount": round(limit.threshold_amount, 2),
+        "spent": round(spent, 2),
+        "count": count,
+        "window_days": limit.window_days,
+        "period": limit.period,
+        "remaining": round(limit.limit - spent, 2),
+        "percent_used": round(percent, 1),
+        "state": state,
+    }
+
+
+def budget_report(limits, month_totals, window_totals=None):
+    """Utilization of every limit from one month's {category: {"total", "count"}} totals.
+
+    ``limits`` is the {category: Limit} map from the limits index, and
+    ``month_totals`` what ``StorageEngine.category_totals(month)`` returns, so
+    the whole report is one dictionary lookup per limit. Rolling-window
+    limits take their spend from ``window_totals`` ({category: total}).
+    """
+    categories = []
+    for category, limit in limits.items():
+        if limit.window_days:
+            categories.append(limit_usage(limit, (window_totals or {}).get(category, 0.0)))
+            continue
+        totals = month_totals.get(category, {})
+        categories.append(limit_usage(limit, totals.get("total", 0.0), totals.get("count", 0)))
+    budgeted = sum(limit.limit for limit in limits.values())
+    spent = sum(entry["spent"] for entry in categories)
+    return {
+        "categories": categories,
+        "total_limit": round(budgeted, 2),
+        "total_spent": round(spent, 2),
+        "total_remaining": round(budgeted - spent, 2),
+        "warning": sum(1 for entry in categories if entry["state"] == WARNING),
+        "over": sum(1 for entry in categories if entry["state"] == OVER),
+    }
+
+
+def limit_spending(store, limit, end_day=None):
+    """What has been spent against ``limit`` in its period ending ``end_day`` (default today)."""
+    end_day = end_day or today_day()
+    if limit.window_days:
+        return store.window_total(limit.category, limit.window_days, end_day)
+    return store.category_month_total(limit.category, date.fromordinal(end_day).strftime("%Y-%m"))
+
+def in_period(limit, day, end_day=None):
+    """Whether a transaction dated ``day`` counts toward ``limit``'s period ending ``end_day``."""
+    end_day = end_day or today_day()
+    if limit.window_days:
+        return end_day - limit.window_days < day <= end_day
+    start, end = month_range(date.fromordinal(end_day).strftime("%Y-%m"))
+    return start <= day < end
+
+def month_budget(store, month=None):
+    """The budget report for ``month`` ('YYYY-MM', default this month) straight from the store's aggregates.
+
+    Rolling limits are measured over their window ending today, or on the
+    month's last day for past months.
+    """
+    month = month or date.today().strftime("%Y-%m")
+    limits = store.limits.all()
+    end_day = min(today_day(), month_range(month)[1] - 1)
+    window_totals = {
+        category: store.window_total(category, limit.window_days, end_day)
+        for category, limit in limits.items() if limit.window_days
+    }
+    return dict(budget_report(limits, store.category_totals(month), window_totals), month=month)
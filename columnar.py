@@ -0,0 +1,234 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from dates import NO_DAY, row_day
+from locking import atomic_write
+from rowstream import to_float
+
+# Header: magic, row count, capacity, offset and length of the category table,
+# then a digest of the store generation the snapshot was built from
+HEADER = struct.Struct("<8sIIQI32s")
+HEADER_SIZE = 64
+MAGIC = b"BBCOLS1\n"
+MIN_CAPACITY = 1024
+
+
+def generation_digest(generation):
+    """Fixed-size fingerprint of a storage generation."""
+    return hashlib.blake2b(repr(generation).encode('utf-8'), digest_size=32).digest()
+
+
+class ColumnView:
+    """Read-only columns for analytics: float64 amounts, int32 day ordinals and
+    int32 category codes, plus the category names they decode to."""
+
+    def __init__(self, amounts, days, codes, categories):
+        self.amounts = amounts
+        self.days = days
+        self.codes = codes
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def category_totals(self, start_day=None, end_day=None):
+        """Return {category: {"total", "count"}} for days in [start_day, end_day)."""
+        totals = [0.0] * len(self.categories)
+        counts = [0] * len(self.categories)
+        if start_day is None:
+            for amount, code in zip(self.amounts, self.codes):
+                totals[code] += amount
+                counts[code] += 1
+        else:
+            for amount, day, code in zip(self.amounts, self.days, self.codes):
+                if start_day <= day < end_day:
+                    totals[code] += amount
+                    counts[code] += 1
+        return {
+            category: {"total": totals[code], "count": counts[code]}
+            for code, category in enumerate(self.categories) if counts[code]
+        }
+
+    def daily_totals(self):
+        """Return {day ordinal: total} for every dated transaction."""
+        totals = {}
+        for amount, day in zip(self.amounts, self.days):
+            if day != NO_DAY:
+                totals[day] = totals.get(day, 0.0) + amount
+        return totals
+
+    def day_category_totals(self):
+        """Return {day ordinal: {category: [count, cents]}} for every transaction (undated ones under NO_DAY)."""
+        cells = {}
+        for amount, day, code in zip(self.amounts, self.days, self.codes):
+            by_code = cells.get(day)
+            if by_code is None:
+                by_code = cells[day] = {}
+            cell = by_code.get(code)
+            if cell is None:
+                cell = by_code[code] = [0, 0]
+            cell[0] += 1
+            cell[1] += round(amount * 100)
+        return {
+            day: {self.categories[code]: cell for code, cell in by_code.items()}
+            for day, by_code in cells.items()
+        }
+
+
+def build_columns(rows):
+    """Encode rows into arrays, dictionary-encoding the categories."""
+    amounts = array('d')
+    days = array('i')
+    codes = array('i')
+    categories = []
+    category_codes = {}
+    for row in rows:
+        category = row.get("Category", '')
+        code = category_codes.get(category)
+        if code is None:
+            code = category_codes[category] = len(categories)
+            categories.append(sys.intern(category))
+        amount = row.get("Amount", 0.0)
+        amounts.append(amount if isinstance(amount, float) else to_float(amount))
+        days.append(row_day(row))
+        codes.append(code)
+    return ColumnView(amounts, days, codes, categories)
+
+
+class ColumnSnapshot:
+    """Memory-mapped columnar copy of the transaction set, kept next to the data file.
+
+    Arrays are preallocated with spare capacity so an add can be written into
+    the next free slot in place. Any other write (or a write by a worker that
+    did not hold the snapshot's generation) just leaves it stale, and it is
+    rebuilt from the parsed rows on the next read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mm = None
+        self._file_id = None
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+
+    def view(self, generation, load_rows):
+        """Return a ColumnView for ``generation``, rebuilding from ``load_rows()`` if stale."""
+        digest = generation_digest(generation)
+        header = self._current_header()
+        if header is None or header[5] != digest:
+            self.rebuild(load_rows(), generation)
+            header = self._current_header()
+        return self._columns(header)
+
+    def _current_header(self):
+        """Map the snapshot (re-mapping if the file was replaced or grew) and parse its header."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        file_id = (st.st_ino, st.st_size)
+        if self._mm is None or file_id != self._file_id:
+            self._close()
+            with open(self.path, 'rb') as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._file_id = file_id
+        if len(self._mm) < HEADER_SIZE:
+            return None
+        header = HEADER.unpack_from(self._mm, 0)
+        if header[0] != MAGIC:
+            return None
+        return header
+
+    def _columns(self, header):
+        _, count, capacity, categories_offset, categories_length, _ = header
+        data = memoryview(self._mm)
+        amounts_at = HEADER_SIZE
+        days_at = amounts_at + capacity * 8
+        codes_at = days_at + capacity * 4
+        categories = [sys.intern(name) for name in
+                      json.loads(bytes(data[categories_offset:categories_offset + categories_length]))]
+        return ColumnView(
+            data[amounts_at:amounts_at + count * 8].cast('d'),
+            data[days_at:days_at + count * 4].cast('i'),
+            data[codes_at:codes_at + count * 4].cast('i'),
+            categories
+        )
+
+    def _close(self):
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                # A request still holds views into the old mapping; let GC reclaim it
+                pass
+        self._mm = None
+        self._file_id = None
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+
+    def rebuild(self, rows, generation):
+        """Write a fresh snapshot of ``rows`` atomically."""
+        columns = build_columns(rows)
+        capacity = max(MIN_CAPACITY, len(columns) * 2)
+        self._write(columns, capacity, generation)
+
+    def _write(self, columns, capacity, generation):
+        count = len(columns)
+        padding = capacity - count
+        categories_blob = json.dumps(columns.categories).encode('utf-8')
+        categories_offset = HEADER_SIZE + capacity * 16
+        atomic_write(self.path, b"".join([
+            HEADER.pack(MAGIC, count, capacity, categories_offset, len(categories_blob),
+                        generation_digest(generation)).ljust(HEADER_SIZE, b"\0"),
+            bytes(memoryview(columns.amounts).cast('B')), bytes(padding * 8),
+            bytes(memoryview(columns.days).cast('B')), bytes(padding * 4),
+            bytes(memoryview(columns.codes).cast('B')), bytes(padding * 4),
+            categories_blob,
+        ]))
+
+    def append(self, rows, before_generation, after_generation):
+        """Write new rows into the next free slots, if the snapshot was current before they were added."""
+        header = self._current_header()
+        if header is None or header[5] != generation_digest(before_generation):
+            return False
+        _, count, capacity, categories_offset, categories_length, _ = header
+        if count + len(rows) > capacity:
+            # Out of room: fall back to a rebuild on the next read
+            return False
+
+        categories = json.loads(bytes(self._mm[categories_offset:categories_offset + categories_length]))
+        codes = []
+        for row in rows:
+            category = row.get("Category", '')
+            if category not in categories:
+                categories.append(category)
+            codes.append(categories.index(category))
+        categories_blob = json.dumps(categories).encode('utf-8')
+        days_at = HEADER_SIZE + capacity * 8
+        codes_at = days_at + capacity * 4
+
+        with open(self.path, 'r+b') as f:
+            f.seek(HEADER_SIZE + count * 8)
+            f.write(struct.pack(f"<{len(rows)}d", *(to_float(row.get("Amount")) for row in rows)))
+            f.seek(days_at + count * 4)
+            f.write(struct.pack(f"<{len(rows)}i", *(row_day(row) for row in rows)))
+            f.seek(codes_at + count * 4)
+            f.write(struct.pack(f"<{len(rows)}i", *codes))
+            if len(categories_blob) != categories_length:
+                f.seek(categories_offset)
+                f.write(categories_blob)
+                f.truncate()
+            # The header goes last so readers never see a count covering an unwritten slot
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, count + len(rows), capacity, categories_offset, len(categories_blob),
+                                generation_digest(after_generation)))
+        return True
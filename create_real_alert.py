@@ -1,6 +1,7 @@
-import json
 from datetime import date
 
+from alerts import AlertStore
+
 # Create alert data that matches actual spending
 alert_data = {
     'category': 'Food',
@@ -13,8 +14,7 @@ alert_data = {
 }
 
 # Save to active_alerts.json
-with open('active_alerts.json', 'w') as f:
-    json.dump([alert_data], f)
+AlertStore('active_alerts.json').add(alert_data['key'], alert_data)
 
 print("Alert created successfully!")
 print(f"Category: {alert_data['category']}")
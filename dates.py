@@ -0,0 +1,65 @@
+from datetime import date
+from functools import lru_cache
+
+# Day ordinal used for blank or unparseable dates
+NO_DAY = 0
+# The format /add writes and the transactions page expects
+DATE_FORMAT = "%m/%d/%Y"
+
+
+@lru_cache(maxsize=8192)
+def parse_day(date_str):
+    """Return the proleptic day ordinal of a MM/DD/YYYY or YYYY-MM-DD date, or NO_DAY.
+
+    Results are cached, so the same date string is only ever parsed once per
+    worker no matter how many rows or requests carry it.
+    """
+    date_str = (date_str or '').strip()
+    try:
+        if "/" in date_str:
+            month, day, year = date_str.split("/")
+        elif "-" in date_str:
+            year, month, day = date_str.split("-")
+        else:
+            return NO_DAY
+        return date(int(year), int(month), int(day)).toordinal()
+    except ValueError:
+        return NO_DAY
+
+@lru_cache(maxsize=4096)
+def day_month(day):
+    """Return the 'YYYY-MM' month of a day ordinal, or '' for NO_DAY."""
+    if day == NO_DAY:
+        return ''
+    d = date.fromordinal(day)
+    return f"{d.year:04d}-{d.month:02d}"
+
+def month_key(date_str):
+    """Return 'YYYY-MM' for a MM/DD/YYYY or YYYY-MM-DD date string, or '' if unparseable."""
+    return day_month(parse_day(date_str))
+
+@lru_cache(maxsize=256)
+def month_range(month):
+    """Return the [first, next) day ordinals covering a 'YYYY-MM' month."""
+    year, month_number = (int(part) for part in month.split("-"))
+    first = date(year, month_number, 1)
+    following = date(year + month_number // 12, month_number % 12 + 1, 1)
+    return first.toordinal(), following.toordinal()
+
+def row_day(row):
+    """Day ordinal of a transaction row, using its normalized Day when it has one."""
+    day = row.get("Day")
+    if isinstance(day, int):
+        return day
+    return parse_day(row.get("Date"))
+
+def normalize_date(date_str):
+    """Rewrite a parseable date as MM/DD/YYYY; anything else is returned unchanged."""
+    day = parse_day(date_str)
+    if day == NO_DAY:
+        return date_str
+    return date.fromordinal(day).strftime(DATE_FORMAT)
+
+def today_day():
+    """Today's day ordinal."""
+    return date.today().toordinal()
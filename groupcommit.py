@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+
+# How long the first writer of a batch waits for others to join it, and how
+# many writes one flush may carry
+DEFAULT_MAX_LATENCY = float(os.environ.get("GROUP_COMMIT_MAX_LATENCY_MS", 5)) / 1000
+DEFAULT_MAX_BATCH = int(os.environ.get("GROUP_COMMIT_MAX_BATCH", 256))
+
+
+class _Request:
+    __slots__ = ("item", "result", "error", "done")
+
+    def __init__(self, item):
+        self.item = item
+        self.result = None
+        self.error = None
+        self.done = False
+
+
+class GroupCommit:
+    """Coalesce writes from concurrent threads into batched flushes.
+
+    ``submit(item)`` queues an item and blocks until a flush containing it
+    has completed, then returns that item's result. One waiting thread at a
+    time leads: it collects whatever is queued (waiting up to
+    ``max_latency`` for more writers when others are already active) and
+    calls ``flush(items)`` once, which must return one result per item.
+    Writers arriving while a flush is running queue up for the next one, so
+    under a burst each flush (one lock, one write, at most one fsync under
+    the journal's fsync policy) carries many writes. A lone writer is
+    flushed immediately; the latency window only opens while other writers
+    are active or the last batch was shared.
+    """
+
+    def __init__(self, flush, max_latency=None, max_batch=None):
+        self.flush = flush
+        self.max_latency = DEFAULT_MAX_LATENCY if max_latency is None else max_latency
+        self.max_batch = max_batch or DEFAULT_MAX_BATCH
+        self.batches = 0
+        self.items = 0
+        self._cond = threading.Condition()
+        self._pending = []
+        self._active = 0
+        self._flushing = False
+        self._last_batch = 0
+
+    def submit(self, item):
+        request = _Request(item)
+        with self._cond:
+            self._pending.append(request)
+            self._active += 1
+            self._cond.notify_all()
+            try:
+                while not request.done:
+                    if self._flushing:
+                        self._cond.wait()
+                    else:
+                        self._lead()
+            finally:
+                self._active -= 1
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _lead(self):
+        """Collect and flush one batch; called with the condition held."""
+        self._flushing = True
+        try:
+            # Only hold the batch open when other writers are around to fill it
+            if (self._active > 1 or self._last_batch > 1) and self.max_latency > 0:
+                deadline = time.monotonic() + self.max_latency
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+
+            self._cond.release()
+            try:
+                results = self.flush([request.item for request in batch])
+                error = None
+            except Exception as e:
+                results = [None] * len(batch)
+                error = e
+            finally:
+                self._cond.acquire()
+
+            for request, result in zip(batch, results):
+                request.result = result
+                request.error = error
+                request.done = True
+            self.batches += 1
+            self.items += len(batch)
+            self._last_batch = len(batch)
+        finally:
+            self._flushing = False
+            self._cond.notify_all()
+
+    def stats(self):
+        """Batch counters for the dev stats endpoint."""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_latency_ms": self.max_latency * 1000
+        }
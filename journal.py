@@ -0,0 +1,543 @@
+import csv
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+from locking import FileLock, atomic_write_json
+from rowstream import iter_csv_values, row_selector, select_row
+
+# Every column a transaction row can carry, in the order they are written to disk
+TRANSACTION_FIELDS = [
+    "Id", "Name", "Amount", "Date", "Category",
+    "Subcategory", "Location",
+    "Destination", "Transport_Mode",
+    "Transport_Type",
+    "Bill_Type", "Provider",
+    "Academic_Type", "Institution",
+    "Health_Type", "Notes", "Receipt_Image"
+]
+
+# When to fsync the journal after an append:
+#   always   - fsync every record (safest, slowest)
+#   interval - fsync at most once every JOURNAL_FSYNC_INTERVAL seconds; a write not
+#              synced on the spot is synced by a timer once the interval has passed
+#   never    - leave it to the OS page cache
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+def normalize_row(row, fieldnames=TRANSACTION_FIELDS):
+    """Return a copy of a row with every known column present as a string."""
+    clean = {}
+    for field in fieldnames:
+        value = row.get(field, '')
+        clean[field] = '' if value is None else str(value)
+    return clean
+
+def file_generation(*paths):
+    """Cheap change detector for a set of files: (inode, size, mtime) per path."""
+    generation = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            generation.append((st.st_ino, st.st_size, st.st_mtime_ns))
+        except OSError:
+            generation.append(None)
+    return tuple(generation)
+
+def file_size(path):
+    """Size of a file in bytes, or 0 if it does not exist."""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def read_csv_record(f):
+    """Read one CSV record (which may span several lines) from a binary file.
+
+    Returns (list of values, bytes consumed), or (None, 0) at end of file.
+    """
+    raw = f.readline()
+    if not raw:
+        return None, 0
+    # A quoted field can contain newlines; keep reading until the quotes balance
+    while raw.count(b'"') % 2:
+        more = f.readline()
+        if not more:
+            break
+        raw += more
+    values = next(csv.reader(io.StringIO(raw.decode('utf-8'), newline='')), [])
+    return values, len(raw)
+
+
+class TransactionJournal:
+    """Append-only log of transaction writes layered on top of the base CSV.
+
+    The base CSV holds the state as of the last compaction. Adds, modifies and
+    deletes are appended to ``<csv>.journal`` as one JSON record per line and
+    replayed over the base file when reading. The base file is only rewritten
+    by ``compact()``.
+    """
+
+    def __init__(self, csv_file, fieldnames=TRANSACTION_FIELDS, fsync_policy=None, fsync_interval=None):
+        self.csv_file = csv_file
+        self.journal_file = csv_file + ".journal"
+        self.fieldnames = list(fieldnames)
+        self.fsync_policy = fsync_policy or os.environ.get("JOURNAL_FSYNC", "interval")
+        if self.fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {self.fsync_policy!r}, expected one of {FSYNC_POLICIES}")
+        if fsync_interval is None:
+            fsync_interval = float(os.environ.get("JOURNAL_FSYNC_INTERVAL", 1.0))
+        self.fsync_interval = fsync_interval
+        self._last_fsync = 0.0
+        self._fsync_mutex = threading.Lock()
+        self._fsync_timer = None
+        # Every worker process coordinates journal writes and compaction through file.csv.lock
+        self.lock = FileLock(csv_file)
+        self.index = IdIndex(self)
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+
+    def append_add(self, row):
+        """Record a new transaction."""
+        self.append_many([row])
+
+    def append_many(self, rows):
+        """Record several new transactions with one write and at most one fsync."""
+        with self.lock.exclusive():
+            self._append(*({"op": "add", "row": normalize_row(row, self.fieldnames)} for row in rows))
+
+    def append_update(self, tx_id, field, value):
+        """Record a single-field change to an existing transaction.
+
+        The current row is fetched through the Id index and written back in
+        full, so the index can point straight at the new version. Returns the
+        row as it was before the change, or None if there is no such Id.
+        """
+        with self.lock.exclusive():
+            old_row = self.get(tx_id)
+            if old_row is None:
+                return None
+            new_row = dict(old_row)
+            new_row[field] = '' if value is None else str(value)
+            self._append({"op": "replace", "id": str(tx_id), "row": new_row})
+        return old_row
+
+    def append_delete(self, tx_id):
+        """Record the removal of a transaction (a tombstone).
+
+        Returns the row that was removed, or None if there is no such Id.
+        """
+        removed = self.append_deletes([tx_id])
+        return removed[0] if removed else None
+
+    def append_deletes(self, tx_ids):
+        """Record the removal of several transactions with one write and at most one fsync.
+
+        Returns the rows that were removed; Ids with no transaction are skipped.
+        """
+        with self.lock.exclusive():
+            removed = {}
+            for tx_id in map(str, tx_ids):
+                if tx_id not in removed:
+                    old_row = self.get(tx_id)
+                    if old_row is not None:
+                        removed[tx_id] = old_row
+            self._append(*({"op": "delete", "id": tx_id} for tx_id in removed))
+        return list(removed.values())
+
+    def _append(self, *records):
+        """Append records to the journal in one write, flush per the fsync policy and return the first offset.
+
+        Callers must hold the exclusive lock.
+        """
+        line = b"".join((json.dumps(record, separators=(",", ":")) + "\n").encode('utf-8') for record in records)
+        if not line:
+            return None
+        with open(self.journal_file, 'a+b') as f:
+            offset = f.seek(0, os.SEEK_END)
+            if offset:
+                # Never glue a record onto the tail of a torn write
+                f.seek(offset - 1)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+                    offset += 1
+            f.write(line)
+            f.flush()
+            self._maybe_fsync(f)
+        return offset
+
+    def _maybe_fsync(self, f):
+        """fsync the open journal file if the policy asks for it."""
+        if self.fsync_policy == "always":
+            os.fsync(f.fileno())
+        elif self.fsync_policy == "interval":
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                os.fsync(f.fileno())
+                self._last_fsync = now
+            else:
+                self._schedule_fsync(self.fsync_interval - (now - self._last_fsync))
+
+    def _schedule_fsync(self, delay):
+        """Make sure a pending fsync runs within ``delay`` seconds, so no write stays unsynced longer than the interval."""
+        with self._fsync_mutex:
+            if self._fsync_timer is not None:
+                return
+            self._fsync_timer = threading.Timer(delay, self._deferred_fsync)
+            self._fsync_timer.daemon = True
+            self._fsync_timer.start()
+
+    def _deferred_fsync(self):
+        with self._fsync_mutex:
+            self._fsync_timer = None
+        try:
+            # No O_CREAT: a journal compaction already removed stays gone
+            fd = os.open(self.journal_file, os.O_WRONLY)
+        except OSError:
+            # Compaction removed the journal; its rows are already synced into the base file
+            fd = None
+        if fd is not None:
+            try:
+                # fsync covers every write to the file, whichever descriptor made it
+                os.fsync(fd)
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+        self._last_fsync = time.monotonic()
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+
+    def open_snapshot(self):
+        """Open the base CSV and the journal as one consistent pair.
+
+        The shared lock is only held while opening: compaction replaces
+        file.csv by rename and unlinks the journal, so the open handles keep
+        reading the pair as it was, however long the parse takes.
+        Returns (base file or None, journal file or None).
+        """
+        with self.lock.shared():
+            base_f = open(self.csv_file, 'rb') if os.path.exists(self.csv_file) else None
+            journal_f = open(self.journal_file, 'rb') if os.path.exists(self.journal_file) else None
+        return base_f, journal_f
+
+    def read_base(self, f=None):
+        """Read the compacted base CSV (from an already open binary handle if given)."""
+        if f is None:
+            if not os.path.exists(self.csv_file):
+                return []
+            with open(self.csv_file, 'rb') as f:
+                return self.read_base(f)
+        text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+        try:
+            return [normalize_row(row, self.fieldnames) for row in csv.DictReader(text)]
+        finally:
+            text.detach()
+
+    def iter_records(self, start=0, f=None):
+        """Yield (offset, end offset, record) for journal lines starting at byte ``start``.
+
+        Unreadable lines are yielded with a record of None so callers can step
+        over them. Stops before a final line with no newline: that is either a
+        torn write after a crash or a write still in progress in another worker.
+        """
+        if f is None:
+            if not os.path.exists(self.journal_file):
+                return
+            with open(self.journal_file, 'rb') as f:
+                yield from self.iter_records(start, f)
+            return
+        f.seek(start)
+        offset = start
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            record = None
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    print(f"Skipping unreadable journal record at {self.journal_file}:{offset}")
+            yield offset, offset + len(line), record
+            offset += len(line)
+
+    def read_records(self, f=None):
+        """Read the journal records appended since the last compaction."""
+        return [record for _, _, record in self.iter_records(0, f) if record is not None]
+
+    def load(self):
+        """Return the current transactions: the base CSV with the journal replayed over it."""
+        base_f, journal_f = self.open_snapshot()
+        try:
+            base = self.read_base(base_f) if base_f else []
+            records = self.read_records(journal_f) if journal_f else []
+        finally:
+            for f in (base_f, journal_f):
+                if f:
+                    f.close()
+        return replay(base, records)
+
+    def iter_rows(self, columns=None, where=None):
+        """Stream the current transactions without materializing the base CSV.
+
+        Base rows are projected and filtered one at a time (see
+        rowstream.row_selector). Rows whose Id the journal touches are held
+        back, replayed with the journal records and yielded at the end, after
+        the untouched base rows; the journal is small between compactions, so
+        memory stays bounded by it rather than by the history.
+        """
+        base_f, journal_f = self.open_snapshot()
+        try:
+            records = self.read_records(journal_f) if journal_f else []
+        finally:
+            if journal_f:
+                journal_f.close()
+        touched = {record.get("id", record.get("row", {}).get("Id")) for record in records}
+
+        held = []
+        if base_f:
+            with base_f:
+                header, values_iter = iter_csv_values(base_f)
+                select = row_selector(header, columns, where)
+                id_column = header.index("Id") if "Id" in header else None
+                for values in values_iter:
+                    if touched and id_column is not None and id_column < len(values) and values[id_column] in touched:
+                        held.append(normalize_row(dict(zip(header, values)), self.fieldnames))
+                        continue
+                    row = select(values)
+                    if row is not None:
+                        yield row
+        for row in replay(held, records):
+            row = select_row(row, columns, where)
+            if row is not None:
+                yield row
+
+    def get(self, tx_id):
+        """Fetch a single transaction by Id through the index, or None."""
+        return self.index.get(tx_id)
+
+    def pending_records(self):
+        """Number of journal records waiting for compaction."""
+        return len(self.read_records())
+
+    # ---------------------------
+    # Compaction
+    # ---------------------------
+
+    def compact(self):
+        """Fold the journal into the base CSV and truncate the journal.
+
+        This is the only operation that rewrites the whole transaction file.
+        """
+        with self.lock.exclusive():
+            rows = self.load()
+            tmp_file = self.csv_file + ".tmp"
+            with open(tmp_file, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=self.fieldnames, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(rows)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.csv_file)
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+            self.index.rebuild()
+        return len(rows)
+
+
+class IdIndex:
+    """Persistent map of transaction Id to the location of its current record.
+
+    Locations are ``["base", offset]`` (a byte offset into the CSV) or
+    ``["journal", offset]`` (a byte offset into the journal). The map is
+    checkpointed to ``<csv>.idx`` and caught up from the journal tail when
+    used, so appends never pay for it. It is rebuilt from scratch when the
+    checkpoint is missing or unreadable, or no longer matches the base CSV
+    (for example after compaction). Lookups hold the journal's shared lock
+    so compaction cannot move records out from under a seek.
+    """
+
+    CHECKPOINT_EVERY = 256
+
+    def __init__(self, journal):
+        self.journal = journal
+        self.index_file = journal.csv_file + ".idx"
+        self.entries = {}
+        self.header = []
+        self.base_generation = None
+        self.journal_offset = 0
+        self._loaded = False
+        self._since_checkpoint = 0
+        self._mutex = threading.RLock()
+
+    def get(self, tx_id):
+        """Seek to the current record for ``tx_id`` and return it as a row, or None."""
+        with self.journal.lock.shared(), self._mutex:
+            self.refresh()
+            entry = self.entries.get(str(tx_id))
+            if entry is None:
+                return None
+            return self._read_entry(str(tx_id), *entry)
+
+    def contains(self, tx_id):
+        """Whether ``tx_id`` has a current record, without reading it."""
+        with self.journal.lock.shared(), self._mutex:
+            self.refresh()
+            return str(tx_id) in self.entries
+
+    def _read_entry(self, tx_id, source, offset):
+        if source == "replay":
+            # Only reachable through field-level update records from older journals
+            return next((row for row in self.journal.load() if row.get("Id") == tx_id), None)
+        if source == "base":
+            with open(self.journal.csv_file, 'rb') as f:
+                f.seek(offset)
+                values, _ = read_csv_record(f)
+            return normalize_row(dict(zip(self.header, values or [])), self.journal.fieldnames)
+        with open(self.journal.journal_file, 'rb') as f:
+            f.seek(offset)
+            record = json.loads(f.readline())
+        return normalize_row(record.get("row", {}), self.journal.fieldnames)
+
+    def refresh(self):
+        """Bring the index up to date with the files on disk."""
+        with self._mutex:
+            self._refresh()
+
+    def _refresh(self):
+        if not self._loaded:
+            self._load_checkpoint()
+            self._loaded = True
+        journal_size = file_size(self.journal.journal_file)
+        if (self.base_generation != list(file_generation(self.journal.csv_file))
+                or journal_size < self.journal_offset):
+            self.rebuild()
+        elif journal_size > self.journal_offset:
+            self._catch_up()
+
+    def rebuild(self):
+        """Rebuild the index by scanning the base CSV and the whole journal."""
+        with self.journal.lock.shared(), self._mutex:
+            self._rebuild()
+
+    def _rebuild(self):
+        self.entries = {}
+        self.header = []
+        self.base_generation = list(file_generation(self.journal.csv_file))
+        if os.path.exists(self.journal.csv_file):
+            with open(self.journal.csv_file, 'rb') as f:
+                self.header, offset = read_csv_record(f)
+                self.header = self.header or []
+                id_column = self.header.index("Id") if "Id" in self.header else None
+                while True:
+                    values, consumed = read_csv_record(f)
+                    if values is None:
+                        break
+                    if id_column is not None and id_column < len(values):
+                        # Updates apply to the first row with an Id, so index that one
+                        self.entries.setdefault(values[id_column], ["base", offset])
+                    offset += consumed
+        self.journal_offset = 0
+        self._loaded = True
+        self._catch_up()
+        self.checkpoint()
+
+    def _catch_up(self):
+        """Apply journal records written since the index last looked."""
+        for offset, end, record in self.journal.iter_records(self.journal_offset):
+            op = (record or {}).get("op")
+            if op == "add":
+                self.entries.setdefault(record.get("row", {}).get("Id", ''), ["journal", offset])
+            elif op == "replace":
+                if record.get("id") in self.entries:
+                    self.entries[record.get("id")] = ["journal", offset]
+            elif op == "delete":
+                self.entries.pop(record.get("id"), None)
+            elif op == "update":
+                # Field-level records from older journals cannot be read back on their
+                # own; such rows are resolved by a replay until the next compaction
+                if record.get("id") in self.entries:
+                    self.entries[record.get("id")] = ["replay", 0]
+            self.journal_offset = end
+            self._since_checkpoint += 1
+        if self._since_checkpoint >= self.CHECKPOINT_EVERY:
+            self.checkpoint()
+
+    def _load_checkpoint(self):
+        """Load the last checkpoint, leaving the index empty (and stale) if it cannot be read."""
+        try:
+            with open(self.index_file, 'r') as f:
+                data = json.load(f)
+            self.entries = data["entries"]
+            self.header = data["header"]
+            self.base_generation = data["base_generation"]
+            self.journal_offset = data["journal_offset"]
+        except (OSError, ValueError, KeyError):
+            self.entries = {}
+            self.base_generation = None
+            self.journal_offset = 0
+
+    def checkpoint(self):
+        """Persist the index atomically."""
+        data = {
+            "base_generation": self.base_generation,
+            "journal_offset": self.journal_offset,
+            "header": self.header,
+            "entries": self.entries
+        }
+        atomic_write_json(self.index_file, data, separators=(",", ":"))
+        self._since_checkpoint = 0
+
+
+def replay(rows, records):
+    """Apply journal records to a list of base rows, returning the resulting rows."""
+    rows = list(rows)
+    positions = {}
+    for i, row in enumerate(rows):
+        positions.setdefault(row.get("Id", ''), []).append(i)
+
+    for record in records:
+        op = record.get("op")
+        if op == "add":
+            row = record.get("row", {})
+            positions.setdefault(row.get("Id", ''), []).append(len(rows))
+            rows.append(row)
+        elif op in ("update", "replace"):
+            # Matches the old behaviour of updating the first row with this Id
+            for i in positions.get(record.get("id"), []):
+                if rows[i] is not None:
+                    if op == "replace":
+                        rows[i] = record.get("row", {})
+                    else:
+                        rows[i][record.get("field")] = record.get("value", '')
+                    break
+        elif op == "delete":
+            for i in positions.pop(record.get("id"), []):
+                rows[i] = None
+
+    return [row for row in rows if row is not None]
+
+
+if __name__ == "__main__":
+    # Usage: python journal.py compact [file.csv]
+    #        python journal.py reindex [file.csv]
+    command = sys.argv[1] if len(sys.argv) >= 2 else ''
+    target = sys.argv[2] if len(sys.argv) > 2 else "file.csv"
+    if command == "compact":
+        journal = TransactionJournal(target)
+        pending = journal.pending_records()
+        count = journal.compact()
+        print(f"Compacted {pending} journal records into {target} ({count} transactions)")
+    elif command == "reindex":
+        journal = TransactionJournal(target)
+        journal.index.rebuild()
+        print(f"Rebuilt {journal.index.index_file} ({len(journal.index.entries)} Ids)")
+    else:
+        print("Usage: python journal.py compact|reindex [file.csv]")
@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+
+from journal import file_generation
+from locking import FileLock, atomic_write
+
+
+class Limit:
+    """One category's spending limit, per calendar month or per rolling ``window_days`` days."""
+
+    __slots__ = ("category", "limit", "alert_threshold", "window_days")
+
+    def __init__(self, category, limit, alert_threshold, window_days=0):
+        self.category = category
+        self.limit = float(limit)
+        self.alert_threshold = int(alert_threshold)
+        self.window_days = int(window_days)
+
+    @property
+    def period(self):
+        """How the limit's period reads on the page."""
+        return f"Rolling {self.window_days} days" if self.window_days else "Calendar month"
+
+    @property
+    def threshold_amount(self):
+        """Spending at which the alert fires."""
+        return self.limit * self.alert_threshold / 100
+
+    def as_row(self):
+        """The limits.csv-shaped dict the templates use."""
+        return {"Category": self.category, "Limit": str(self.limit), "Alert_Threshold": str(self.alert_threshold),
+                "Window_Days": str(self.window_days)}
+
+    @classmethod
+    def from_row(cls, row):
+        try:
+            return cls(row.get("Category", ''), float(row.get("Limit") or 0), int(float(row.get("Alert_Threshold") or 0)),
+                       int(float(row.get("Window_Days") or 0)))
+        except (TypeError, ValueError):
+            print(f"Skipping unreadable limit row: {row}")
+            return None
+
+
+class LimitsIndex:
+    """Spending limits loaded once per worker into a category-keyed dict of Limit.
+
+    The engine's limit writes bump a version counter in ``version_file``;
+    every read costs one stat of that file, and the limits are only
+    reloaded from the engine when another write (in any worker) has
+    changed it.
+    """
+
+    def __init__(self, load_rows, version_file):
+        self.load_rows = load_rows
+        self.version_file = version_file
+        self.reloads = 0
+        self._lock = FileLock(version_file)
+        self._mutex = threading.Lock()
+        self._generation = ()
+        self._limits = None
+
+    def get(self, category):
+        """The Limit for ``category``, or None."""
+        return self._current().get(category)
+
+    def all(self):
+        """{category: Limit} for every limit, in the order they were set."""
+        return dict(self._current())
+
+    def rows(self):
+        """Every limit as a limits.csv-shaped dict."""
+        return [limit.as_row() for limit in self._current().values()]
+
+    def _current(self):
+        with self._mutex:
+            generation = file_generation(self.version_file)
+            if self._limits is None or generation != self._generation:
+                limits = {}
+                for row in self.load_rows():
+                    limit = Limit.from_row(row)
+                    if limit is not None and limit.category:
+                        limits[limit.category] = limit
+                self._limits = limits
+                self._generation = generation
+                self.reloads += 1
+            return self._limits
+
+    def bump(self):
+        """Record that the limits changed so every worker reloads them on its next read."""
+        with self._lock.exclusive():
+            try:
+                with open(self.version_file, 'r') as f:
+                    version = int(f.read().strip() or 0)
+            except (OSError, ValueError):
+                version = 0
+            atomic_write(self.version_file, str(version + 1))
+
+    def generation(self):
+        """Cheap change tag for the limits: one stat of the version file, for ETags and cache keys."""
+        return file_generation(self.version_file)
+
+    def version(self):
+        """The current limits version (0 before the first change); reads the version file."""
+        try:
+            with open(self.version_file, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+
+def import_legacy_json(engine, json_file="limits.json"):
+    """Fold an old ``limits.json`` ({category: {"limit", "alert_threshold"}}) into the engine.
+
+    Categories the engine already has win; the file is renamed afterwards so
+    it is only ever imported once. Returns the number of limits imported.
+    """
+    if not os.path.exists(json_file):
+        return 0
+    try:
+        with open(json_file, 'r') as f:
+            legacy = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not read legacy {json_file}: {e}")
+        return 0
+    existing = engine.limits.all()
+    imported = 0
+    for category, entry in legacy.items():
+        if category in existing or not isinstance(entry, dict):
+            continue
+        engine.save_limit(category, float(entry.get("limit", 0)), int(entry.get("alert_threshold", 80)))
+        imported += 1
+    os.replace(json_file, json_file + ".imported")
+    if imported:
+        print(f"Imported {imported} limits from legacy {json_file}")
+    return imported
@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads in this process are coordinated
+    fcntl = None
+
+
+class FileLock:
+    """Advisory lock on ``<path>.lock`` shared by every worker process.
+
+    Writers take ``exclusive()`` around a read-modify-write; readers that must
+    see a consistent set of files (e.g. base CSV plus journal) take
+    ``shared()`` just long enough to open them. Each acquisition opens its own
+    descriptor, so threads in one process exclude each other as well. Both
+    modes are re-entrant per thread, and a shared request inside an exclusive
+    hold is a no-op.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_file = path + ".lock"
+        self._local = threading.local()
+        self._fallback = threading.RLock()
+
+    def exclusive(self):
+        return self._hold(exclusive=True)
+
+    def shared(self):
+        return self._hold(exclusive=False)
+
+    @contextmanager
+    def _hold(self, exclusive):
+        held = getattr(self._local, "mode", None)
+        if held == "exclusive" or (held == "shared" and not exclusive):
+            yield
+            return
+        if held == "shared":
+            raise RuntimeError(f"Cannot upgrade a shared lock on {self.path} to exclusive")
+
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            else:
+                self._fallback.acquire()
+            self._local.mode = "exclusive" if exclusive else "shared"
+            try:
+                yield
+            finally:
+                self._local.mode = None
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                else:
+                    self._fallback.release()
+        finally:
+            os.close(fd)
+
+
+def atomic_write(path, data):
+    """Replace ``path`` with ``data`` (str or bytes) so readers see the old or new file, never a mix."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data.encode('utf-8') if isinstance(data, str) else data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+def atomic_write_json(path, data, **kwargs):
+    """JSON-encode ``data`` and write it with atomic_write."""
+    atomic_write(path, json.dumps(data, **kwargs))
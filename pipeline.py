@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from journal import file_generation
+from locking import FileLock, atomic_write_json
+
+# Worker threads for post-commit work, and how many tasks may wait before
+# submit() blocks the request that queued them
+DEFAULT_WORKERS = int(os.environ.get("POST_COMMIT_WORKERS", 2))
+DEFAULT_MAX_PENDING = int(os.environ.get("POST_COMMIT_MAX_PENDING", 1000))
+
+
+class PostCommitPipeline:
+    """Run side effects of a committed write on a small thread pool.
+
+    Tasks submitted under the same key (a user) run one at a time in
+    submission order; different keys run in parallel. At most
+    ``max_pending`` tasks are queued at once, beyond that ``submit`` waits
+    for room. A failing task is logged and does not stop the ones behind it.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None):
+        self.max_workers = max_workers or DEFAULT_WORKERS
+        self.max_pending = max_pending or DEFAULT_MAX_PENDING
+        self.completed = 0
+        self.failed = 0
+        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="post-commit")
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._cond = threading.Condition()
+        self._queues = {}
+        self._pending = 0
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Queue ``fn(*args, **kwargs)`` to run after every earlier task for ``key``."""
+        self._slots.acquire()
+        with self._cond:
+            self._pending += 1
+            queue = self._queues.get(key)
+            if queue is not None:
+                queue.append((fn, args, kwargs))
+                return
+            self._queues[key] = deque([(fn, args, kwargs)])
+        self._executor.submit(self._drain, key)
+
+    def _drain(self, key):
+        """Run ``key``'s tasks until its queue is empty; only one drain per key is ever scheduled."""
+        while True:
+            with self._cond:
+                queue = self._queues[key]
+                if not queue:
+                    del self._queues[key]
+                    return
+                fn, args, kwargs = queue[0]
+            try:
+                fn(*args, **kwargs)
+                ok = True
+            except Exception as e:
+                print(f"Post-commit task {getattr(fn, '__name__', fn)} failed: {e}")
+                ok = False
+            with self._cond:
+                queue.popleft()
+                self._pending -= 1
+                self.completed += ok
+                self.failed += not ok
+                self._cond.notify_all()
+            self._slots.release()
+
+    def wait(self, timeout=None):
+        """Block until every queued task has run; returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def stats(self):
+        with self._cond:
+            return {"pending": self._pending, "completed": self.completed, "failed": self.failed,
+                    "workers": self.max_workers}
+
+
+class NoticeBox:
+    """Messages produced by background work, held per user until their next page view.
+
+    Stored in one JSON file so whichever worker serves the next request can
+    flash them. ``take`` on an empty box is answered from memory unless the
+    file changed since this worker last read it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = FileLock(path)
+        self._mutex = threading.Lock()
+        self._generation = None
+        self._notices = {}
+
+    def _load(self):
+        generation = file_generation(self.path)
+        if generation == self._generation:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self._notices = json.load(f)
+        except (OSError, ValueError):
+            self._notices = {}
+        self._generation = generation
+
+    def _save(self):
+        atomic_write_json(self.path, self._notices)
+        self._generation = file_generation(self.path)
+
+    def post(self, user, message):
+        with self._mutex, self.lock.exclusive():
+            self._load()
+            self._notices.setdefault(user, []).append(message)
+            self._save()
+
+    def take(self, user):
+        """Remove and return ``user``'s pending messages."""
+        with self._mutex:
+            self._load()
+            if not self._notices.get(user):
+                return []
+            with self.lock.exclusive():
+                self._load()
+                messages = self._notices.pop(user, [])
+                self._save()
+            return messages
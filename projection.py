@@ -0,0 +1,87 @@
+import math
+import os
+import threading
+from datetime import date
+
+from dates import month_range, today_day
+
+# The burn rate is a decayed average of the last LOOKBACK_DAYS of daily spend in which
+# a day's weight halves every HALF_LIFE_DAYS, so recent days dominate
+HALF_LIFE_DAYS = float(os.environ.get("PROJECTION_HALF_LIFE_DAYS", 7))
+LOOKBACK_DAYS = int(os.environ.get("PROJECTION_LOOKBACK_DAYS", 28))
+
+
+def burn_rate(daily, half_life=HALF_LIFE_DAYS):
+    """Exponentially decayed average of ``daily`` spend (oldest first, last entry today)."""
+    decay = 0.5 ** (1 / half_life)
+    weighted = weights = 0.0
+    weight = 1.0
+    for spent in reversed(daily):
+        weighted += spent * weight
+        weights += weight
+        weight *= decay
+    return weighted / weights if weights else 0.0
+
+
+def project(limit, spent, rate, today=None):
+    """Month-end projection for one calendar-month Limit given month-to-date spend and a daily rate."""
+    today = today or today_day()
+    _, month_end = month_range(date.fromordinal(today).strftime("%Y-%m"))
+    days_left = month_end - 1 - today
+    projected = spent + rate * days_left
+    if spent >= limit.limit:
+        days_until_limit = 0
+    elif rate > 0 and projected >= limit.limit:
+        days_until_limit = math.ceil((limit.limit - spent) / rate)
+    else:
+        # Not on pace to reach the limit this month
+        days_until_limit = None
+    return {
+        "category": limit.category,
+        "spent": round(spent, 2),
+        "daily_rate": round(rate, 2),
+        "projected_spending": round(projected, 2),
+        "projected_percent": round(projected / limit.limit * 100, 1) if limit.limit > 0 else None,
+        "limit": limit.limit,
+        "days_until_limit": days_until_limit,
+        "on_pace_to_exceed": projected > limit.limit,
+    }
+
+
+class SpendProjector:
+    """Month-end spend projections for every calendar-month limit.
+
+    Built from the store's running totals only: month-to-date spend from
+    the monthly aggregates and the burn rate from the per-day totals, never
+    a transaction scan. The result is kept until the store generation, the
+    limits or the day change, so page views and alert polls between writes
+    reuse it. Rolling-window limits have no month end and are left out.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.builds = 0
+        self._mutex = threading.Lock()
+        self._key = None
+        self._projections = {}
+
+    def projections(self):
+        """{category: projection dict} for each calendar-month limit."""
+        key = (self.store.shared_generation(), self.store.limits.generation(), today_day())
+        with self._mutex:
+            if key != self._key:
+                self._projections = self._build(key[2])
+                self._key = key
+                self.builds += 1
+            return self._projections
+
+    def _build(self, today):
+        month_totals = self.store.category_totals(date.fromordinal(today).strftime("%Y-%m"))
+        projections = {}
+        for category, limit in self.store.limits.all().items():
+            if limit.window_days:
+                continue
+            daily = self.store.category_daily_totals(category, today - LOOKBACK_DAYS + 1, today)
+            spent = month_totals.get(category, {}).get("total", 0.0)
+            projections[category] = project(limit, spent, burn_rate(daily), today)
+        return projections
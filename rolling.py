@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+
+from aggregates import to_cents
+from columnar import generation_digest
+from dates import NO_DAY, row_day, today_day
+from locking import atomic_write_json
+
+# Oldest day (counting back from today) the rolling totals keep; longer windows are cut to this
+DEFAULT_HORIZON_DAYS = int(os.environ.get("ROLLING_HORIZON_DAYS", 366))
+
+
+def row_day_deltas(row, sign=1):
+    """The (category, day ordinal, cents) change adding (sign=1) or removing (sign=-1) a row makes."""
+    day = row_day(row)
+    if day == NO_DAY:
+        return []
+    return [(row.get("Category", '') or '', day, sign * to_cents(row.get("Amount")))]
+
+
+class RollingTotals:
+    """Per-category daily spending held as prefix sums, for O(1) N-day window totals.
+
+    Each category has a list of running cent totals, one entry per day from
+    ``horizon_days`` before the last rebuild; a window total is the
+    difference of two entries. A write applies its day deltas in place,
+    which only touches the entries from that day on (none but the last for
+    a transaction dated today). Like the aggregate table, the sums are kept
+    next to the data file (when ``path`` is given) with the store generation
+    they match, so a worker picks up another worker's write by re-reading
+    the file; they are rebuilt from one pass over the transactions only
+    when a write was not applied to them or the file is missing.
+    """
+
+    def __init__(self, path=None, horizon_days=None):
+        self.path = path
+        self.horizon_days = horizon_days or DEFAULT_HORIZON_DAYS
+        self.rebuilds = 0
+        self._mutex = threading.RLock()
+        self._file_id = None
+        self._digest = None
+        self._base = None
+        self._prefix = {}
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+
+    def window_total(self, category, days, end_day, generation, load_rows):
+        """Spending in ``category`` over the ``days`` days ending with ``end_day`` (inclusive)."""
+        days = min(days, self.horizon_days)
+        self._ensure_current(generation, load_rows)
+        with self._mutex:
+            prefix = self._prefix.get(category)
+            if prefix is None:
+                return 0.0
+            return (self._running(prefix, end_day + 1) - self._running(prefix, end_day + 1 - days)) / 100
+
+    def daily(self, category, start_day, end_day, generation, load_rows):
+        """Per-day spending in ``category`` for each day from ``start_day`` through ``end_day``."""
+        self._ensure_current(generation, load_rows)
+        with self._mutex:
+            prefix = self._prefix.get(category)
+            if prefix is None:
+                return [0.0] * (end_day - start_day + 1)
+            running = [self._running(prefix, day) for day in range(start_day, end_day + 2)]
+            return [(after - before) / 100 for before, after in zip(running, running[1:])]
+
+    def _ensure_current(self, generation, load_rows):
+        """Rebuild the sums if they don't match ``generation`` (or start too far back to keep growing).
+
+        As with the aggregate table, the rows are read without holding the
+        mutex, since a writer holding the store lock needs it to apply.
+        """
+        with self._mutex:
+            self._load()
+            if (self._base is not None and self._digest == generation_digest(generation).hex()
+                    and self._base >= today_day() - 2 * self.horizon_days):
+                return
+        self.rebuild(load_rows(), generation)
+
+    def _running(self, prefix, day):
+        """Cents spent on days before ``day``."""
+        index = day - self._base
+        if index <= 0:
+            return 0
+        return prefix[min(index, len(prefix) - 1)]
+
+    def _load(self):
+        """Re-read the sums if another worker replaced the file since we last looked."""
+        if self.path is None:
+            return
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self._file_id = None
+            self._digest = None
+            self._base = None
+            self._prefix = {}
+            return
+        file_id = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if file_id == self._file_id:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self._digest = data["generation"]
+            self._base = data["base"]
+            self._prefix = data["prefix"]
+        except (OSError, ValueError, KeyError):
+            self._digest = None
+            self._base = None
+            self._prefix = {}
+        self._file_id = file_id
+
+    def _save(self):
+        if self.path is None:
+            return
+        atomic_write_json(self.path, {"generation": self._digest, "base": self._base, "prefix": self._prefix},
+                          separators=(",", ":"))
+        st = os.stat(self.path)
+        self._file_id = (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+
+    def _add(self, category, day, cents):
+        index = day - self._base
+        if index < 0:
+            return
+        prefix = self._prefix.setdefault(category, [0])
+        if index + 1 >= len(prefix):
+            prefix.extend([prefix[-1]] * (index + 2 - len(prefix)))
+        for i in range(index + 1, len(prefix)):
+            prefix[i] += cents
+
+    def apply(self, deltas, before_generation, after_generation):
+        """Apply (category, day, cents) deltas if the sums matched the store before the write.
+
+        Callers hold the store's write lock. Stale sums are left alone and
+        rebuilt on their next read.
+        """
+        with self._mutex:
+            self._load()
+            if self._base is None or self._digest != generation_digest(before_generation).hex():
+                return False
+            for category, day, cents in deltas:
+                self._add(category, day, cents)
+            self._digest = generation_digest(after_generation).hex()
+            self._save()
+            return True
+
+    def rebuild(self, rows, generation):
+        base = today_day() - self.horizon_days
+        by_category = {}
+        for row in rows:
+            for category, day, cents in row_day_deltas(row):
+                if day >= base:
+                    daily = by_category.setdefault(category, {})
+                    daily[day] = daily.get(day, 0) + cents
+        prefixes = {}
+        for category, daily in by_category.items():
+            prefix = [0] * (max(daily) - base + 2)
+            for day, cents in daily.items():
+                prefix[day - base + 1] = cents
+            for i in range(1, len(prefix)):
+                prefix[i] += prefix[i - 1]
+            prefixes[category] = prefix
+        with self._mutex:
+            self._base = base
+            self._prefix = prefixes
+            self._digest = generation_digest(generation).hex()
+            self._save()
+            self.rebuilds += 1
@@ -0,0 +1,91 @@
+import codecs
+import csv
+import io
+import mmap
+import os
+
+# Files at least this big are parsed straight out of a read-only memory map
+# instead of through a buffered reader
+MMAP_THRESHOLD = int(os.environ.get("CSV_MMAP_THRESHOLD", 4 * 1024 * 1024))
+
+
+def open_lines(f):
+    """Iterate the text lines of an open binary CSV file, through mmap for large files."""
+    # Only plain files can be mapped (a GzipFile has a fileno, but of the compressed bytes)
+    size = os.fstat(f.fileno()).st_size - f.tell() if isinstance(f, io.BufferedReader) else 0
+    if size and size >= MMAP_THRESHOLD:
+        start = f.tell()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            mm.seek(start)
+            yield from codecs.iterdecode(iter(mm.readline, b""), 'utf-8')
+        return
+    text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+    try:
+        yield from text
+    finally:
+        text.detach()
+
+
+def iter_csv_values(f):
+    """Return (header, iterator of value lists) for an open binary CSV file.
+
+    Blank lines are skipped, like csv.DictReader does.
+    """
+    reader = csv.reader(open_lines(f))
+    header = next(reader, None) or []
+    return header, (values for values in reader if values)
+
+
+def row_selector(header, columns=None, where=None):
+    """Build a function turning a raw value list into a projected row dict, or None if filtered out.
+
+    ``columns`` lists the keys to keep (default: the whole header); ``where``
+    maps a column to a predicate on its raw string value. Predicates run
+    before any dictionary is built, so rejected rows cost one list lookup
+    per predicate. Columns missing from the file read as ''.
+    """
+    positions = {name: i for i, name in enumerate(header)}
+    picks = [(name, positions.get(name)) for name in (columns or header)]
+    tests = [(positions.get(name), test) for name, test in (where or {}).items()]
+
+    def value(values, i):
+        return values[i] if i is not None and i < len(values) else ''
+
+    def select(values):
+        for i, test in tests:
+            if not test(value(values, i)):
+                return None
+        return {name: value(values, i) for name, i in picks}
+    return select
+
+
+def select_row(row, columns=None, where=None):
+    """The dict counterpart of ``row_selector`` for rows that are already parsed."""
+    for name, test in (where or {}).items():
+        value = row.get(name, '')
+        if not test('' if value is None else str(value)):
+            return None
+    if columns is None:
+        return dict(row)
+    return {name: row.get(name, '') for name in columns}
+
+
+def iter_csv_rows(filename, columns=None, where=None):
+    """Stream a CSV file as row dicts in constant memory (see ``row_selector``)."""
+    if not os.path.exists(filename):
+        return
+    with open(filename, 'rb') as f:
+        header, values_iter = iter_csv_values(f)
+        select = row_selector(header, columns, where)
+        for values in values_iter:
+            row = select(values)
+            if row is not None:
+                yield row
+
+
+def to_float(value):
+    """Parse an amount, treating blanks and junk as zero."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
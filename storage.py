@@ -0,0 +1,1142 @@
+import csv
+import gzip
+import io
+import os
+import random
+import re
+import sqlite3
+import sys
+import threading
+from datetime import date
+
+from journal import TransactionJournal, TRANSACTION_FIELDS, normalize_row, file_generation
+from aggregates import AggregateTable, row_deltas
+from columnar import ColumnSnapshot, build_columns
+from dates import NO_DAY, month_key, month_range, normalize_date, parse_day, today_day
+from groupcommit import GroupCommit
+from limits_store import LimitsIndex
+from rolling import RollingTotals, row_day_deltas
+from locking import FileLock, atomic_write
+from rowstream import iter_csv_rows, iter_csv_values, row_selector, select_row, to_float
+
+LIMIT_FIELDS = ["Category", "Limit", "Alert_Threshold", "Window_Days"]
+
+
+def read_csv_data(filename):
+    """Read CSV data and return as list of dictionaries."""
+    try:
+        # iter_csv_rows already fills missing cells with ''
+        return list(iter_csv_rows(filename))
+    except Exception as e:
+        print(f"Error reading CSV file {filename}: {e}")
+        return []
+
+def write_csv_data(filename, data, fieldnames):
+    """Write data to CSV file, atomically replacing the old one."""
+    buffer = io.StringIO(newline='')
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    writer.writerows(data)
+    atomic_write(filename, buffer.getvalue())
+
+def stream_plan(columns, where, month):
+    """Turn an iter_transactions request into the raw columns and predicates to read with.
+
+    "Day" is derived from Date, and a month becomes a predicate on Date.
+    """
+    where = dict(where or {})
+    if month:
+        start, end = month_range(month)
+        date_test = where.get("Date")
+        where["Date"] = lambda value: start <= parse_day(value) < end and (date_test is None or date_test(value))
+    raw_columns = None
+    if columns is not None:
+        raw_columns = [column for column in columns if column != "Day"]
+        if "Day" in columns and "Date" not in raw_columns:
+            raw_columns.append("Date")
+    return raw_columns, where
+
+def typed_rows(rows, columns):
+    """Give streamed rows the same types as cached ones: float Amount and int Day."""
+    with_day = columns is None or "Day" in columns
+    drop_date = with_day and columns is not None and "Date" not in columns
+    for row in rows:
+        if "Amount" in row:
+            row["Amount"] = to_float(row["Amount"])
+        if with_day:
+            row["Day"] = parse_day(row.get("Date"))
+            if drop_date:
+                del row["Date"]
+        yield row
+
+
+class TransactionSet:
+    """Transactions parsed once per load.
+
+    Amount is converted to float and a "Day" key (the date's day ordinal,
+    0 if undated) is added in place. The rows are shared between requests
+    and must be treated as read-only.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        for row in rows:
+            row["Amount"] = to_float(row.get("Amount"))
+            row["Day"] = parse_day(row.get("Date"))
+        self._columns = None
+
+    @property
+    def columns(self):
+        """In-memory ColumnView of these rows, built on first use."""
+        if self._columns is None:
+            self._columns = build_columns(self.rows)
+        return self._columns
+
+
+class TransactionCache:
+    """Per-worker cache of the parsed transaction set, keyed by a store generation."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._generation = None
+        self._data = None
+        self._lock = threading.Lock()
+
+    def get(self, generation, loader):
+        """Return the cached value for ``generation``, calling ``loader`` on a miss."""
+        with self._lock:
+            if self._data is not None and generation == self._generation:
+                self.hits += 1
+                return self._data
+            self.misses += 1
+            self._data = loader()
+            self._generation = generation
+            return self._data
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+            self._generation = None
+
+    def stats(self):
+        """Hit/miss counters for the dev cache stats endpoint."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "cached_rows": len(self._data.rows) if self._data is not None else 0
+        }
+
+
+class StorageEngine:
+    """Interface shared by the transaction and limit storage backends.
+
+    Rows are exchanged as dictionaries shaped like csv.DictReader output
+    (Amount already converted to float), so templates work with either engine.
+    Reads are served from a per-worker TransactionCache that is refreshed
+    whenever ``generation()`` changes.
+    """
+
+    name = "base"
+
+    def __init__(self, snapshot_file=None, aggregates_file=None, rolling_file=None):
+        self.cache = TransactionCache()
+        self.snapshot = ColumnSnapshot(snapshot_file) if snapshot_file else None
+        self.aggregates = AggregateTable(aggregates_file) if aggregates_file else None
+        self.rolling = RollingTotals(rolling_file)
+        self._writes = 0
+        # Concurrent add_transaction calls share add_transactions flushes
+        self.group_commit = GroupCommit(self.add_transactions)
+
+    def shared_generation(self):
+        """Generation derived only from the files on disk, so every worker agrees on it."""
+        return None
+
+    def generation(self):
+        """Value that changes whenever the stored transactions change."""
+        return (self._writes, self.shared_generation())
+
+    def _wrote(self):
+        """Bump the in-process write counter after a transaction write."""
+        self._writes += 1
+
+    def _ingest(self, row):
+        """Normalize a row on its way in: dates are stored as MM/DD/YYYY whatever form they arrived in."""
+        if row.get("Date"):
+            row = dict(row, Date=normalize_date(row["Date"]))
+        return row
+
+    def _ingest_value(self, field, value):
+        """Normalize a single edited field the same way ``_ingest`` does."""
+        if field == "Date" and value:
+            return normalize_date(value)
+        return value
+
+    def _unique_rows(self, rows):
+        """Ingest a batch of new rows, giving fresh Ids to any whose Id is already used.
+
+        Transaction Ids are picked per process, so two workers (or two rows of
+        one batch) can draw the same one; callers hold the store's write lock
+        while checking.
+        """
+        taken = set()
+        unique = []
+        for row in rows:
+            row = self._ingest(row)
+            tx_id = str(row.get("Id", ''))
+            if tx_id and (tx_id in taken or self._id_taken(tx_id)):
+                new_id = random.randint(1000, 9999)
+                while str(new_id) in taken or self._id_taken(new_id):
+                    new_id = random.randint(1000, 9999)
+                row = dict(row, Id=new_id)
+                tx_id = str(new_id)
+            taken.add(tx_id)
+            unique.append(row)
+        return unique
+
+    def _id_taken(self, tx_id):
+        """Whether a stored transaction already uses ``tx_id``; engines with an Id index skip reading the row."""
+        return self.get_transaction(tx_id) is not None
+
+    # Transactions
+    def _read_transactions(self):
+        """Read every transaction from the backing store, uncached."""
+        raise NotImplementedError
+
+    def transaction_set(self):
+        """The cached, typed transaction set for the current generation."""
+        return self.cache.get(self.generation(), lambda: TransactionSet(self._read_transactions()))
+
+    def load_transactions(self):
+        """All transactions in insertion order (rows are shared; do not mutate them)."""
+        return list(self.transaction_set().rows)
+
+    def iter_transactions(self, columns=None, where=None, month=None):
+        """Stream transactions one row at a time, without building the cached set.
+
+        ``columns`` projects each row onto those keys ("Day" may be asked
+        for); ``where`` maps a column to a predicate on its stored text, and
+        is checked before the rest of the row is decoded; ``month`` keeps
+        only one 'YYYY-MM' month. Rows are fresh dicts the caller may keep.
+        Order matches ``load_transactions`` except that rows edited since the
+        last compaction may come last.
+        """
+        raw_columns, where = stream_plan(columns, where, month)
+        return typed_rows(self._stream_rows(raw_columns, where, month), columns)
+
+    def _stream_rows(self, columns, where, month):
+        """Raw rows for iter_transactions; engines override this to read straight from disk."""
+        for row in self.transaction_set().rows:
+            row = select_row(row, columns, where)
+            if row is not None:
+                yield row
+
+    def columns(self):
+        """Amount / day ordinal / category code columns for analytics.
+
+        Served from the memory-mapped snapshot when the engine keeps one, so
+        a fresh worker can aggregate without parsing the transaction file.
+        """
+        if self.snapshot is None:
+            return self.transaction_set().columns
+        return self.snapshot.view(self.shared_generation(), lambda: self.transaction_set().rows)
+
+    def get_transaction(self, tx_id):
+        """Return the first transaction with this Id, or None."""
+        tx_id = str(tx_id)
+        for tx in self.transaction_set().rows:
+            if tx.get("Id") == tx_id:
+                return tx
+        return None
+
+    def add_transaction(self, row):
+        """Store a new transaction; returns the row as stored (its Id may have been reassigned).
+
+        Goes through the group commit, so adds from concurrent requests are
+        written and synced together.
+        """
+        return self.group_commit.submit(row)
+
+    def add_transactions(self, rows):
+        """Store several new transactions in one flush; returns them as stored."""
+        raise NotImplementedError
+
+    def update_transaction(self, tx_id, field, value):
+        """Change one field of a transaction; returns the row before the change, or None if missing."""
+        raise NotImplementedError
+
+    def delete_transaction(self, tx_id):
+        """Remove a transaction; returns the removed row, or None if missing."""
+        removed = self.delete_transactions([tx_id])
+        return removed[0] if removed else None
+
+    def delete_transactions(self, tx_ids):
+        """Remove several transactions in one write; returns the removed rows (missing Ids are skipped)."""
+        raise NotImplementedError
+
+    def recent_transactions(self, count):
+        """The last ``count`` transactions in insertion order."""
+        return self.load_transactions()[-count:]
+
+    def month_transactions(self, month):
+        """Transactions dated in one 'YYYY-MM' month (rows are shared; do not mutate them)."""
+        start, end = month_range(month)
+        return [tx for tx in self.transaction_set().rows if start <= tx["Day"] < end]
+
+    # Aggregates
+    def category_totals(self, month=None):
+        """Return {category: {"total": float, "count": int}}, optionally for one 'YYYY-MM' month."""
+        if month and self.aggregates is not None:
+            return self.aggregates.month_totals(month, self.shared_generation(), self._aggregate_rows)
+        if month:
+            return self.columns().category_totals(*month_range(month))
+        return self.columns().category_totals()
+
+    def category_month_total(self, category, month):
+        """Total spending for one category in one 'YYYY-MM' month (a table lookup where the engine keeps one)."""
+        if self.aggregates is not None:
+            return self.aggregates.lookup(category, month, self.shared_generation(), self._aggregate_rows)[0]
+        return self.category_totals(month).get(category, {}).get("total", 0.0)
+
+    def _aggregate_rows(self):
+        """Stream just what the (category, month) table is built from."""
+        return self.iter_transactions(columns=["Category", "Amount", "Date"])
+
+    def window_total(self, category, days, end_day=None):
+        """Spending in ``category`` over the ``days`` days ending with ``end_day`` (default today)."""
+        end_day = end_day or today_day()
+        return self.rolling.window_total(category, days, end_day, self.shared_generation(), self._aggregate_rows)
+
+    def category_daily_totals(self, category, start_day, end_day):
+        """Spending in ``category`` for each day from ``start_day`` through ``end_day``, oldest first."""
+        return self.rolling.daily(category, start_day, end_day, self.shared_generation(), self._aggregate_rows)
+
+    def _record_write(self, before, added=(), removed=()):
+        """Fold a write's rows into the monthly and rolling totals; callers hold the write lock."""
+        after = self.shared_generation()
+        if self.aggregates is not None:
+            deltas = [delta for row in removed for delta in row_deltas(row, -1)]
+            deltas += [delta for row in added for delta in row_deltas(row)]
+            self.aggregates.apply(deltas, before, after)
+        day_deltas = [delta for row in removed for delta in row_day_deltas(row, -1)]
+        day_deltas += [delta for row in added for delta in row_day_deltas(row)]
+        self.rolling.apply(day_deltas, before, after)
+
+    def rebuild_aggregates(self):
+        """Rebuild the (category, month) table from scratch and return the cells that had drifted."""
+        if self.aggregates is None:
+            return []
+        generation = self.shared_generation()
+        return self.aggregates.verify(self._aggregate_rows(), generation)
+
+    def daily_totals(self):
+        """Return {day ordinal: total} for every day with a dated transaction."""
+        return self.columns().daily_totals()
+
+    # Limits
+    def load_limits(self):
+        """Read every limit row from storage; hot paths use the ``limits`` index instead."""
+        raise NotImplementedError
+
+    def save_limit(self, category, limit, alert_threshold, window_days=0):
+        """Add or replace a category's limit; ``window_days`` of 0 means the calendar month."""
+        raise NotImplementedError
+
+    def delete_limit(self, category):
+        raise NotImplementedError
+
+    # Maintenance
+    def pending_writes(self):
+        """Number of writes not yet folded into the main data file."""
+        return 0
+
+    def compact(self):
+        """Reclaim space / fold pending writes; returns the transaction count."""
+        return len(self.load_transactions())
+
+
+class CsvLimits:
+    """limits.csv handling shared by the flat-file engines."""
+
+    def _init_limits(self, limits_file):
+        self.limits_file = limits_file
+        self.limits_lock = FileLock(limits_file)
+        self.limits = LimitsIndex(self.load_limits, limits_file + ".version")
+
+        # Ensure limits CSV exists
+        if not os.path.exists(limits_file):
+            with open(limits_file, 'w', newline='') as f:
+                csv.writer(f).writerow(LIMIT_FIELDS)
+
+    def load_limits(self):
+        return read_csv_data(self.limits_file)
+
+    def save_limit(self, category, limit, alert_threshold, window_days=0):
+        with self.limits_lock.exclusive():
+            limits_data = self.load_limits()
+            for limit_row in limits_data:
+                if limit_row.get("Category") == category:
+                    limit_row["Limit"] = limit
+                    limit_row["Alert_Threshold"] = alert_threshold
+                    limit_row["Window_Days"] = int(window_days)
+                    break
+            else:
+                limits_data.append({"Category": category, "Limit": limit, "Alert_Threshold": alert_threshold,
+                                    "Window_Days": int(window_days)})
+            write_csv_data(self.limits_file, limits_data, LIMIT_FIELDS)
+            self.limits.bump()
+
+    def delete_limit(self, category):
+        with self.limits_lock.exclusive():
+            limits_data = [row for row in self.load_limits() if row.get("Category") != category]
+            write_csv_data(self.limits_file, limits_data, LIMIT_FIELDS)
+            self.limits.bump()
+
+
+class CsvEngine(CsvLimits, StorageEngine):
+    """Flat-file engine: file.csv plus its append-only journal, and limits.csv.
+
+    Good enough for small installs and keeps the data readable in a spreadsheet.
+    """
+
+    name = "csv"
+
+    def __init__(self, csv_file="file.csv", limits_file="limits.csv"):
+        super().__init__(csv_file + ".cols", csv_file + ".agg", csv_file + ".roll")
+        self.csv_file = csv_file
+        self._init_limits(limits_file)
+
+        # Ensure CSV exists with all columns
+        if not os.path.exists(csv_file):
+            with open(csv_file, 'w', newline='') as f:
+                csv.writer(f).writerow(TRANSACTION_FIELDS)
+
+        # All transaction writes are appended to the journal; file.csv is only rewritten on compaction
+        self.journal = TransactionJournal(csv_file)
+
+    def shared_generation(self):
+        return file_generation(self.csv_file, self.journal.journal_file)
+
+    def _read_transactions(self):
+        return self.journal.load()
+
+    def _stream_rows(self, columns, where, month):
+        return self.journal.iter_rows(columns, where)
+
+    def get_transaction(self, tx_id):
+        # One index lookup and a seek instead of a scan
+        return self.journal.get(tx_id)
+
+    def add_transactions(self, rows):
+        with self.journal.lock.exclusive():
+            rows = self._unique_rows(rows)
+            before = self.shared_generation()
+            self.journal.append_many(rows)
+            self._wrote()
+            # Keep the columnar snapshot and the monthly totals in step without rebuilding them
+            self.snapshot.append(rows, before, self.shared_generation())
+            self._record_write(before, added=rows)
+        return rows
+
+    def update_transaction(self, tx_id, field, value):
+        value = self._ingest_value(field, value)
+        with self.journal.lock.exclusive():
+            before = self.shared_generation()
+            old_row = self.journal.append_update(tx_id, field, value)
+            if old_row is None:
+                return None
+            self._wrote()
+            new_row = dict(old_row, **{field: value})
+            self._record_write(before, added=[new_row], removed=[old_row])
+        return old_row
+
+    def delete_transactions(self, tx_ids):
+        with self.journal.lock.exclusive():
+            before = self.shared_generation()
+            removed = self.journal.append_deletes(tx_ids)
+            if not removed:
+                return []
+            self._wrote()
+            self._record_write(before, removed=removed)
+        return removed
+
+    def pending_writes(self):
+        return self.journal.pending_records()
+
+    def compact(self):
+        with self.journal.lock.exclusive():
+            before = self.shared_generation()
+            count = self.journal.compact()
+            self._wrote()
+            # Same data in new files: just retag the totals
+            self._record_write(before)
+        return count
+
+
+class PartitionedEngine(CsvLimits, StorageEngine):
+    """Flat-file engine that keeps one CSV partition per month.
+
+    Transactions live in ``<partition_dir>/YYYY-MM.csv`` (undated rows in
+    ``undated.csv``), each with its own journal and Id index, so a query for
+    one month only opens that month's files. Partitions older than
+    ``compress_after`` months can be gzipped to ``YYYY-MM.csv.gz``; a
+    compressed partition is read-only and is unpacked again the first time
+    one of its transactions is edited or deleted.
+    """
+
+    name = "partitioned"
+    PARTITION_RE = re.compile(r"^(\d{4}-\d{2}|undated)\.csv(\.gz)?$")
+    UNDATED = "undated"
+
+    def __init__(self, partition_dir="transactions", limits_file="limits.csv", compress_after=None):
+        super().__init__(aggregates_file=os.path.join(partition_dir, "aggregates.json"),
+                         rolling_file=os.path.join(partition_dir, "rolling.json"))
+        self.partition_dir = partition_dir
+        self._init_limits(limits_file)
+        os.makedirs(partition_dir, exist_ok=True)
+        if compress_after is None:
+            compress_after = int(os.environ.get("PARTITION_COMPRESS_AFTER", 0))
+        self.compress_after = compress_after
+        # Held while a write picks (or moves between) partitions; each partition's journal has its own lock
+        self.lock = FileLock(os.path.join(partition_dir, "partitions"))
+        self._journals = {}
+        self._caches = {}
+        self._compressed_ids = {}
+
+    # ---------------------------
+    # Partitions
+    # ---------------------------
+
+    def partition_key(self, row):
+        """Partition a row belongs to: its 'YYYY-MM' month, or 'undated'."""
+        return month_key(row.get("Date")) or self.UNDATED
+
+    def months(self):
+        """Partition keys on disk, oldest first (undated first of all)."""
+        months = set()
+        for filename in os.listdir(self.partition_dir):
+            match = self.PARTITION_RE.match(filename)
+            if match:
+                months.add(match.group(1))
+        return sorted(months, key=lambda month: (month != self.UNDATED, month))
+
+    def partition_file(self, month):
+        return os.path.join(self.partition_dir, month + ".csv")
+
+    def is_compressed(self, month):
+        return os.path.exists(self.partition_file(month) + ".gz")
+
+    def _journal(self, month):
+        journal = self._journals.get(month)
+        if journal is None:
+            journal = self._journals.setdefault(month, TransactionJournal(self.partition_file(month)))
+        return journal
+
+    def _writable(self, month):
+        """Journal for a partition that is about to be written, unpacking it first if compressed.
+
+        Callers hold ``self.lock``.
+        """
+        if self.is_compressed(month):
+            self._decompress(month)
+        elif not os.path.exists(self.partition_file(month)):
+            write_csv_data(self.partition_file(month), [], TRANSACTION_FIELDS)
+        return self._journal(month)
+
+    def partition_generation(self, month):
+        if self.is_compressed(month):
+            return file_generation(self.partition_file(month) + ".gz")
+        return file_generation(self.partition_file(month), self._journal(month).journal_file)
+
+    def partition(self, month):
+        """The cached, typed TransactionSet of one partition (empty if it does not exist)."""
+        cache = self._caches.get(month)
+        if cache is None:
+            cache = self._caches.setdefault(month, TransactionCache())
+        # Journal appends always grow the file, so the files alone tell when a partition changed
+        return cache.get(self.partition_generation(month), lambda: TransactionSet(self._read_partition(month)))
+
+    def _read_partition(self, month):
+        if self.is_compressed(month):
+            with gzip.open(self.partition_file(month) + ".gz", 'rt', newline='') as f:
+                return [normalize_row(row) for row in csv.DictReader(f)]
+        return self._journal(month).load()
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+
+    def shared_generation(self):
+        return tuple((month, self.partition_generation(month)) for month in self.months())
+
+    def _read_transactions(self):
+        rows = []
+        for month in self.months():
+            rows.extend(self.partition(month).rows)
+        return rows
+
+    def month_transactions(self, month):
+        return list(self.partition(month).rows)
+
+    def _stream_rows(self, columns, where, month):
+        # A month filter prunes every other partition before any file is opened
+        months = [month] if month else self.months()
+        for partition_month in months:
+            if self.is_compressed(partition_month):
+                with gzip.open(self.partition_file(partition_month) + ".gz", 'rb') as f:
+                    header, values_iter = iter_csv_values(f)
+                    select = row_selector(header, columns, where)
+                    for values in values_iter:
+                        row = select(values)
+                        if row is not None:
+                            yield row
+            elif os.path.exists(self.partition_file(partition_month)):
+                yield from self._journal(partition_month).iter_rows(columns, where)
+
+    def recent_transactions(self, count):
+        # Walk back from the newest partition instead of loading the whole history
+        recent = []
+        for month in reversed(self.months()):
+            recent[:0] = self.partition(month).rows[-(count - len(recent)):]
+            if len(recent) >= count:
+                break
+        return recent
+
+    def _holds(self, month, tx_id):
+        """Whether partition ``month`` has ``tx_id``: a lookup in its Id index (or, if compressed, its cached Id set)."""
+        if not self.is_compressed(month):
+            return self._journal(month).index.contains(tx_id)
+        generation = self.partition_generation(month)
+        cached = self._compressed_ids.get(month)
+        if cached is None or cached[0] != generation:
+            # Compressed partitions are read-only, so this streams the Id column once per worker
+            cached = self._compressed_ids[month] = (
+                generation, {row["Id"] for row in self._stream_rows(["Id"], None, month)})
+        return tx_id in cached[1]
+
+    def _locate(self, tx_id):
+        """Return (month, row) for the first partition holding ``tx_id``, newest first, or (None, None).
+
+        Partitions are ruled out by their Id index; only the one that holds
+        the Id has its row read.
+        """
+        tx_id = str(tx_id)
+        for month in reversed(self.months()):
+            if not self._holds(month, tx_id):
+                continue
+            if self.is_compressed(month):
+                row = next((tx for tx in self.partition(month).rows if tx.get("Id") == tx_id), None)
+                row = normalize_row(row) if row is not None else None
+            else:
+                row = self._journal(month).get(tx_id)
+            if row is not None:
+                return month, row
+        return None, None
+
+    def _id_taken(self, tx_id):
+        tx_id = str(tx_id)
+        return any(self._holds(month, tx_id) for month in self.months())
+
+    def get_transaction(self, tx_id):
+        return self._locate(tx_id)[1]
+
+    def category_totals(self, month=None):
+        if month:
+            return super().category_totals(month)
+        totals = {}
+        for partition_month in self.months():
+            for category, data in self.partition(partition_month).columns.category_totals().items():
+                entry = totals.setdefault(category, {"total": 0.0, "count": 0})
+                entry["total"] += data["total"]
+                entry["count"] += data["count"]
+        return totals
+
+    def daily_totals(self):
+        totals = {}
+        for month in self.months():
+            for day, total in self.partition(month).columns.daily_totals().items():
+                totals[day] = totals.get(day, 0.0) + total
+        return totals
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+
+    def add_transactions(self, rows):
+        with self.lock.exclusive():
+            before = self.shared_generation()
+            rows = self._unique_rows(rows)
+            by_month = {}
+            for row in rows:
+                by_month.setdefault(self.partition_key(row), []).append(row)
+            for month, month_rows in by_month.items():
+                self._writable(month).append_many(month_rows)
+            self._wrote()
+            self._record_write(before, added=rows)
+        return rows
+
+    def update_transaction(self, tx_id, field, value):
+        value = self._ingest_value(field, value)
+        with self.lock.exclusive():
+            before = self.shared_generation()
+            month, old_row = self._locate(tx_id)
+            if old_row is None:
+                return None
+            journal = self._writable(month)
+            new_row = dict(old_row)
+            new_row[field] = '' if value is None else str(value)
+            new_month = self.partition_key(new_row)
+            if new_month == month:
+                journal.append_update(tx_id, field, value)
+            else:
+                # A date change can move the transaction to another month's partition
+                journal.append_delete(tx_id)
+                self._writable(new_month).append_add(new_row)
+            self._wrote()
+            self._record_write(before, added=[new_row], removed=[old_row])
+        return old_row
+
+    def delete_transactions(self, tx_ids):
+        with self.lock.exclusive():
+            before = self.shared_generation()
+            by_month = {}
+            for tx_id in map(str, tx_ids):
+                month = self._locate(tx_id)[0]
+                if month is not None:
+                    by_month.setdefault(month, set()).add(tx_id)
+            # One write per partition touched
+            removed = []
+            for month, month_ids in by_month.items():
+                removed += self._writable(month).append_deletes(month_ids)
+            if not removed:
+                return []
+            self._wrote()
+            self._record_write(before, removed=removed)
+        return removed
+
+    # ---------------------------
+    # Maintenance
+    # ---------------------------
+
+    def pending_writes(self):
+        return sum(self._journal(month).pending_records()
+                   for month in self.months() if not self.is_compressed(month))
+
+    def compact(self):
+        count = 0
+        with self.lock.exclusive():
+            before = self.shared_generation()
+            for month in self.months():
+                if self.is_compressed(month):
+                    count += len(self.partition(month).rows)
+                else:
+                    count += self._journal(month).compact()
+            if self.compress_after:
+                self.compress(self.compress_after)
+            self._wrote()
+            self._record_write(before)
+        return count
+
+    def compress(self, keep_months):
+        """Gzip every dated partition more than ``keep_months`` months old; returns the months compressed."""
+        today = date.today()
+        cutoff_index = today.year * 12 + today.month - 1 - keep_months
+        cutoff = f"{cutoff_index // 12:04d}-{cutoff_index % 12 + 1:02d}"
+        compressed = []
+        with self.lock.exclusive():
+            before = self.shared_generation()
+            for month in self.months():
+                if month == self.UNDATED or month >= cutoff or self.is_compressed(month):
+                    continue
+                journal = self._journal(month)
+                with journal.lock.exclusive():
+                    rows = journal.load()
+                    buffer = io.StringIO(newline='')
+                    writer = csv.DictWriter(buffer, fieldnames=TRANSACTION_FIELDS)
+                    writer.writeheader()
+                    writer.writerows(rows)
+                    atomic_write(self.partition_file(month) + ".gz", gzip.compress(buffer.getvalue().encode('utf-8')))
+                    for path in (journal.csv_file, journal.journal_file, journal.index.index_file):
+                        if os.path.exists(path):
+                            os.remove(path)
+                self._journals.pop(month, None)
+                compressed.append(month)
+            if compressed:
+                self._wrote()
+                self._record_write(before)
+        return compressed
+
+    def _decompress(self, month):
+        """Unpack a compressed partition back to a plain CSV so it can take journal writes."""
+        gz_file = self.partition_file(month) + ".gz"
+        with gzip.open(gz_file, 'rb') as f:
+            atomic_write(self.partition_file(month), f.read())
+        os.remove(gz_file)
+        self._journals.pop(month, None)
+
+
+class SqliteEngine(StorageEngine):
+    """Embedded SQLite engine running in WAL mode.
+
+    Month/category aggregates are computed in SQL rather than in Python.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, db_file="budget.db"):
+        super().__init__()
+        self.db_file = db_file
+        self._local = threading.local()
+        self._create_schema()
+        self.limits = LimitsIndex(self.load_limits, db_file + ".limits-version")
+
+    def _connect(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self):
+        columns = ",\n".join(
+            f'"{field}" REAL' if field == "Amount" else f'"{field}" TEXT'
+            for field in TRANSACTION_FIELDS
+        )
+        conn = self._connect()
+        with conn:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS transactions (\n{columns},\n"Month" TEXT,\n"Day" INTEGER)')
+            self._add_day_column(conn)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_id ON transactions("Id")')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions("Date")')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions("Category", "Month")')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_day ON transactions("Day", "Category")')
+            conn.execute('CREATE TABLE IF NOT EXISTS limits ("Category" TEXT PRIMARY KEY, "Limit" REAL, "Alert_Threshold" INTEGER, '
+                         '"Window_Days" INTEGER DEFAULT 0)')
+            if "Window_Days" not in [info[1] for info in conn.execute("PRAGMA table_info(limits)")]:
+                conn.execute('ALTER TABLE limits ADD COLUMN "Window_Days" INTEGER DEFAULT 0')
+            has_totals = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'monthly_totals'").fetchone()
+            conn.execute('CREATE TABLE IF NOT EXISTS monthly_totals ("Category" TEXT, "Month" TEXT, "Cents" INTEGER, '
+                         '"Count" INTEGER, PRIMARY KEY ("Category", "Month"))')
+            if not has_totals:
+                self._rebuild_totals(conn)
+
+    def _add_day_column(self, conn):
+        """Databases created before the Day column get it added and backfilled once."""
+        columns = [info[1] for info in conn.execute("PRAGMA table_info(transactions)")]
+        if "Day" in columns:
+            return
+        conn.execute('ALTER TABLE transactions ADD COLUMN "Day" INTEGER')
+        dates = conn.execute('SELECT DISTINCT "Date" FROM transactions').fetchall()
+        conn.executemany('UPDATE transactions SET "Day" = ? WHERE "Date" IS ?',
+                         [(parse_day(date_str), date_str) for (date_str,) in dates])
+
+    def _apply_deltas(self, conn, deltas):
+        """Fold (category, month, cents, count) deltas into monthly_totals inside the caller's transaction."""
+        conn.executemany(
+            'INSERT INTO monthly_totals ("Category", "Month", "Cents", "Count") VALUES (?, ?, ?, ?) '
+            'ON CONFLICT("Category", "Month") DO UPDATE SET "Cents" = "Cents" + excluded."Cents", '
+            '"Count" = "Count" + excluded."Count"',
+            deltas
+        )
+        conn.execute('DELETE FROM monthly_totals WHERE "Count" <= 0')
+
+    def _rebuild_totals(self, conn):
+        """Recompute monthly_totals from the transactions table; returns the cells that changed."""
+        before = {(category, month): (cents, count) for category, month, cents, count
+                  in conn.execute('SELECT "Category", "Month", "Cents", "Count" FROM monthly_totals')}
+        after = {}
+        for category, amount, date_str in conn.execute('SELECT "Category", "Amount", "Date" FROM transactions'):
+            for delta in row_deltas({"Category": category, "Amount": amount, "Date": date_str}):
+                cents, count = after.get(delta[:2], (0, 0))
+                after[delta[:2]] = (cents + delta[2], count + delta[3])
+        conn.execute("DELETE FROM monthly_totals")
+        conn.executemany('INSERT INTO monthly_totals ("Category", "Month", "Cents", "Count") VALUES (?, ?, ?, ?)',
+                         [(category, month, cents, count) for (category, month), (cents, count) in after.items()])
+        return [
+            (category, month, before.get((category, month), (0, 0)), after.get((category, month), (0, 0)))
+            for category, month in sorted(set(before) | set(after))
+            if before.get((category, month)) != after.get((category, month))
+        ]
+
+    def _row_to_dict(self, row):
+        tx = {field: '' if row[field] is None else str(row[field]) for field in TRANSACTION_FIELDS}
+        tx["Amount"] = row["Amount"] or 0.0
+        tx["Day"] = row["Day"] or NO_DAY
+        return tx
+
+    def _insert_rows(self, conn, rows):
+        placeholders = ", ".join("?" for _ in range(len(TRANSACTION_FIELDS) + 2))
+        quoted = ", ".join(f'"{field}"' for field in TRANSACTION_FIELDS)
+        conn.executemany(
+            f'INSERT INTO transactions ({quoted}, "Month", "Day") VALUES ({placeholders})',
+            [self._insert_values(row) for row in rows]
+        )
+
+    def _insert_values(self, row):
+        row = normalize_row(row)
+        values = [to_float(row[field]) if field == "Amount" else row[field] for field in TRANSACTION_FIELDS]
+        return values + [month_key(row["Date"]), parse_day(row["Date"])]
+
+    def shared_generation(self):
+        return file_generation(self.db_file, self.db_file + "-wal")
+
+    def _read_transactions(self):
+        cursor = self._connect().execute("SELECT * FROM transactions ORDER BY rowid")
+        return [self._row_to_dict(row) for row in cursor]
+
+    def recent_transactions(self, count):
+        cursor = self._connect().execute("SELECT * FROM transactions ORDER BY rowid DESC LIMIT ?", (count,))
+        return [self._row_to_dict(row) for row in reversed(cursor.fetchall())]
+
+    def month_transactions(self, month):
+        cursor = self._connect().execute(
+            'SELECT * FROM transactions WHERE "Day" >= ? AND "Day" < ? ORDER BY rowid', month_range(month)
+        )
+        return [self._row_to_dict(row) for row in cursor]
+
+    def _stream_rows(self, columns, where, month):
+        wanted = list(columns or TRANSACTION_FIELDS)
+        fetched = [column for column in dict.fromkeys(wanted + list(where)) if column in TRANSACTION_FIELDS]
+        quoted = ", ".join(f'"{column}"' for column in fetched)
+        query = f'SELECT {quoted} FROM transactions'
+        params = ()
+        if month:
+            # The month is pushed down to the Day index; the Date predicate then always passes
+            query += ' WHERE "Day" >= ? AND "Day" < ?'
+            params = month_range(month)
+        # The cursor pages rows in from SQLite as they are consumed
+        for values in self._connect().execute(query + ' ORDER BY rowid', params):
+            raw = {column: '' if value is None else str(value) for column, value in zip(fetched, values)}
+            row = select_row(raw, wanted, where)
+            if row is not None:
+                yield row
+
+    def get_transaction(self, tx_id):
+        row = self._connect().execute(
+            'SELECT * FROM transactions WHERE "Id" = ? ORDER BY rowid LIMIT 1', (str(tx_id),)
+        ).fetchone()
+        return self._row_to_dict(row) if row is not None else None
+
+    def add_transactions(self, rows):
+        conn = self._connect()
+        with conn:
+            # Take SQLite's write lock before the Id check so no other worker can race it
+            conn.execute("BEGIN IMMEDIATE")
+            rows = self._unique_rows(rows)
+            self._insert_rows(conn, rows)
+            self._apply_deltas(conn, [delta for row in rows for delta in row_deltas(row)])
+        self._wrote()
+        return rows
+
+    def update_transaction(self, tx_id, field, value):
+        if field not in TRANSACTION_FIELDS:
+            raise ValueError(f"Unknown field {field}")
+        value = self._ingest_value(field, value)
+        value = to_float(value) if field == "Amount" else ('' if value is None else str(value))
+        conn = self._connect()
+        with conn:
+            # Take the write lock before reading the old row, so the totals deltas match what is replaced
+            conn.execute("BEGIN IMMEDIATE")
+            # Matches the CSV engine: only the first row with this Id is updated
+            old_row = conn.execute('SELECT rowid, * FROM transactions WHERE "Id" = ? ORDER BY rowid LIMIT 1', (str(tx_id),)).fetchone()
+            if old_row is None:
+                return None
+            conn.execute(f'UPDATE transactions SET "{field}" = ? WHERE rowid = ?', (value, old_row["rowid"]))
+            if field == "Date":
+                conn.execute('UPDATE transactions SET "Month" = ?, "Day" = ? WHERE rowid = ?',
+                             (month_key(value), parse_day(value), old_row["rowid"]))
+            old_tx = self._row_to_dict(old_row)
+            self._apply_deltas(conn, row_deltas(old_tx, -1) + row_deltas(dict(old_tx, **{field: value})))
+        self._wrote()
+        return old_tx
+
+    def delete_transactions(self, tx_ids):
+        tx_ids = list(dict.fromkeys(map(str, tx_ids)))
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            old_rows = [self._row_to_dict(row) for tx_id in tx_ids for row in
+                        conn.execute('SELECT * FROM transactions WHERE "Id" = ? ORDER BY rowid', (tx_id,))]
+            if not old_rows:
+                return []
+            conn.executemany('DELETE FROM transactions WHERE "Id" = ?', [(tx_id,) for tx_id in tx_ids])
+            self._apply_deltas(conn, [delta for row in old_rows for delta in row_deltas(row, -1)])
+        self._wrote()
+        return old_rows
+
+    def category_totals(self, month=None):
+        if month:
+            cursor = self._connect().execute(
+                'SELECT "Category", "Cents", "Count" FROM monthly_totals WHERE "Month" = ?', (month,)
+            )
+            return {category or '': {"total": cents / 100, "count": count} for category, cents, count in cursor}
+        cursor = self._connect().execute('SELECT "Category", SUM("Amount"), COUNT(*) FROM transactions GROUP BY "Category"')
+        return {category or '': {"total": total or 0.0, "count": count} for category, total, count in cursor}
+
+    def category_month_total(self, category, month):
+        row = self._connect().execute(
+            'SELECT "Cents" FROM monthly_totals WHERE "Category" = ? AND "Month" = ?', (category, month)
+        ).fetchone()
+        return row[0] / 100 if row else 0.0
+
+    def rebuild_aggregates(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            return self._rebuild_totals(conn)
+
+    def daily_totals(self):
+        cursor = self._connect().execute(
+            'SELECT "Day", SUM("Amount") FROM transactions WHERE "Day" != ? GROUP BY "Day"', (NO_DAY,)
+        )
+        return {day: total or 0.0 for day, total in cursor}
+
+    def window_total(self, category, days, end_day=None):
+        # Served by the (Day, Category) index instead of in-process prefix sums, since a
+        # SQLite write's post-commit generation can't be read under the write lock
+        end_day = end_day or today_day()
+        days = min(days, self.rolling.horizon_days)
+        total = self._connect().execute(
+            'SELECT SUM("Amount") FROM transactions WHERE "Day" > ? AND "Day" <= ? AND "Category" = ?',
+            (end_day - days, end_day, category)
+        ).fetchone()[0]
+        return total or 0.0
+
+    def category_daily_totals(self, category, start_day, end_day):
+        cursor = self._connect().execute(
+            'SELECT "Day", SUM("Amount") FROM transactions WHERE "Day" >= ? AND "Day" <= ? AND "Category" = ? GROUP BY "Day"',
+            (start_day, end_day, category)
+        )
+        totals = dict(cursor.fetchall())
+        return [totals.get(day) or 0.0 for day in range(start_day, end_day + 1)]
+
+    def load_limits(self):
+        cursor = self._connect().execute('SELECT "Category", "Limit", "Alert_Threshold", "Window_Days" FROM limits ORDER BY rowid')
+        return [
+            {"Category": category, "Limit": str(limit), "Alert_Threshold": str(threshold), "Window_Days": str(window_days or 0)}
+            for category, limit, threshold, window_days in cursor
+        ]
+
+    def save_limit(self, category, limit, alert_threshold, window_days=0):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'INSERT INTO limits ("Category", "Limit", "Alert_Threshold", "Window_Days") VALUES (?, ?, ?, ?) '
+                'ON CONFLICT("Category") DO UPDATE SET "Limit" = excluded."Limit", "Alert_Threshold" = excluded."Alert_Threshold", '
+                '"Window_Days" = excluded."Window_Days"',
+                (category, float(limit), int(alert_threshold), int(window_days))
+            )
+        self.limits.bump()
+
+    def delete_limit(self, category):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM limits WHERE "Category" = ?', (category,))
+        self.limits.bump()
+
+    def compact(self):
+        conn = self._connect()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+
+def get_engine(csv_file="file.csv", limits_file="limits.csv", db_file=None):
+    """Build the storage engine selected by the STORAGE_ENGINE environment variable."""
+    engine_name = os.environ.get("STORAGE_ENGINE", "csv").lower()
+    if engine_name == "sqlite":
+        return SqliteEngine(db_file or os.environ.get("SQLITE_DB", "budget.db"))
+    if engine_name == "partitioned":
+        return PartitionedEngine(os.environ.get("PARTITION_DIR", "transactions"), limits_file)
+    if engine_name != "csv":
+        print(f"Unknown STORAGE_ENGINE {engine_name!r}, falling back to csv")
+    return CsvEngine(csv_file, limits_file)
+
+
+def migrate_csv_to_sqlite(csv_file="file.csv", limits_file="limits.csv", db_file="budget.db", force=False):
+    """One-shot copy of file.csv (plus journal) and limits.csv into a SQLite database."""
+    source = CsvEngine(csv_file, limits_file)
+    target = SqliteEngine(db_file)
+    conn = target._connect()
+
+    existing = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+    if existing and not force:
+        print(f"{db_file} already holds {existing} transactions; pass --force to replace them")
+        return 0, 0
+
+    transactions = source.load_transactions()
+    limits_data = source.load_limits()
+    with conn:
+        conn.execute("DELETE FROM transactions")
+        conn.execute("DELETE FROM limits")
+        target._insert_rows(conn, transactions)
+        target._rebuild_totals(conn)
+        conn.executemany(
+            'INSERT INTO limits ("Category", "Limit", "Alert_Threshold", "Window_Days") VALUES (?, ?, ?, ?)',
+            [(row.get("Category"), to_float(row.get("Limit")), int(to_float(row.get("Alert_Threshold"))),
+              int(to_float(row.get("Window_Days"))))
+             for row in limits_data if row.get("Category")]
+        )
+    return len(transactions), len(limits_data)
+
+
+def migrate_csv_to_partitions(csv_file="file.csv", limits_file="limits.csv", partition_dir="transactions", force=False):
+    """One-shot split of file.csv (plus journal) into monthly partitions; returns the transaction count."""
+    source = CsvEngine(csv_file, limits_file)
+    target = PartitionedEngine(partition_dir, limits_file)
+    if target.months() and not force:
+        print(f"{partition_dir} already holds partitions; pass --force to replace them")
+        return 0
+
+    by_month = {}
+    for row in source.load_transactions():
+        by_month.setdefault(target.partition_key(row), []).append(normalize_row(row))
+    with target.lock.exclusive():
+        for month in target.months():
+            journal = target._writable(month)
+            for path in (journal.journal_file, journal.index.index_file):
+                if os.path.exists(path):
+                    os.remove(path)
+            os.remove(journal.csv_file)
+        for month, rows in by_month.items():
+            write_csv_data(target.partition_file(month), rows, TRANSACTION_FIELDS)
+    return sum(len(rows) for rows in by_month.values())
+
+
+USAGE = """Usage:
+  python storage.py migrate [--force] [file.csv] [limits.csv] [budget.db]
+  python storage.py partition [--force] [file.csv] [limits.csv] [transactions]
+  python storage.py compress MONTHS_TO_KEEP [transactions]
+  python storage.py rebuild-aggregates   (uses STORAGE_ENGINE like the app)"""
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--force"]
+    force = "--force" in sys.argv
+    if args and args[0] == "migrate":
+        paths = args[1:] + ["file.csv", "limits.csv", "budget.db"][len(args) - 1:]
+        tx_count, limit_count = migrate_csv_to_sqlite(*paths[:3], force=force)
+        print(f"Migrated {tx_count} transactions and {limit_count} limits into {paths[2]}")
+        print("Start the app with STORAGE_ENGINE=sqlite to use it")
+    elif args and args[0] == "partition":
+        paths = args[1:] + ["file.csv", "limits.csv", "transactions"][len(args) - 1:]
+        tx_count = migrate_csv_to_partitions(*paths[:3], force=force)
+        print(f"Split {tx_count} transactions into monthly partitions under {paths[2]}")
+        print("Start the app with STORAGE_ENGINE=partitioned to use it")
+    elif len(args) >= 2 and args[0] == "compress" and args[1].isdigit():
+        partition_dir = args[2] if len(args) > 2 else "transactions"
+        compressed = PartitionedEngine(partition_dir, compress_after=0).compress(int(args[1]))
+        print(f"Compressed {len(compressed)} partitions: {', '.join(compressed) or 'none'}")
+    elif args and args[0] == "rebuild-aggregates":
+        engine = get_engine()
+        drift = engine.rebuild_aggregates()
+        for category, month, (old_cents, old_count), (cents, count) in drift:
+            print(f"  {category or '(none)'} {month or '(undated)'}: "
+                  f"{old_cents / 100:.2f} in {old_count} -> {cents / 100:.2f} in {count}")
+        print(f"Rebuilt the {engine.name} monthly totals; {len(drift)} cells had drifted")
+    else:
+        print(USAGE)
@@ -0,0 +1,80 @@
+from dates import today_day
+
+
+class StreakTracker:
+    """Runs of consecutive days with a transaction, kept as start/end maps.
+
+    Adding a day only looks at its two neighbours: it starts a run, extends
+    one at either end, or joins two into one. That makes every add O(1)
+    whatever order days arrive in, with the longest run kept alongside, so
+    checking any streak length (7, 30, 100 days...) is one comparison.
+    Removing a day splits its run, and rescans the runs only if it was
+    the longest. Days are ordinals.
+    """
+
+    def __init__(self, runs=(), longest=0):
+        self._end_of = {}
+        self._start_of = {}
+        for start, end in runs:
+            self._end_of[start] = end
+            self._start_of[end] = start
+        self.longest = max([longest] + [end - start + 1 for start, end in runs])
+
+    @classmethod
+    def from_days(cls, days):
+        """Tracker for a set of days, built in one pass over them in sorted order."""
+        runs = []
+        for day in sorted(days):
+            if runs and runs[-1][1] + 1 == day:
+                runs[-1][1] = day
+            elif not runs or runs[-1][1] < day:
+                runs.append([day, day])
+        return cls(runs)
+
+    def runs(self):
+        """[[start, end], ...] for every run, oldest first."""
+        return sorted([start, end] for start, end in self._end_of.items())
+
+    def add(self, day):
+        """Count a day that had no transaction before; returns the length of the run it is now part of."""
+        start = self._start_of.pop(day - 1, day)
+        end = self._end_of.pop(day + 1, day)
+        self._end_of[start] = end
+        self._start_of[end] = start
+        length = end - start + 1
+        self.longest = max(self.longest, length)
+        return length
+
+    def remove(self, day):
+        """Drop a day that no longer has a transaction, splitting its run; returns the longest run left."""
+        # The run's end is at most ``longest`` days on
+        for end in range(day, day + self.longest):
+            start = self._start_of.get(end)
+            if start is not None:
+                break
+        else:
+            return self.longest
+        if start > day:
+            return self.longest
+        del self._start_of[end]
+        del self._end_of[start]
+        for piece_start, piece_end in ((start, day - 1), (day + 1, end)):
+            if piece_start <= piece_end:
+                self._end_of[piece_start] = piece_end
+                self._start_of[piece_end] = piece_start
+        if end - start + 1 >= self.longest:
+            self.longest = max([0] + [end - start + 1 for start, end in self._end_of.items()])
+        return self.longest
+
+    def current(self, today=None):
+        """Length of the run ending today, or yesterday while today is still open."""
+        today = today or today_day()
+        for end in (today, today - 1):
+            start = self._start_of.get(end)
+            if start is not None:
+                return end - start + 1
+        return 0
+
+    def reached(self, length):
+        """Whether some run was at least ``length`` days long."""
+        return self.longest >= length
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Test incremental achievement evaluation
+"""
+
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+
+from achievements import METRICS, AchievementStats, AchievementStore, day_buckets
+from backfill import backfill
+from storage import CsvEngine
+from streaks import StreakTracker
+
+
+def tx(amount, category="Food", days_ago=0):
+    return {"Amount": amount, "Category": category, "Date": (date.today() - timedelta(days=days_ago)).strftime("%m/%d/%Y")}
+
+
+def test_stats_report_changed_inputs():
+    stats = AchievementStats()
+    assert stats.add(tx(5)) >= {"count", "categories", "streak", "today"}
+    assert stats.add(tx(5)) & {"categories", "streak"} == set()
+    assert stats.day_total(date.today().toordinal()) == 10.0
+
+    # Days arriving out of order still join up into one run
+    for days_ago in (3, 1, 2):
+        stats.add(tx(1, days_ago=days_ago))
+    assert stats.streaks.longest == 4
+    assert AchievementStats.from_dict(stats.as_dict()).as_dict() == stats.as_dict()
+
+    # Edits and deletes take a row back out; a day left empty breaks its run
+    assert stats.remove(tx(1, days_ago=2)) >= {"count", "streak"}
+    assert (stats.count, stats.streaks.longest) == (4, 2)
+    stats.add(tx(1, "Books", days_ago=2))
+    assert stats.remove(tx(1, "Books", days_ago=2)) >= {"categories", "streak"}
+    assert set(stats.categories) == {"Food"} and stats.streaks.longest == 2
+    assert stats.remove(tx(5)) & {"streak", "categories"} == set()
+    assert stats.day_total(date.today().toordinal()) == 5.0
+    assert stats.as_dict() == AchievementStats.from_rows([tx(5), tx(1, days_ago=1), tx(1, days_ago=3)]).as_dict()
+
+
+def test_streak_tracker():
+    days = [10, 11, 12, 20, 14, 13, 21, 30]
+    incremental = StreakTracker()
+    for day in days:
+        incremental.add(day)
+    backfilled = StreakTracker.from_days(days)
+    assert incremental.runs() == backfilled.runs() == [[10, 14], [20, 21], [30, 30]]
+    assert incremental.longest == backfilled.longest == 5
+    assert incremental.reached(5) and not incremental.reached(7)
+
+    # Filling the gap joins two runs
+    assert incremental.add(15) == 6
+    assert incremental.add(22) == 3
+    assert [incremental.current(today) for today in (22, 23, 24, 31)] == [3, 3, 0, 1]
+    assert StreakTracker(incremental.runs(), incremental.longest).runs() == incremental.runs()
+
+    # Removing a day splits its run; the longest is rescanned only when that run was the longest
+    assert incremental.remove(12) == 3
+    assert incremental.runs() == [[10, 11], [13, 15], [20, 22], [30, 30]]
+    assert incremental.remove(30) == 3 and incremental.remove(25) == 3
+
+    # A 100-day history stays one run whatever order the days come in
+    tracker = StreakTracker()
+    for day in list(range(1000, 1100, 2)) + list(range(1001, 1100, 2)):
+        tracker.add(day)
+    assert (tracker.runs(), tracker.reached(100)) == ([[1000, 1099]], True)
+
+
+def test_record_transactions_unlocks_incrementally():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        history = [tx(50, f"Category {n % 3}", days_ago=n) for n in range(8)]
+        system = AchievementStore(tmpdir).get()
+        unlocked = system.record_transactions(history[-1:], [], history=lambda: history, limits_version=0)
+        assert {a["id"] for a in unlocked} == {"first_transaction", "first_category", "consistent_tracker"}
+
+        # Only achievements whose inputs changed are checked on later writes
+        checked = []
+        original = METRICS["categories"]["value"]
+        METRICS["categories"]["value"] = lambda *args: checked.append(args) or original(*args)
+        try:
+            system = AchievementStore(tmpdir).get()
+            assert system.record_transactions([tx(5, "Category 1")], [], limits_version=0) == []
+            assert checked == []
+            system.record_transactions([tx(5, "Books"), tx(5, "Games")], [], limits_version=0)
+            assert len(checked) == 1
+        finally:
+            METRICS["categories"]["value"] = original
+
+        system = AchievementStore(tmpdir).get()
+        assert system.stats.count == 11
+        assert "five_categories" in system.achievements["unlocked"]
+        assert "ten_transactions" in system.achievements["unlocked"]
+
+        # A new limits version re-checks the limit achievements without any transaction
+        limits = [{"Category": "Food", "Limit": "100", "Alert_Threshold": "80"}]
+        totals = {"Food": {"total": 10.0, "count": 1}}
+        unlocked = AchievementStore(tmpdir).get().record_transactions([], limits, totals, limits_version=1)
+        assert {a["id"] for a in unlocked} == {"first_limit", "under_budget"}
+
+
+def test_check_achievements_from_full_history():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        unlocked = AchievementStore(tmpdir).get().check_achievements([tx(5, days_ago=n) for n in range(10)], [])
+        assert {a["id"] for a in unlocked} == {
+            "first_transaction", "ten_transactions", "first_category", "low_spending_day", "consistent_tracker"}
+        assert AchievementStore(tmpdir).get().stats.count == 10
+
+
+def test_store_caches_and_writes_only_changes():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        legacy = os.path.join(tmpdir, "user_achievements.json")
+        with open(legacy, "w") as f:
+            json.dump({"unlocked": ["first_limit"], "progress": {}}, f)
+        store = AchievementStore(os.path.join(tmpdir, "achievements"), legacy_file=legacy)
+
+        # The default user starts from the single-user file; others start empty
+        system = store.get()
+        assert system.achievements["unlocked"] == ["first_limit"]
+        assert store.get("alice").achievements["unlocked"] == []
+        assert store.get() is system
+
+        system.record_transactions([tx(5)], [], limits_version=0)
+        assert store.writes == 1
+        assert system.record_transactions([], [], limits_version=0) == []
+        assert store.writes == 1
+        assert os.listdir(store.directory) == ["default.json"]
+
+        # Another worker's save is picked up on the next get
+        other_worker = AchievementStore(store.directory, legacy_file=legacy)
+        other_worker.get().record_transactions([tx(5, "Books")], [], limits_version=0)
+        assert store.get() is not system
+        assert store.get().stats.categories == {"Food", "Books"}
+
+        store.get().reset()
+        store.get().save_achievements()
+        assert AchievementStore(store.directory, legacy_file=legacy).get().achievements["unlocked"] == []
+
+
+def test_replay_records_real_unlock_dates():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        start = date.today() - timedelta(days=40)
+        history = [tx(5, "Books", days_ago=1), {"Amount": 3, "Category": "Undated", "Date": ""}]
+        history += [tx(25, f"Category {n % 5}", days_ago=40 - n) for n in range(10)]
+        limits = [{"Category": "Books", "Limit": "100", "Alert_Threshold": "80"}]
+        system = AchievementStore(tmpdir).get()
+        system.record_transactions([tx(1)], limits)
+        unlocked = {a["id"]: a["unlocked_date"] for a in system.replay(day_buckets(history), limits, limits_version=3)}
+
+        assert unlocked["first_transaction"] == start.isoformat()
+        assert unlocked["five_categories"] == (start + timedelta(days=3)).isoformat()
+        assert unlocked["consistent_tracker"] == (start + timedelta(days=6)).isoformat()
+        assert unlocked["ten_transactions"] == (start + timedelta(days=8)).isoformat()
+        assert unlocked["low_spending_day"] == (date.today() - timedelta(days=1)).isoformat()
+        assert unlocked["under_budget"] == (date.today() - timedelta(days=1)).isoformat()
+        assert unlocked["first_limit"] == date.today().isoformat()
+        saved = AchievementStore(tmpdir).get()
+        assert saved.stats.count == 12 and saved.achievements["limits_version"] == 3
+        assert {a["id"]: a["unlocked_date"] for a in saved.get_unlocked_achievements()} == unlocked
+
+
+def test_backfill_users_in_parallel():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        jobs = []
+        for user, count in (("alice", 12), ("bob", 3)):
+            engine = CsvEngine(os.path.join(tmpdir, f"{user}.csv"), os.path.join(tmpdir, "limits.csv"))
+            engine.add_transactions([dict(tx(10, days_ago=n), Id=n + 1, Name="Lunch") for n in range(count)])
+            jobs.append((user, engine.csv_file))
+        directory = os.path.join(tmpdir, "achievements")
+        summaries = {user: (count, len(unlocked)) for user, count, unlocked, _ in backfill(jobs, 2, directory)}
+        assert summaries == {"alice": (12, 5), "bob": (3, 3)}
+        assert AchievementStore(directory).get("alice").achievements["unlocked"][:2] == ["first_transaction", "first_category"]
+
+
+def test_progress_is_cached_per_metric():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = AchievementStore(tmpdir)
+        system = store.get()
+        system.record_transactions([tx(30, days_ago=n) for n in range(4)], [])
+        progress = system.get_progress()
+        assert progress["ten_transactions"] == {"value": 4, "target": 10, "percent": 40.0}
+        assert progress["first_transaction"]["percent"] == 100.0
+        assert progress["consistent_tracker"]["value"] == 4
+        assert progress["low_spending_day"]["value"] == 0
+
+        # Progress is saved with the rest, so a fresh worker reads it back without the counters
+        system.record_transactions([tx(5, "Books", days_ago=10)], [])
+        fresh = AchievementStore(tmpdir).get()
+        fresh.stats = None
+        assert fresh.get_progress()["ten_transactions"]["value"] == 5
+        assert fresh.achievements["progress"]["categories"] == 2
+        assert "transactions" in fresh.achievements["progress"]
+
+
+def test_progress_follows_edits_and_deletes():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        history = [tx(30, days_ago=n) for n in range(6)] + [tx(30, "Books", days_ago=2)]
+        AchievementStore(tmpdir).get().record_transactions(history, [])
+        progress = lambda: {achievement_id: entry["value"] for achievement_id, entry in AchievementStore(tmpdir).get().get_progress().items()
+                            if achievement_id in ("ten_transactions", "five_categories", "consistent_tracker", "low_spending_day")}
+        assert progress() == {"ten_transactions": 7, "five_categories": 2, "consistent_tracker": 6, "low_spending_day": 0}
+
+        # Deleting rows lowers the counts; a day left empty cuts the streak
+        AchievementStore(tmpdir).get().record_transactions([], [], removed=[history[-1]])
+        assert progress() == {"ten_transactions": 6, "five_categories": 1, "consistent_tracker": 6, "low_spending_day": 0}
+        AchievementStore(tmpdir).get().record_transactions([], [], removed=[history[2]])
+        assert progress() == {"ten_transactions": 5, "five_categories": 1, "consistent_tracker": 3, "low_spending_day": 0}
+
+        # An edit swaps the old row for the new one: moving a date, or lowering today's spend
+        AchievementStore(tmpdir).get().record_transactions([tx(30, days_ago=9)], [], removed=[history[3]])
+        assert progress() == {"ten_transactions": 5, "five_categories": 1, "consistent_tracker": 2, "low_spending_day": 0}
+        unlocked = AchievementStore(tmpdir).get().record_transactions([tx(5)], [], removed=[history[0]])
+        assert [a["id"] for a in unlocked] == ["low_spending_day"]
+        assert progress()["low_spending_day"] == 1
+
+        # Values no locked achievement reads any more are not kept
+        assert "frugal_day" not in AchievementStore(tmpdir).get().achievements["progress"]
+
+
+if __name__ == "__main__":
+    test_stats_report_changed_inputs()
+    test_streak_tracker()
+    test_record_transactions_unlocks_incrementally()
+    test_check_achievements_from_full_history()
+    test_store_caches_and_writes_only_changes()
+    test_replay_records_real_unlock_dates()
+    test_backfill_users_in_parallel()
+    test_progress_is_cached_per_metric()
+    test_progress_follows_edits_and_deletes()
+    print("✅ Achievement tests passed!")
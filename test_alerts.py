@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test the keyed spending alert store
+"""
+
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+
+from alert_rules import AlertRules
+from alerts import AlertStore
+from limits_store import Limit
+
+
+def make_alert(category, days_ago=0):
+    return {"category": category, "current_spending": 60.0, "limit": 100.0,
+            "threshold_percentage": 50, "message": "", "timestamp": str(date.today() - timedelta(days=days_ago))}
+
+
+def test_add_dismiss_and_dedup():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "active_alerts.json")
+        store = AlertStore(path)
+        other_worker = AlertStore(path)
+
+        assert store.add("Food_50_1", make_alert("Food"))
+        assert not other_worker.add("Food_50_1", make_alert("Food"))
+        assert other_worker.add("Travel_80_1", make_alert("Travel"))
+        assert [alert["key"] for alert in store.active()] == ["Food_50_1", "Travel_80_1"]
+
+        assert other_worker.dismiss("Food_50_1")
+        assert not store.dismiss("Food_50_1")
+        assert [alert["key"] for alert in store.active()] == ["Travel_80_1"]
+
+        store.clear()
+        assert other_worker.active() == []
+
+
+def test_version_tracks_changes():
+    """The ETag version moves with every change, in any worker, and only then"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "active_alerts.json")
+        store = AlertStore(path)
+        other_worker = AlertStore(path)
+        empty = store.version()
+
+        other_worker.add("Food_50_1", make_alert("Food"))
+        one_alert = store.version()
+        assert one_alert != empty
+        assert store.version() == one_alert
+        assert not store.add("Food_50_1", make_alert("Food"))
+        assert store.version() == one_alert
+
+        # A recreated file doesn't repeat an old version
+        os.remove(path)
+        fresh = AlertStore(path)
+        fresh.add("Food_50_1", make_alert("Food"))
+        assert fresh.version() != one_alert
+
+
+def test_expiry_and_legacy_list():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "active_alerts.json")
+        with open(path, 'w') as f:
+            json.dump([dict(make_alert("Food", days_ago=30), key="Food_50_old"),
+                       dict(make_alert("Bills", days_ago=1), key="Bills_90_new")], f)
+
+        store = AlertStore(path, ttl_days=7)
+        assert [alert["key"] for alert in store.active()] == ["Bills_90_new"]
+
+        # The next change prunes expired keys from the file
+        store.add("Food_50_today", make_alert("Food"))
+        with open(path, 'r') as f:
+            assert sorted(json.load(f)["alerts"]) == ["Bills_90_new", "Food_50_today"]
+        assert [(event["event"], event["key"]) for event in store.events_since(0)[1]] == [
+            ("created", "Food_50_today"), ("expired", "Food_50_old")]
+
+
+def test_event_replay():
+    """Stream clients can catch up on the changes made since their last event"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "active_alerts.json")
+        store = AlertStore(path)
+        other_worker = AlertStore(path)
+        seq, alerts = store.snapshot()
+        assert (seq, alerts) == (0, [])
+
+        other_worker.add("Food_50_1", make_alert("Food"))
+        assert store.wait(seq, timeout=2)
+        other_worker.dismiss("Food_50_1")
+        other_worker.clear()
+
+        seq, events = store.events_since(0)
+        assert seq == 3
+        assert [event["event"] for event in events] == ["created", "dismissed", "cleared"]
+        assert events[0]["alert"]["category"] == "Food"
+        assert store.events_since(3) == (3, [])
+        assert not store.wait(3, timeout=0.1)
+
+        # A client from before the retained log (or another file) is told to resync
+        store._events = store._events[2:]
+        assert store.events_since(0)[1] is None
+        assert store.events_since(7)[1] is None
+
+
+def test_alert_rules_fire_on_crossings_only():
+    limits = {"Food": Limit("Food", 100, 50)}
+    rules = AlertRules(limits, levels=[80, 100, 120])
+
+    assert rules.crossed("Food", 0, 49.99) == []
+    assert rules.crossed("Food", 40, 50) == [50]
+    assert rules.crossed("Food", 50, 60) == []
+    assert rules.crossed("Food", 60, 130) == [80, 100, 120]
+    assert rules.crossed("Food", 130, 500) == []
+    assert rules.crossed("Food", 90, 70) == []
+    assert rules.crossed("Travel", 0, 1000) == []
+
+    # A changed limit is recompiled
+    limits["Food"] = Limit("Food", 200, 90)
+    assert rules.crossed("Food", 150, 180) == [80, 90]
+    assert rules.boundaries("Food")[1] == [16000, 18000, 20000, 24000]
+
+
+def test_alert_rules_observe_late_checks():
+    """Checks that run after later writes still alert once per level reached"""
+    rules = AlertRules({"Food": Limit("Food", 100, 50)}, levels=[100])
+
+    # Three $30 adds commit before the first check runs: it sees $90 already
+    assert rules.observe("Food", "2025-08", 0, 90) == 50
+    assert rules.observe("Food", "2025-08", 30, 90) is None
+    assert rules.observe("Food", "2025-08", 60, 90) is None
+    assert rules.observe("Food", "2025-08", 90, 130) == 100
+
+    # Dropping below a level re-arms it; a new period starts from its own "before"
+    assert rules.observe("Food", "2025-08", 130, 40) is None
+    assert rules.observe("Food", "2025-08", 40, 55) == 50
+    assert rules.observe("Food", "2025-09", 60, 70) is None
+
+
+if __name__ == "__main__":
+    test_add_dismiss_and_dedup()
+    test_version_tracks_changes()
+    test_expiry_and_legacy_list()
+    test_event_replay()
+    test_alert_rules_fire_on_crossings_only()
+    test_alert_rules_observe_late_checks()
+    print("✅ Alert store tests passed!")
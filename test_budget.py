@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test budget utilization for spending limits
+"""
+
+import os
+import tempfile
+from datetime import date
+
+from budget import budget_report, month_budget
+from limits_store import Limit
+from projection import SpendProjector, burn_rate, project
+from storage import CsvEngine
+
+
+def test_budget_report_states():
+    limits = {
+        "Food": Limit("Food", 100, 50),
+        "Travel": Limit("Travel", 200, 90),
+        "Bills": Limit("Bills", 50, 80),
+        "Gifts": Limit("Gifts", 0, 80),
+    }
+    totals = {"Food": {"total": 60.0, "count": 3}, "Bills": {"total": 75.5, "count": 1}, "Other": {"total": 9.0, "count": 1}}
+    report = budget_report(limits, totals)
+    by_category = {entry["category"]: entry for entry in report["categories"]}
+
+    assert [entry["category"] for entry in report["categories"]] == ["Food", "Travel", "Bills", "Gifts"]
+    assert by_category["Food"]["state"] == "warning"
+    assert by_category["Food"]["percent_used"] == 60.0
+    assert by_category["Food"]["remaining"] == 40.0
+    assert by_category["Travel"] == dict(by_category["Travel"], spent=0.0, count=0, state="ok", percent_used=0.0)
+    assert by_category["Bills"]["state"] == "over"
+    assert by_category["Bills"]["remaining"] == -25.5
+    assert by_category["Gifts"]["percent_used"] == 0.0
+    assert (report["total_limit"], report["total_spent"], report["warning"], report["over"]) == (350.0, 135.5, 1, 1)
+
+
+def test_rolling_limits_use_window_totals():
+    limits = {"Food": Limit("Food", 100, 50, window_days=7), "Bills": Limit("Bills", 100, 50)}
+    report = budget_report(limits, {"Food": {"total": 500.0, "count": 9}, "Bills": {"total": 20.0, "count": 1}},
+                           window_totals={"Food": 55.0})
+    food, bills = report["categories"]
+    assert (food["spent"], food["state"], food["period"]) == (55.0, "warning", "Rolling 7 days")
+    assert (bills["spent"], bills["period"]) == (20.0, "Calendar month")
+
+
+def test_month_budget_from_store():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = CsvEngine(os.path.join(tmpdir, "file.csv"), os.path.join(tmpdir, "limits.csv"))
+        for n in range(300):
+            engine.save_limit(f"Category {n}", 100, 80)
+        engine.add_transaction({"Id": 1, "Name": "A", "Amount": 85, "Date": "08/01/2025", "Category": "Category 7"})
+        engine.add_transaction({"Id": 2, "Name": "B", "Amount": 10, "Date": "09/01/2025", "Category": "Category 7"})
+
+        report = month_budget(engine, "2025-08")
+        assert report["month"] == "2025-08"
+        assert len(report["categories"]) == 300
+        assert report["categories"][7]["spent"] == 85.0
+        assert report["categories"][7]["state"] == "warning"
+        assert report["total_spent"] == 85.0
+
+
+def test_burn_rate_and_projection():
+    # Flat spending averages to itself; recent days outweigh old ones
+    assert abs(burn_rate([10.0] * 28) - 10.0) < 1e-9
+    assert burn_rate([0.0] * 20 + [30.0] * 8) > burn_rate([30.0] * 8 + [0.0] * 20)
+    assert burn_rate([]) == 0.0
+
+    mid_month = date(2025, 8, 11).toordinal()
+    limit = Limit("Food", 300, 80)
+    on_pace = project(limit, 100.0, 10.0, today=mid_month)
+    assert on_pace["projected_spending"] == 300.0
+    assert on_pace["days_until_limit"] == 20
+    assert not on_pace["on_pace_to_exceed"]
+    fast = project(limit, 250.0, 20.0, today=mid_month)
+    assert (fast["days_until_limit"], fast["on_pace_to_exceed"]) == (3, True)
+    assert project(limit, 50.0, 1.0, today=mid_month)["days_until_limit"] is None
+    assert project(limit, 310.0, 0.0, today=mid_month)["days_until_limit"] == 0
+
+
+def test_projector_reuses_results_between_writes():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = CsvEngine(os.path.join(tmpdir, "file.csv"), os.path.join(tmpdir, "limits.csv"))
+        engine.save_limit("Food", 100, 80)
+        engine.save_limit("Travel", 100, 80, window_days=7)
+        projector = SpendProjector(engine)
+        engine.add_transaction({"Id": 1, "Name": "A", "Amount": 28, "Date": date.today().strftime("%m/%d/%Y"), "Category": "Food"})
+
+        projections = projector.projections()
+        assert list(projections) == ["Food"]
+        assert projections["Food"]["spent"] == 28.0
+        assert projections["Food"]["daily_rate"] > 0
+        assert projector.projections() is projections and projector.builds == 1
+
+        engine.add_transaction({"Id": 2, "Name": "B", "Amount": 2, "Date": date.today().strftime("%m/%d/%Y"), "Category": "Food"})
+        assert projector.projections()["Food"]["spent"] == 30.0
+        assert projector.builds == 2
+
+
+if __name__ == "__main__":
+    test_budget_report_states()
+    test_rolling_limits_use_window_totals()
+    test_month_budget_from_store()
+    test_burn_rate_and_projection()
+    test_projector_reuses_results_between_writes()
+    print("✅ Budget tests passed!")
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Test date normalization and the shared parse cache
+"""
+
+from datetime import date
+
+from dates import NO_DAY, month_key, month_range, normalize_date, parse_day, row_day
+
+
+def test_parse_day_formats():
+    """Both stored formats map to the same day ordinal"""
+    august_3 = date(2025, 8, 3).toordinal()
+    assert parse_day("08/03/2025") == august_3
+    assert parse_day("2025-08-03") == august_3
+    assert parse_day("") == NO_DAY
+    assert parse_day("not a date") == NO_DAY
+    assert parse_day("02/30/2025") == NO_DAY
+
+    # Repeated strings are served from the cache
+    hits = parse_day.cache_info().hits
+    parse_day("08/03/2025")
+    assert parse_day.cache_info().hits == hits + 1
+
+
+def test_month_helpers():
+    assert month_key("2025-12-31") == "2025-12"
+    assert month_key("12/31/2025") == "2025-12"
+    assert month_key("") == ''
+    start, end = month_range("2025-12")
+    assert start == date(2025, 12, 1).toordinal()
+    assert end == date(2026, 1, 1).toordinal()
+
+
+def test_normalize_date():
+    assert normalize_date("2025-08-03") == "08/03/2025"
+    assert normalize_date("8/3/2025") == "08/03/2025"
+    assert normalize_date("sometime") == "sometime"
+    assert row_day({"Date": "2025-08-03"}) == row_day({"Day": date(2025, 8, 3).toordinal()})
+
+
+if __name__ == "__main__":
+    test_parse_day_formats()
+    test_month_helpers()
+    test_normalize_date()
+    print("✅ Date tests passed!")
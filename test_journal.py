@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Test the append-only transaction journal
+"""
+
+import os
+import tempfile
+import time
+
+import rowstream
+from journal import TransactionJournal, TRANSACTION_FIELDS
+
+
+def make_journal(tmpdir):
+    csv_file = os.path.join(tmpdir, "file.csv")
+    with open(csv_file, 'w') as f:
+        f.write("Id,Name,Amount,Date,Category\n")
+        f.write("1001,Coffee,4.5,08/01/2025,Food\n")
+        f.write("1002,Bus,2.0,08/02/2025,Transportation\n")
+    return TransactionJournal(csv_file, fsync_policy="never")
+
+
+def test_journal_replay():
+    """Adds, updates and deletes are replayed over the base CSV"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        journal = make_journal(tmpdir)
+        base_size = os.path.getsize(journal.csv_file)
+
+        journal.append_add({"Id": 1003, "Name": "Lunch", "Amount": 12.0, "Date": "08/03/2025", "Category": "Food"})
+        journal.append_update(1001, "Amount", 5.25)
+        journal.append_delete(1002)
+
+        rows = journal.load()
+        assert [row["Id"] for row in rows] == ["1001", "1003"]
+        assert rows[0]["Amount"] == "5.25"
+        assert set(rows[1].keys()) == set(TRANSACTION_FIELDS)
+
+        # Nothing but the journal was written
+        assert os.path.getsize(journal.csv_file) == base_size
+        assert journal.pending_records() == 3
+
+
+def test_journal_compact():
+    """Compaction folds the journal into the base CSV"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        journal = make_journal(tmpdir)
+        journal.append_add({"Id": 1003, "Name": "Lunch", "Amount": 12.0, "Date": "08/03/2025", "Category": "Food"})
+        journal.append_delete(1001)
+        before = journal.load()
+
+        assert journal.compact() == 2
+        assert not os.path.exists(journal.journal_file)
+        assert journal.load() == before
+
+
+def test_journal_skips_torn_record():
+    """A half-written last line does not break reads"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        journal = make_journal(tmpdir)
+        journal.append_delete(1002)
+        with open(journal.journal_file, 'a') as f:
+            f.write('{"op": "add", "row": {"Id"')
+        assert [row["Id"] for row in journal.load()] == ["1001"]
+
+
+def test_id_index_lookup_and_rebuild():
+    """Modify and delete go through the Id index, which survives restarts and compaction"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        journal = make_journal(tmpdir)
+        journal.append_add({"Id": 1003, "Name": "Lunch", "Amount": 12.0, "Date": "08/03/2025", "Category": "Food"})
+
+        assert journal.get(1002)["Name"] == "Bus"
+        assert journal.get(1003)["Amount"] == "12.0"
+        assert journal.get(4242) is None
+        assert os.path.exists(journal.index.index_file)
+
+        old_row = journal.append_update(1003, "Amount", 15.0)
+        assert old_row["Amount"] == "12.0"
+        assert journal.get(1003)["Amount"] == "15.0"
+        assert journal.append_update(4242, "Amount", 1.0) is None
+        assert journal.append_delete(1001)["Name"] == "Coffee"
+        assert journal.get(1001) is None
+
+        # A fresh process picks up the checkpoint and catches up from the journal
+        restarted = TransactionJournal(journal.csv_file, fsync_policy="never")
+        assert restarted.get(1003)["Amount"] == "15.0"
+        assert restarted.get(1001) is None
+
+        # Compaction rewrites the base, so the old offsets are stale and get rebuilt
+        journal.compact()
+        assert restarted.get(1003)["Amount"] == "15.0"
+        assert restarted.get(1002)["Name"] == "Bus"
+
+        # A missing index is rebuilt on demand
+        os.remove(journal.index.index_file)
+        assert TransactionJournal(journal.csv_file, fsync_policy="never").get(1002)["Name"] == "Bus"
+
+
+def test_journal_iter_rows():
+    """Streaming reads apply the journal and honour projection and predicates"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        journal = make_journal(tmpdir)
+        journal.append_add({"Id": 1003, "Name": "Lunch", "Amount": 12.0, "Date": "08/03/2025", "Category": "Food"})
+        journal.append_update(1001, "Amount", 5.25)
+        journal.append_delete(1002)
+
+        rows = list(journal.iter_rows(columns=["Id", "Amount"]))
+        assert sorted(rows, key=lambda row: row["Id"]) == [{"Id": "1001", "Amount": "5.25"}, {"Id": "1003", "Amount": "12.0"}]
+        food = journal.iter_rows(columns=["Name"], where={"Category": lambda value: value == "Food"})
+        assert sorted(row["Name"] for row in food) == ["Coffee", "Lunch"]
+
+        # Large files are parsed out of a memory map; the result is the same
+        threshold = rowstream.MMAP_THRESHOLD
+        rowstream.MMAP_THRESHOLD = 1
+        try:
+            assert list(journal.iter_rows(columns=["Id", "Amount"])) == rows
+        finally:
+            rowstream.MMAP_THRESHOLD = threshold
+
+
+def test_interval_fsync_syncs_the_last_write():
+    """Under the interval policy a write with no later append is still synced once the interval passes"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        journal = make_journal(tmpdir)
+        journal.fsync_policy, journal.fsync_interval = "interval", 0.1
+        synced = []
+        fsync = os.fsync
+        os.fsync = lambda fd: synced.append(fd)
+        try:
+            journal.append_add({"Id": "1003", "Name": "Tea", "Amount": "3", "Date": "08/03/2025", "Category": "Food"})
+            journal.append_add({"Id": "1004", "Name": "Cake", "Amount": "5", "Date": "08/03/2025", "Category": "Food"})
+            journal.append_add({"Id": "1005", "Name": "Pie", "Amount": "6", "Date": "08/03/2025", "Category": "Food"})
+            assert len(synced) == 1
+            time.sleep(0.3)
+            assert len(synced) == 2
+
+            # A timer firing after compaction removed the journal doesn't bring it back
+            journal.compact()
+            compacted = len(synced)
+            journal._deferred_fsync()
+            assert not os.path.exists(journal.journal_file) and len(synced) == compacted
+        finally:
+            os.fsync = fsync
+
+
+if __name__ == "__main__":
+    test_journal_replay()
+    test_journal_compact()
+    test_journal_skips_torn_record()
+    test_id_index_lookup_and_rebuild()
+    test_journal_iter_rows()
+    test_interval_fsync_syncs_the_last_write()
+    print("✅ Journal tests passed!")
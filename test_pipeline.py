@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test the post-commit pipeline and the pending-notice box
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+from pipeline import NoticeBox, PostCommitPipeline
+
+
+def test_per_key_ordering():
+    """Tasks for one key run in order, one at a time; other keys don't wait behind them"""
+    pipeline = PostCommitPipeline(max_workers=4)
+    ran = {"alice": [], "bob": []}
+    running = {"alice": 0}
+    overlaps = []
+
+    def task(user, n):
+        if user == "alice":
+            running["alice"] += 1
+            overlaps.append(running["alice"] > 1)
+            time.sleep(0.002)
+            running["alice"] -= 1
+        ran[user].append(n)
+
+    for n in range(20):
+        pipeline.submit("alice", task, "alice", n)
+        pipeline.submit("bob", task, "bob", n)
+    assert pipeline.wait(timeout=10)
+    assert ran["alice"] == list(range(20))
+    assert ran["bob"] == list(range(20))
+    assert not any(overlaps)
+    assert pipeline.stats()["completed"] == 40
+
+
+def test_failures_and_backpressure():
+    pipeline = PostCommitPipeline(max_workers=1, max_pending=2)
+    release = threading.Event()
+    ran = []
+
+    def fail():
+        raise ValueError("boom")
+
+    pipeline.submit("user", release.wait)
+    pipeline.submit("user", fail)
+
+    # The queue is full, so a third submit waits until a slot frees up
+    third = threading.Thread(target=pipeline.submit, args=("user", ran.append, "after"))
+    third.start()
+    third.join(0.1)
+    assert third.is_alive()
+    release.set()
+    third.join(5)
+    assert pipeline.wait(timeout=5)
+    assert ran == ["after"]
+    assert pipeline.stats()["failed"] == 1
+
+
+def test_notice_box():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "pending_notices.json")
+        box = NoticeBox(path)
+        other_worker = NoticeBox(path)
+        assert other_worker.take("default") == []
+
+        box.post("default", "🎉 New achievements unlocked: 🎯 First Steps")
+        box.post("someone", "hello")
+        assert other_worker.take("default") == ["🎉 New achievements unlocked: 🎯 First Steps"]
+        assert box.take("default") == []
+        assert box.take("someone") == ["hello"]
+
+
+if __name__ == "__main__":
+    test_per_key_ordering()
+    test_failures_and_backpressure()
+    test_notice_box()
+    print("✅ Pipeline tests passed!")